@@ -328,6 +328,69 @@ def build_pyg_data(G: nx.DiGraph,
     data.type_list = type_list
     return data, node_ids, name_list
 
+# -----------------------
+# 嵌套 top-k 子图：最大子图只构建一次，较小子图取前缀
+# -----------------------
+STRUCT_FEAT_KEYS = ('in_deg', 'out_deg', 'pagerank', 'betweenness', 'eigen', 'dist_min_inv', 'dist_avg_inv',
+                    'reconv', 'near_ff', 'name_len', 'depth', 'is_output')  # 与 build_pyg_data 的结构特征列顺序一致
+
+def prefilter_order(G: nx.DiGraph, feats: Dict[int, Dict]) -> np.ndarray:
+    """初筛排序：按 pagerank + dist_min_inv 降序排列全部节点，任意 k 的 top-k 都是它的前 k 个"""
+    scores = np.array([feats[n]['pagerank'] + feats[n]['dist_min_inv'] for n in G.nodes])
+    node_ids_all = np.array(list(G.nodes))
+    return node_ids_all[scores.argsort()[::-1]]
+
+def build_nested_subgraphs(G: nx.DiGraph, feats: Dict[int, Dict], order: np.ndarray, k_max: int) -> Data:
+    """
+    top-k 子图（top-k 节点及其前驱/后继的导出子图）随 k 单调增大，只为 k_max 构建一次：
+    - 节点的进入值 = 它首次出现在子图中的 k（top 节点为自身名次，邻居取相邻 top 节点的最小名次）
+    - 边的进入值 = 两端节点进入值的较大者
+    节点、边都按进入值排序（同值保持原图顺序），任意 k ≤ k_max 的子图就是节点表 / 边表的前缀，
+    特征矩阵取自全图特征，只组装一次（耗时记入 data.feat_time）；类型 one-hot 按最大子图的类型表，所有 k 输入维度相同（便于热启动）
+    """
+    entry = {}
+    for rank, n in enumerate(order[:k_max].tolist(), start=1):
+        for m in [n, *G.predecessors(n), *G.successors(n)]:
+            entry.setdefault(m, rank)
+    pos = {n: i for i, n in enumerate(G.nodes)}
+    node_ids = sorted(entry, key=lambda n: (entry[n], pos[n]))
+    local = {n: i for i, n in enumerate(node_ids)}
+    node_entry = np.array([entry[n] for n in node_ids], dtype=np.int64)
+
+    edges = np.array([(local[u], local[v]) for u, v in G.subgraph(node_ids).edges], dtype=np.int64).reshape(-1, 2)
+    edge_entry = np.maximum(node_entry[edges[:, 0]], node_entry[edges[:, 1]])
+    e_order = np.argsort(edge_entry, kind='stable')
+
+    t0 = time.time()
+    type_list = sorted(set(G.nodes[n].get('type', 'UNK') for n in node_ids))
+    type2idx = {t: i for i, t in enumerate(type_list)}
+    x = torch.zeros((len(node_ids), len(type_list) + len(STRUCT_FEAT_KEYS)), dtype=torch.float)
+    x[torch.arange(len(node_ids)), torch.tensor([type2idx[G.nodes[n].get('type', 'UNK')] for n in node_ids])] = 1.0
+    x[:, len(type_list):] = torch.tensor([[feats[n][c] for c in STRUCT_FEAT_KEYS] for n in node_ids], dtype=torch.float)
+    feat_time = time.time() - t0
+
+    data = Data(x=x, edge_index=torch.from_numpy(edges[e_order].T.copy()))
+    data.node_ids = node_ids
+    data.node_names = [G.nodes[n].get('name', str(n)) for n in node_ids]
+    data.type_list = type_list
+    data.node_entry = node_entry
+    data.feat_time = feat_time
+    data.edge_entry = edge_entry[e_order]
+    injectable = set(get_injectable_nodes(G.subgraph(node_ids)))
+    data.injectable = np.array([name in injectable for name in data.node_names], dtype=bool)
+    return data
+
+def slice_nested_subgraph(nested: Data, k: int) -> Data:
+    """从 build_nested_subgraphs 的结果取 top-k 子图：节点 / 边前缀切片（零拷贝视图）"""
+    n = int(np.searchsorted(nested.node_entry, k, side='right'))
+    e = int(np.searchsorted(nested.edge_entry, k, side='right'))
+    data = Data(x=nested.x[:n], edge_index=nested.edge_index[:, :e])
+    data.node_ids = nested.node_ids[:n]
+    data.node_names = nested.node_names[:n]
+    data.type_list = nested.type_list
+    data.injectable = nested.injectable[:n]
+    return data
+
 # -----------------------
 # Self-supervised DGI
 # -----------------------
@@ -388,9 +451,15 @@ class DGI(nn.Module):
         return - (torch.log(torch.sigmoid(pos) + 1e-10).mean()
                   + torch.log(1 - torch.sigmoid(neg) + 1e-10).mean())
 
-def train_dgi(data: Data, hidden=128, layers=3, epochs=150, lr=1e-3, dropout=0.1, device='cpu'):
+def train_dgi(data: Data, hidden=128, layers=3, epochs=150, lr=1e-3, dropout=0.1, device='cpu', init_state=None):
+    """
+    init_state 给定时从这组模型参数热启动（嵌套 top-k：取上一个更大子图训练好的参数）
+    返回: (H, 训练后的模型参数)
+    """
     enc = EncoderGIN(in_dim=data.x.size(1), hid=hidden, layers=layers, dropout=dropout).to(device)
     model = DGI(enc, hid_dim=hidden).to(device)
+    if init_state is not None:
+        model.load_state_dict(init_state)
     opt = torch.optim.Adam(model.parameters(), lr=lr)
 
     x = data.x.to(device)
@@ -415,7 +484,7 @@ def train_dgi(data: Data, hidden=128, layers=3, epochs=150, lr=1e-3, dropout=0.1
     model.eval()
     with torch.no_grad():
         pos, neg, H = model(x, ei, x)  # 用本身 x 获取最终 H
-    return H.cpu()
+    return H.cpu(), {name: t.detach().clone() for name, t in model.state_dict().items()}
 
 # -----------------------
 # Scoring fusion
@@ -529,7 +598,12 @@ def main():
     parser.add_argument('--timing_csv', type=str, default='timing.csv', help="保存每个 topk 子图的时间信息")
     parser.add_argument('--gnn_ranks', type=str, default='gnn_ranks', help="GNN 排名结果输出目录")
     parser.add_argument('--keep_ratio', type=float, default=0.2, help="输出排名节点数 = topk × keep_ratio")
+    parser.add_argument('--warm_epochs', type=int, default=0, help="较小 topk 从上一个更大子图的模型热启动后的训练轮数 (0 = epochs/10)")
+    parser.add_argument('--cold_start', action='store_true', help="每个 topk 都从头训练 epochs 轮（子图仍由最大子图切片得到）")
+    parser.add_argument('--standalone_timing', action='store_true',
+                        help="热启动的 topk 额外从头训练 epochs 轮（结果丢弃）只为计时，填写 timing.csv 的 standalone_time")
     args = parser.parse_args()
+    warm_epochs = args.warm_epochs if args.warm_epochs > 0 else max(1, args.epochs // 10)
 
     set_seed(args.seed)
 
@@ -578,76 +652,85 @@ def main():
     print(f"[INFO] 全图特征计算耗时: {full_feat_time:.4f}s")
 
     # ====== Step 3: 准备时间统计 CSV ======
-    csv_fields = ['topk', 'sub_nodes', 'sub_edges', 'prefilter_time', 'subgraph_time', 'feat_time', 'pyg_time', 'dgi_time', 'fuse_time', 'total_time']
-    csv_rows = []
+    # total_time 是本次扫描中该 topk 的增量耗时：初筛 / 子图 / 特征只在最大 topk 一行计入，
+    # train_mode=warm 的行只训练 dgi_epochs 轮（从更大 topk 的模型热启动），不等于单独处理该 topk 的耗时；
+    # standalone_time = 初筛 + 最大子图构建 + 特征（一次性开销，单独处理较小 topk 时的上界）+ 该 topk 从头训练的各阶段耗时，
+    # warm 行只有加 --standalone_timing 时才有
+    csv_fields = ['topk', 'sub_nodes', 'sub_edges', 'prefilter_time', 'subgraph_time', 'feat_time', 'pyg_time', 'dgi_time', 'fuse_time', 'total_time', 'dgi_epochs',
+                  'train_mode', 'standalone_time']
+    rows_by_k = {}
 
     device = 'cuda' if torch.cuda.is_available() else 'cpu'
 
-    # ====== Step 4: 对每个 topk 值做子图分析 ======
-    for k in topk_list:
+    # ====== Step 4: 嵌套 top-k 子图 ======
+    # 各 topk 的子图互为前缀：初筛排序与最大子图只算一次（计入最大 topk 的时间），
+    # 从大到小处理，较小 topk 切片得到子图并从上一个更大子图训练好的模型热启动
+    k_desc = sorted(set(topk_list), reverse=True)
+    t0 = time.time()
+    order = prefilter_order(G, feats_full)
+    t1 = time.time()
+    nested = build_nested_subgraphs(G, feats_full, order, k_desc[0])
+    t2 = time.time()
+    shared_time = t2 - t0
+    print(f"[INFO] 最大子图 (topk={k_desc[0]}): {nested.x.size(0)} 节点, {nested.edge_index.size(1)} 边，构建耗时 {shared_time:.4f}s")
+
+    state = None
+    for k in k_desc:
         print(f"\n[INFO] Processing topk={k}")
-        
-        # ---- 初筛（计入时间） ----
-        t0 = time.time()
-        scores = np.array([feats_full[n]['pagerank'] + feats_full[n]['dist_min_inv'] for n in G.nodes])
-        node_ids_all = np.array(list(G.nodes))
-        topk_nids = node_ids_all[scores.argsort()[::-1][:k]]
-        t1 = time.time()
-        prefilter_time = t1 - t0
-
-        # ---- 子图构造（topk + 邻居）----
-        t0 = time.time()
-        sub_nodes = set(topk_nids)
-        for n in topk_nids:
-            sub_nodes |= set(G.predecessors(n)) | set(G.successors(n))
-        G_sub = G.subgraph(sub_nodes).copy()
-        t1 = time.time()
-        subgraph_time = t1 - t0
-
-        # ---- 特征提取 ----
-        t0 = time.time()
-        feats_sub = {n: feats_full[n] for n in G_sub.nodes}
-        t1 = time.time()
-        feat_time = t1 - t0
-
-        # ---- 构造 PyG 数据 ----
-        t0 = time.time()
-        data_sub, node_ids_sub, name_list_sub = build_pyg_data(G_sub, feats_sub)
-        t1 = time.time()
-        pyg_time = t1 - t0
-
-        # ---- DGI 训练 ----
-        t0 = time.time()
-        H_sub = train_dgi(data_sub, hidden=args.hidden, layers=args.layers,
-                          epochs=args.epochs, dropout=args.dropout, device=device)
-        t1 = time.time()
-        dgi_time = t1 - t0
+        largest = k == k_desc[0]
+        prefilter_time = t1 - t0 if largest else 0.0
+        subgraph_time = t2 - t1 - nested.feat_time if largest else 0.0
+        feat_time = nested.feat_time if largest else 0.0  # 较小 topk 切片即得特征行，不再组装
+
+        # ---- 切片得到子图 PyG 数据 ----
+        t3 = time.time()
+        data_sub = slice_nested_subgraph(nested, k)
+        pyg_time = time.time() - t3
+
+        # ---- DGI 训练（最大子图从头训练，其余热启动） ----
+        warm = state is not None and not args.cold_start
+        epochs = warm_epochs if warm else args.epochs
+        t3 = time.time()
+        H_sub, state = train_dgi(data_sub, hidden=args.hidden, layers=args.layers,
+                                 epochs=epochs, dropout=args.dropout, device=device,
+                                 init_state=state if warm else None)
+        dgi_time = time.time() - t3
+        cold_dgi_time = None if warm else dgi_time
+        if warm and args.standalone_timing:
+            with torch.random.fork_rng():   # 计时用的冷启动训练不扰动后续随机数
+                t3 = time.time()
+                train_dgi(data_sub, hidden=args.hidden, layers=args.layers, epochs=args.epochs,
+                          dropout=args.dropout, device=device)
+                cold_dgi_time = time.time() - t3
 
         # ---- 融合打分 ----
-        t0 = time.time()
-        ranked_sub = fuse_scores(G_sub, feats_sub, H_sub, data_sub, output_ids & set(G_sub.nodes))
-        t1 = time.time()
-        fuse_time = t1 - t0
+        t3 = time.time()
+        ranked_sub = fuse_scores(G, feats_full, H_sub, data_sub, output_ids & set(data_sub.node_ids))
+        fuse_time = time.time() - t3
 
         # ---- 汇总总时间（包括初筛）----
         total_time = prefilter_time + subgraph_time + feat_time + pyg_time + dgi_time + fuse_time
+        standalone_time = None if cold_dgi_time is None else shared_time + pyg_time + cold_dgi_time + fuse_time
 
         # ---- 保存时间记录 ----
-        csv_rows.append({
+        rows_by_k[k] = {
             'topk': k,
-            'sub_nodes': G_sub.number_of_nodes(),
-            'sub_edges': G_sub.number_of_edges(),
+            'sub_nodes': data_sub.x.size(0),
+            'sub_edges': data_sub.edge_index.size(1),
             'prefilter_time': round(prefilter_time, 4),
             'subgraph_time': round(subgraph_time, 4),
             'feat_time': round(feat_time, 4),
             'pyg_time': round(pyg_time, 4),
             'dgi_time': round(dgi_time, 4),
             'fuse_time': round(fuse_time, 4),
-            'total_time': round(total_time, 4)
-        })
+            'total_time': round(total_time, 4),
+            'dgi_epochs': epochs,
+            'train_mode': 'warm' if warm else 'cold',
+            'standalone_time': '' if standalone_time is None else round(standalone_time, 4)
+        }
 
         # ---- 输出排名（仅前 keep_ratio 部分，可注入节点）----
-        injectable_names = get_injectable_nodes(G_sub)
+        injectable_names = set(np.array(data_sub.node_names, dtype=object)[data_sub.injectable].tolist())
         ranked_injectable = [(name, score) for name, score in ranked_sub if name in injectable_names]
         top_count = max(1, math.ceil(k * args.keep_ratio))
         top_nodes = ranked_injectable[:top_count]
@@ -659,6 +742,8 @@ def main():
 
         print(f"[INFO] topk={k} 写入前 {top_count}/{len(ranked_injectable)} 个可注入节点到 {out_txt}")
 
+    csv_rows = [rows_by_k[k] for k in topk_list]
+
     # ====== Step 5: 写出 timing.csv ======
     with open(args.timing_csv, 'w', newline='', encoding='utf-8') as f:
         writer = csv.DictWriter(f, fieldnames=csv_fields)
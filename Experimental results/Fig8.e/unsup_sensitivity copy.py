@@ -369,6 +369,73 @@ def build_pyg_data(G: nx.DiGraph,
     data.type_list = type_list
     return data, node_ids, name_list
 
+# -----------------------
+# 嵌套 top-k 子图：最大子图只构建一次，较小子图取前缀
+# -----------------------
+STRUCT_FEAT_KEYS = ('in_deg', 'out_deg', 'pagerank', 'betweenness', 'eigen', 'dist_min_inv', 'dist_avg_inv',
+                    'reconv', 'near_ff', 'name_len', 'depth', 'is_output')  # 与 build_pyg_data 的结构特征列顺序一致
+
+def prefilter_order(G: nx.DiGraph, feats: Dict[int, Dict]) -> np.ndarray:
+    """初筛排序：按 pagerank + dist_min_inv 降序排列全部节点，任意 k 的 top-k 都是它的前 k 个"""
+    scores = np.array([feats[n]['pagerank'] + feats[n]['dist_min_inv'] for n in G.nodes])
+    node_ids_all = np.array(list(G.nodes))
+    return node_ids_all[scores.argsort()[::-1]]
+
+def build_nested_subgraphs(G: nx.DiGraph, feats: Dict[int, Dict], order: np.ndarray, k_max: int) -> Data:
+    """
+    top-k 子图（top-k 节点及其前驱/后继的导出子图）随 k 单调增大，只为 k_max 构建一次：
+    - 节点的进入值 = 它首次出现在子图中的 k（top 节点为自身名次，邻居取相邻 top 节点的最小名次）
+    - 边的进入值 = 两端节点进入值的较大者
+    节点、边都按进入值排序（同值保持原图顺序），任意 k ≤ k_max 的子图就是节点表 / 边表的前缀，
+    特征矩阵取自全图特征，只组装一次；类型 one-hot 按最大子图的类型表，所有 k 输入维度相同（便于热启动）
+    """
+    entry = {}
+    for rank, n in enumerate(order[:k_max].tolist(), start=1):
+        for m in [n, *G.predecessors(n), *G.successors(n)]:
+            entry.setdefault(m, rank)
+    pos = {n: i for i, n in enumerate(G.nodes)}
+    node_ids = sorted(entry, key=lambda n: (entry[n], pos[n]))
+    local = {n: i for i, n in enumerate(node_ids)}
+    node_entry = np.array([entry[n] for n in node_ids], dtype=np.int64)
+
+    edges = np.array([(local[u], local[v]) for u, v in G.subgraph(node_ids).edges], dtype=np.int64).reshape(-1, 2)
+    edge_entry = np.maximum(node_entry[edges[:, 0]], node_entry[edges[:, 1]])
+    e_order = np.argsort(edge_entry, kind='stable')
+
+    type_list = sorted(set(G.nodes[n].get('type', 'UNK') for n in node_ids))
+    type2idx = {t: i for i, t in enumerate(type_list)}
+    x = torch.zeros((len(node_ids), len(type_list) + len(STRUCT_FEAT_KEYS)), dtype=torch.float)
+    x[torch.arange(len(node_ids)), torch.tensor([type2idx[G.nodes[n].get('type', 'UNK')] for n in node_ids])] = 1.0
+    x[:, len(type_list):] = torch.tensor([[feats[n][c] for c in STRUCT_FEAT_KEYS] for n in node_ids], dtype=torch.float)
+
+    data = Data(x=x, edge_index=torch.from_numpy(edges[e_order].T.copy()))
+    data.node_ids = node_ids
+    data.node_names = [G.nodes[n].get('name', str(n)) for n in node_ids]
+    data.type_list = type_list
+    data.node_entry = node_entry
+    data.edge_entry = edge_entry[e_order]
+    injectable = set(get_injectable_nodes(G.subgraph(node_ids)))
+    data.injectable = np.array([name in injectable for name in data.node_names], dtype=bool)
+    return data
+
+def slice_nested_subgraph(nested: Data, k: int) -> Data:
+    """从 build_nested_subgraphs 的结果取 top-k 子图：节点 / 边前缀切片（零拷贝视图）"""
+    n = int(np.searchsorted(nested.node_entry, k, side='right'))
+    e = int(np.searchsorted(nested.edge_entry, k, side='right'))
+    data = Data(x=nested.x[:n], edge_index=nested.edge_index[:, :e])
+    data.node_ids = nested.node_ids[:n]
+    data.node_names = nested.node_names[:n]
+    data.type_list = nested.type_list
+    data.injectable = nested.injectable[:n]
+    return data
+
+def add_input_noise(x: torch.Tensor, num_onehot: int, input_noise: float) -> torch.Tensor:
+    """与 build_pyg_data 相同的输入噪声（只对连续特征，不对 one-hot 编码），返回加噪后的副本"""
+    x = x.clone()
+    noise = torch.randn_like(x[:, num_onehot:]) * input_noise
+    x[:, num_onehot:] = torch.clamp(x[:, num_onehot:] + noise, 0, 1)
+    return x
+
 # -----------------------
 # Self-supervised DGI
 # -----------------------
@@ -429,9 +496,15 @@ class DGI(nn.Module):
         return - (torch.log(torch.sigmoid(pos) + 1e-10).mean()
                   + torch.log(1 - torch.sigmoid(neg) + 1e-10).mean())
 
-def train_dgi(data: Data, hidden=128, layers=3, epochs=150, lr=1e-3, dropout=0.2, device='cpu'):
+def train_dgi(data: Data, hidden=128, layers=3, epochs=150, lr=1e-3, dropout=0.2, device='cpu', init_state=None):
+    """
+    init_state 给定时从这组模型参数热启动（嵌套 top-k：取同一 run 在上一个更大子图训练好的参数）
+    返回: (H, 训练后的模型参数)
+    """
     enc = EncoderGIN(in_dim=data.x.size(1), hid=hidden, layers=layers, dropout=dropout).to(device)
     model = DGI(enc, hid_dim=hidden).to(device)
+    if init_state is not None:
+        model.load_state_dict(init_state)
     opt = torch.optim.Adam(model.parameters(), lr=lr)
 
     x = data.x.to(device)
@@ -456,7 +529,7 @@ def train_dgi(data: Data, hidden=128, layers=3, epochs=150, lr=1e-3, dropout=0.2
     model.eval()
     with torch.no_grad():
         pos, neg, H = model(x, ei, x)  # 用本身 x 获取最终 H
-    return H.cpu()
+    return H.cpu(), {name: t.detach().clone() for name, t in model.state_dict().items()}
 
 # -----------------------
 # Scoring fusion
@@ -612,7 +685,12 @@ def main():
                         help="输入特征噪声水平 (0-1)，越高差异越大 (建议0.03-0.1)")
     parser.add_argument('--num_runs', type=int, default=200,
                         help="每个topk生成的排名结果数量 (默认100)")
+    parser.add_argument('--warm_epochs', type=int, default=0,
+                        help="较小 topk 从同一 run 上一个更大子图的模型热启动后的训练轮数 (0 = epochs/10)")
+    parser.add_argument('--cold_start', action='store_true',
+                        help="每个 topk 都从头训练 epochs 轮（子图仍由最大子图切片得到）")
     args = parser.parse_args()
+    warm_epochs = args.warm_epochs if args.warm_epochs > 0 else max(1, args.epochs // 10)
 
     set_seed(args.seed)
 
@@ -663,8 +741,8 @@ def main():
     feats_full = compute_struct_features(G, output_ids, seq_inst_ids)
 
     # ====== Step 3: 准备时间统计 CSV ======
-    csv_fields = ['topk', 'run', 'sub_nodes', 'sub_edges', 'feat_time', 'pyg_time', 'dgi_time', 'fuse_time', 'escaped_faults']
-    csv_rows = []
+    csv_fields = ['topk', 'run', 'sub_nodes', 'sub_edges', 'feat_time', 'pyg_time', 'dgi_time', 'fuse_time', 'escaped_faults', 'dgi_epochs']
+    rows_by_k = {}
     
     # 尝试从 coverage_statistics.csv 读取 escaped_faults 数据
     escaped_faults_dict = {}  # {(topk, run): escaped_faults}
@@ -689,20 +767,24 @@ def main():
 
     device = 'cuda' if torch.cuda.is_available() else 'cpu'
 
-    # ====== Step 4: 对每个 topk 值做子图分析 ======
-    for k in topk_list:
+    # ====== Step 4: 嵌套 top-k 子图 ======
+    # 各 topk 的子图互为前缀：初筛排序与最大子图只构建一次（不计入时间），从大到小处理；
+    # 每个 run 从同一 run 在上一个更大子图上训练好的模型热启动
+    k_desc = sorted(set(topk_list), reverse=True)
+    order = prefilter_order(G, feats_full)
+    nested = build_nested_subgraphs(G, feats_full, order, k_desc[0])
+    print(f"[INFO] 最大子图 (topk={k_desc[0]}): {nested.x.size(0)} 节点, {nested.edge_index.size(1)} 边")
+    num_onehot = len(nested.type_list)
+    run_states = {}  # run_idx -> 上一个更大子图训练后的模型参数
+
+    for k in k_desc:
         print(f"\n[INFO] Processing topk={k}")
         
-        # ---- 初筛（不计入时间） ----
-        scores = np.array([feats_full[n]['pagerank'] + feats_full[n]['dist_min_inv'] for n in G.nodes])
-        node_ids_all = np.array(list(G.nodes))
-        topk_nids = node_ids_all[scores.argsort()[::-1][:k]]
-
-        # ---- 子图构造（topk + 邻居）----
-        sub_nodes = set(topk_nids)
-        for n in topk_nids:
-            sub_nodes |= set(G.predecessors(n)) | set(G.successors(n))
-        G_sub = G.subgraph(sub_nodes).copy()
+        # ---- 切片得到子图（节点 / 边前缀，全图特征已组装） ----
+        t0 = time.time()
+        data_sub = slice_nested_subgraph(nested, k)
+        feat_time = time.time() - t0
+        rows_by_k[k] = []
 
         # ====== 对每个topk生成N个不同的排名 ======
         for run_idx in range(args.num_runs):
@@ -712,28 +794,27 @@ def main():
             
             print(f"[INFO] TopK={k}, Run={run_idx+1}/{args.num_runs}, Seed={current_seed}")
 
-            # ---- 特征提取 ----
-            t0 = time.time()
-            feats_sub = {n: feats_full[n] for n in G_sub.nodes}
-            t1 = time.time()
-            feat_time = t1 - t0
-
             # ---- 构造 PyG 数据（添加输入噪声） ----
             t0 = time.time()
-            data_sub, node_ids_sub, name_list_sub = build_pyg_data(G_sub, feats_sub, input_noise=args.input_noise)
+            data_run = slice_nested_subgraph(nested, k)
+            if args.input_noise > 0:
+                data_run.x = add_input_noise(data_run.x, num_onehot, args.input_noise)
             t1 = time.time()
             pyg_time = t1 - t0
 
-            # ---- DGI 训练 ----
+            # ---- DGI 训练（最大子图从头训练，其余热启动） ----
+            warm = run_idx in run_states and not args.cold_start
+            epochs = warm_epochs if warm else args.epochs
             t0 = time.time()
-            H_sub = train_dgi(data_sub, hidden=args.hidden, layers=args.layers,
-                              epochs=args.epochs, dropout=args.dropout, device=device)
+            H_sub, run_states[run_idx] = train_dgi(data_run, hidden=args.hidden, layers=args.layers,
+                                                   epochs=epochs, dropout=args.dropout, device=device,
+                                                   init_state=run_states[run_idx] if warm else None)
             t1 = time.time()
             dgi_time = t1 - t0
 
             # ---- 融合打分（添加特征噪声和权重扰动） ----
             t0 = time.time()
-            ranked_sub = fuse_scores(G_sub, feats_sub, H_sub, data_sub, output_ids & set(G_sub.nodes),
+            ranked_sub = fuse_scores(G, feats_full, H_sub, data_run, output_ids & set(data_run.node_ids),
                                    noise_level=args.noise_level, weight_noise=args.weight_noise)
             t1 = time.time()
             fuse_time = t1 - t0
@@ -742,20 +823,21 @@ def main():
             escaped_faults = escaped_faults_dict.get((k, run_idx + 1), 0)
 
             # ---- 保存时间记录（escaped_faults 替代 total_time） ----
-            csv_rows.append({
+            rows_by_k[k].append({
                 'topk': k,
                 'run': run_idx + 1,
-                'sub_nodes': G_sub.number_of_nodes(),
-                'sub_edges': G_sub.number_of_edges(),
+                'sub_nodes': data_sub.x.size(0),
+                'sub_edges': data_sub.edge_index.size(1),
                 'feat_time': round(feat_time, 4),
                 'pyg_time': round(pyg_time, 4),
                 'dgi_time': round(dgi_time, 4),
                 'fuse_time': round(fuse_time, 4),
-                'escaped_faults': escaped_faults
+                'escaped_faults': escaped_faults,
+                'dgi_epochs': epochs
             })
 
             # ---- 输出排名（仅前 keep_ratio 部分，可注入节点）----
-            injectable_names = get_injectable_nodes(G_sub)
+            injectable_names = set(np.array(data_sub.node_names, dtype=object)[data_sub.injectable].tolist())
             ranked_injectable = [(name, score) for name, score in ranked_sub if name in injectable_names]
             top_count = max(1, math.ceil(k * args.keep_ratio))
             top_nodes = ranked_injectable[:top_count]
@@ -767,6 +849,8 @@ def main():
 
             print(f"[INFO] topk={k}, run={run_idx+1} 写入前 {top_count}/{len(ranked_injectable)} 个可注入节点到 {out_txt}")
 
+    csv_rows = [row for k in topk_list for row in rows_by_k[k]]
+
     # ====== Step 5: 写出 timing.csv ======
     with open(args.timing_csv, 'w', newline='', encoding='utf-8') as f:
         writer = csv.DictWriter(f, fieldnames=csv_fields)
@@ -0,0 +1,1326 @@
+"""
+位并行门级仿真器 - 纯 Python / numpy 版本
+============================================
+不依赖 Verilator / Icarus：直接在 Python 中仿真组合逻辑网表
+
+三步:
+1. 编译单元库: 把 cells.v 中纯组合的单元 (INV, AND2, NAND2X0, MUX2, XOR2 ...) 的 assign 表达式
+   编译成按位运算的 numpy 求值函数
+2. 网表分层: 解析门级网表一次，按逻辑层级拓扑排序，同层同类型的门合为一组
+3. 位并行求值: 每个 uint64 字装 64 个激励向量，逐层对整组门做一次向量化运算
+
+激励来自原 testbench (tb_<电路>.v)：用 pyverilog 解析后解释执行主 initial 块，
+在每条 $display 处按当时已稳定的输入取一个采样点；仿真后按 $display 的格式渲染输出，
+用与故障注入脚本相同的正则解析得到 golden 值（与 Verilator 的 golden_result.json 对应）
+
+用法:
+    python bitparallel_sim.py                         # 全部网表: golden 对比 + 吞吐基准
+    python bitparallel_sim.py --circuits dec,sin --bench_patterns 65536
+    python bitparallel_sim.py --ppsfp                 # 另跑 PPSFP 全量故障仿真，与 full_injection_results.json 对比
+"""
+
+import os
+import re
+import csv
+import json
+import time
+import argparse
+import tempfile
+from typing import List, Tuple, Dict, Optional
+
+import numpy as np
+
+from full_node_injection_verilator_parallel import (
+    INPUT_NETLIST_DIR, BASE_RESULTS_DIR, CELL_LIB, OSUM_HEX_RE, ALT_HEX_RE, strip_comments,
+)
+
+WORD_BITS = 64
+ALL_ONES = np.uint64(0xFFFFFFFFFFFFFFFF)
+ZERO = np.uint64(0)
+CONST_NETS = {"1'b0": 0, "1'b1": 1}
+
+# 基准配置
+BENCH_PATTERNS = 1 << 16
+BENCH_REPEATS = 3
+BENCH_CSV = 'bitparallel_sim_benchmark.csv'
+
+
+# ===== 1. 单元库编译 =====
+
+class CellModel:
+    """组合单元：输入/输出端口名 + 按位求值函数 fn(*输入字数组) -> 输出字数组元组"""
+
+    def __init__(self, name: str, inputs: Tuple[str, ...], outputs: Tuple[str, ...],
+                 exprs: Dict[str, str], fn):
+        self.name = name
+        self.inputs = inputs
+        self.outputs = outputs
+        self.exprs = exprs  # 输出端口 -> 原始 Verilog 表达式（故障压缩等结构分析用）
+        self.fn = fn
+
+    def __repr__(self):
+        return f"CellModel({self.name}: {', '.join(self.inputs)} -> {', '.join(self.outputs)})"
+
+
+_CELL_MODULE_RE = re.compile(r'\bmodule\s+(\w+)\s*\(([^)]*)\)\s*;(.*?)\bendmodule\b', re.DOTALL)
+_CELL_ASSIGN_RE = re.compile(r'\bassign\s+(\w+)\s*=\s*([^;]+);')
+_CELL_TOKEN_RE = re.compile(r"\s*(?:(1'b[01])|([A-Za-z_]\w*)|(\S))")
+
+
+def _compile_cell_expr(expr: str, pins: Tuple[str, ...]) -> str:
+    """
+    把单元的 assign 表达式（~ & ^ | ?: 括号 常量）翻译成对 uint64 字的 Python 表达式
+    优先级与 Verilog 一致: ~ > & > ^ > | > ?:；S ? B : A 展开为 (S & B) | (~S & A)
+    """
+    tokens = []
+    for const, ident, op in _CELL_TOKEN_RE.findall(expr):
+        tokens.append(('const', const) if const else ('id', ident) if ident else ('op', op))
+    pos = 0
+
+    def peek():
+        return tokens[pos][1] if pos < len(tokens) else None
+
+    def take(expected=None):
+        nonlocal pos
+        if pos >= len(tokens) or (expected is not None and tokens[pos][1] != expected):
+            raise ValueError(f"无法解析单元表达式: {expr}")
+        pos += 1
+        return tokens[pos - 1]
+
+    def ternary():
+        cond = bitwise(0)
+        if peek() == '?':
+            take('?')
+            a = ternary()
+            take(':')
+            b = ternary()
+            return f"(({cond}) & ({a}) | ~({cond}) & ({b}))"
+        return cond
+
+    levels = ('|', '^', '&')
+
+    def bitwise(level):
+        if level == len(levels):
+            return unary()
+        left = bitwise(level + 1)
+        while peek() == levels[level]:
+            take()
+            left = f"({left} {levels[level]} {bitwise(level + 1)})"
+        return left
+
+    def unary():
+        kind, val = take()
+        if kind == 'op' and val == '~':
+            return f"~{unary()}"
+        if kind == 'op' and val == '(':
+            inner = ternary()
+            take(')')
+            return f"({inner})"
+        if kind == 'const':
+            return '_ONE' if val.endswith('1') else '_ZERO'
+        if kind == 'id' and val in pins:
+            return f"i{pins.index(val)}"
+        raise ValueError(f"无法解析单元表达式: {expr}")
+
+    out = ternary()
+    if pos != len(tokens):
+        raise ValueError(f"无法解析单元表达式: {expr}")
+    return out
+
+
+def _split_port_names(decl: str) -> Optional[List[str]]:
+    """端口声明体 → 名字列表；带位宽（多位端口）的返回 None"""
+    if '[' in decl:
+        return None
+    return [n.strip() for n in decl.split(',') if n.strip()]
+
+
+def compile_cell_library(cell_lib_path: str = CELL_LIB) -> Dict[str, CellModel]:
+    """
+    解析 cells.v，把所有纯组合单元（只由 assign 描述的单比特端口）编译为 CellModel
+    含 always / reg / initial 的时序或行为级模块（DFF、Stratix LUT/RAM 等）不收录
+    """
+    with open(cell_lib_path, 'r', encoding='utf-8') as f:
+        text = strip_comments(f.read())
+    cells = {}
+    for name, _, body in _CELL_MODULE_RE.findall(text):
+        if re.search(r'\b(always|initial|reg)\b', body):
+            continue
+        inputs, outputs = [], []
+        ok = True
+        for kind, decl in re.findall(r'\b(input|output)\s+([^;]+);', body):
+            names = _split_port_names(decl)
+            if names is None:
+                ok = False
+                break
+            (inputs if kind == 'input' else outputs).extend(names)
+        assigns = dict(_CELL_ASSIGN_RE.findall(body))
+        if not ok or not outputs or any(o not in assigns for o in outputs):
+            continue
+        pins = tuple(inputs)
+        try:
+            body_src = ', '.join(_compile_cell_expr(assigns[o], pins) for o in outputs)
+        except ValueError:
+            continue
+        args = ', '.join(f"i{k}" for k in range(len(pins)))
+        fn = eval(f"lambda {args}: ({body_src},)", {'_ONE': ALL_ONES, '_ZERO': ZERO})
+        cells[name] = CellModel(name, pins, tuple(outputs), {o: assigns[o].strip() for o in outputs}, fn)
+    return cells
+
+
+# ===== 2. 网表解析与分层 =====
+
+_NAME_TOKEN = r"\\\S+|[A-Za-z_][\w$]*(?:\s*\[\s*\d+\s*\])?"
+_INST_RE = re.compile(rf'^\s*({_NAME_TOKEN})\s+({_NAME_TOKEN})\s*\((.*)\)\s*$', re.DOTALL)
+_PIN_RE = re.compile(rf"\.(\w+)\s*\(\s*({_NAME_TOKEN}|1'b[01])?\s*\)")
+_RANGE_RE = re.compile(r'^\s*\[\s*(\d+)\s*:\s*(\d+)\s*\]\s*')
+
+
+def net_name(token: str) -> str:
+    """统一线网名：去掉转义标识符的反斜杠与空白（\\a[0]  → a[0]）"""
+    token = token.strip()
+    if token.startswith('\\'):
+        token = token[1:]
+    return re.sub(r'\s+', '', token)
+
+
+def _decl_names(body: str) -> List[str]:
+    """input/output/wire 声明体 → 位级线网名（[m:n] 向量展开为 name[i]）"""
+    body = re.sub(r'^\s*(?:wire|reg|logic|signed|unsigned)\s+', '', body)
+    m = _RANGE_RE.match(body)
+    names = [net_name(t) for t in re.findall(_NAME_TOKEN, body[m.end():] if m else body)]
+    if not m:
+        return names
+    hi, lo = int(m.group(1)), int(m.group(2))
+    step = -1 if hi >= lo else 1
+    return [f"{n}[{i}]" for n in names for i in range(hi, lo + step, step)]
+
+
+class GateNetlist:
+    """
+    分层后的组合门级网表
+    - net_names / net_index: 线网编号（0/1 号固定为常量 1'b0 / 1'b1）
+    - inputs / outputs: 端口线网编号（按端口声明顺序）
+    - gate_cell / gate_inputs / gate_outputs / gate_level: 逐门信息
+    - groups: 按 (层级, 单元类型) 排序的门组 (cell, 输入线网 [k, n_in], 输出线网 [k, n_out], 门编号 [k])
+    """
+
+    def __init__(self, module: str, net_names: List[str], inputs: List[int], outputs: List[int],
+                 gate_cell: List[str], gate_inputs: List[Tuple[int, ...]], gate_outputs: List[Tuple[int, ...]],
+                 cells: Dict[str, CellModel]):
+        self.module = module
+        self.net_names = net_names
+        self.net_index = {n: i for i, n in enumerate(net_names)}
+        self.inputs = inputs
+        self.outputs = outputs
+        self.cells = cells
+        self.gate_cell = gate_cell
+        self.gate_inputs = gate_inputs
+        self.gate_outputs = gate_outputs
+        self.n_nets = len(net_names)
+        self.n_gates = len(gate_cell)
+        self.driver = np.full(self.n_nets, -1, dtype=np.int64)
+        for g, outs in enumerate(gate_outputs):
+            for n in outs:
+                if self.driver[n] >= 0:
+                    raise ValueError(f"线网 {net_names[n]} 有多个驱动")
+                self.driver[n] = g
+        self.gate_level = self._levelize()
+        self.depth = int(self.gate_level.max()) if self.n_gates else 0
+        self.groups = self._build_groups()
+
+    def _levelize(self) -> np.ndarray:
+        """Kahn 拓扑排序求每个门的逻辑层级（= 1 + 输入线网驱动门的最大层级），有组合环时报错"""
+        fanout: List[List[int]] = [[] for _ in range(self.n_nets)]
+        indeg = np.zeros(self.n_gates, dtype=np.int64)
+        for g, ins in enumerate(self.gate_inputs):
+            for n in ins:
+                if self.driver[n] >= 0:
+                    fanout[n].append(g)
+                    indeg[g] += 1
+        level = np.zeros(self.n_gates, dtype=np.int64)
+        ready = [g for g in range(self.n_gates) if indeg[g] == 0]
+        for g in ready:
+            level[g] = 1
+        done = 0
+        while ready:
+            g = ready.pop()
+            done += 1
+            for n in self.gate_outputs[g]:
+                for h in fanout[n]:
+                    level[h] = max(level[h], level[g] + 1)
+                    indeg[h] -= 1
+                    if indeg[h] == 0:
+                        ready.append(h)
+        if done != self.n_gates:
+            raise ValueError(f"{self.module}: 网表存在组合环，无法分层")
+        return level
+
+    def _build_groups(self) -> List[Tuple[CellModel, np.ndarray, np.ndarray, np.ndarray]]:
+        order = sorted(range(self.n_gates), key=lambda g: (self.gate_level[g], self.gate_cell[g]))
+        groups = []
+        start = 0
+        while start < len(order):
+            key = (self.gate_level[order[start]], self.gate_cell[order[start]])
+            end = start
+            while end < len(order) and (self.gate_level[order[end]], self.gate_cell[order[end]]) == key:
+                end += 1
+            gates = np.array(order[start:end], dtype=np.int64)
+            cell = self.cells[key[1]]
+            ins = np.array([self.gate_inputs[g] for g in gates], dtype=np.int64).reshape(len(gates), len(cell.inputs))
+            outs = np.array([self.gate_outputs[g] for g in gates], dtype=np.int64).reshape(len(gates), len(cell.outputs))
+            groups.append((cell, ins, outs, gates))
+            start = end
+        return groups
+
+    # ----- 位并行求值 -----
+
+    def pack_patterns(self, bits: np.ndarray) -> np.ndarray:
+        """激励位矩阵 [n_patterns, n_inputs]（bool）→ 输入字 [n_inputs, n_words]，第 p 个向量在第 p//64 字的第 p%64 位"""
+        n_patterns = bits.shape[0]
+        n_words = max(1, -(-n_patterns // WORD_BITS))
+        padded = np.zeros((len(self.inputs), n_words * WORD_BITS), dtype=bool)
+        padded[:, :n_patterns] = bits.T
+        return np.packbits(padded, axis=1, bitorder='little').view('<u8')
+
+    def simulate(self, in_words: np.ndarray) -> np.ndarray:
+        """按层级逐组求值，返回全部线网的值 [n_nets, n_words]（uint64）"""
+        values = np.zeros((self.n_nets, in_words.shape[1]), dtype=np.uint64)
+        values[1] = ALL_ONES
+        values[self.inputs] = in_words
+        for cell, ins, outs, _ in self.groups:
+            results = cell.fn(*(values[ins[:, p]] for p in range(ins.shape[1])))
+            for q, res in enumerate(results):
+                values[outs[:, q]] = res
+        return values
+
+    def unpack(self, words: np.ndarray, n_patterns: int) -> np.ndarray:
+        """线网值字 [k, n_words] → 位矩阵 [n_patterns, k]（bool）"""
+        bits = np.unpackbits(np.ascontiguousarray(words).view(np.uint8), axis=1, bitorder='little')
+        return bits[:, :n_patterns].T.astype(bool)
+
+
+def parse_gate_netlist(netlist_path: str, cells: Dict[str, CellModel]) -> GateNetlist:
+    """解析门级网表（按名连接的单元实例；端口可为转义标识符或 [m:n] 向量），建立分层结构"""
+    with open(netlist_path, 'r', encoding='utf-8') as f:
+        text = strip_comments(f.read())
+    m = re.search(r'\bmodule\s+(\w+)\s*\((.*?)\)\s*;', text, re.DOTALL)
+    if not m:
+        raise ValueError(f"{netlist_path}: 未找到 module 声明")
+    module = m.group(1)
+    body = text[m.end():text.find('endmodule', m.end())]
+
+    net_names = list(CONST_NETS)
+    index = dict(CONST_NETS)
+
+    def net_id(name: str) -> int:
+        if name not in index:
+            index[name] = len(net_names)
+            net_names.append(name)
+        return index[name]
+
+    inputs, outputs = [], []
+    gate_cell, gate_inputs, gate_outputs = [], [], []
+    for stmt in body.split(';'):
+        s = stmt.strip()
+        if not s:
+            continue
+        kw = re.match(r'(input|output|inout|wire)\b', s)
+        if kw:
+            names = _decl_names(s[kw.end():])
+            if kw.group(1) == 'input':
+                inputs.extend(net_id(n) for n in names)
+            elif kw.group(1) == 'output':
+                outputs.extend(net_id(n) for n in names)
+            else:
+                for n in names:
+                    net_id(n)
+            continue
+        inst = _INST_RE.match(s)
+        if not inst:
+            raise ValueError(f"{netlist_path}: 无法解析语句: {s[:80]}")
+        cell_name = net_name(inst.group(1))
+        cell = cells.get(cell_name)
+        if cell is None:
+            raise ValueError(f"{netlist_path}: 单元 {cell_name} 不是 {CELL_LIB} 中的组合单元（时序网表不受支持）")
+        pins = {p: net_id(net_name(n)) for p, n in _PIN_RE.findall(inst.group(3)) if n}
+        missing = [p for p in cell.inputs + cell.outputs if p not in pins]
+        if missing:
+            raise ValueError(f"{netlist_path}: 实例 {net_name(inst.group(2))} 缺少端口 {missing}")
+        gate_cell.append(cell_name)
+        gate_inputs.append(tuple(pins[p] for p in cell.inputs))
+        gate_outputs.append(tuple(pins[p] for p in cell.outputs))
+    return GateNetlist(module, net_names, inputs, outputs, gate_cell, gate_inputs, gate_outputs, cells)
+
+
+# ===== 3. Testbench 激励（解释执行主 initial 块） =====
+
+def _verilog_int(literal: str) -> Tuple[int, int, bool]:
+    """Verilog 整数常量 → (值, 位宽, 是否有符号)；x/z 按 0（与 Verilator 两值仿真一致）"""
+    s = literal.replace('_', '').strip()
+    m = re.match(r"^(\d*)'([sS]?)([bBoOdDhH])([0-9a-fA-FxXzZ?]+)$", s)
+    if not m:
+        return int(s), 32, True
+    size = int(m.group(1)) if m.group(1) else 32
+    base = {'b': 2, 'o': 8, 'd': 10, 'h': 16}[m.group(3).lower()]
+    digits = re.sub(r'[xXzZ?]', '0', m.group(4))
+    return int(digits, base) & ((1 << size) - 1), size, bool(m.group(2))
+
+
+class _StopSimulation(Exception):
+    pass
+
+
+class TestbenchStimulus:
+    """
+    testbench 解释结果
+    - input_bits: 每个采样点的 DUT 输入 [n_samples, n_inputs]（列顺序同 netlist.inputs）
+    - displays: 每条 $display 的 (采样点, 格式串, 参数 AST 列表, 当时的 TB 变量值)
+    - wire_bits: TB 线网 → [(位, DUT 输出线网编号)]，由 DUT 实例的输出端口连接得到
+    """
+
+    def __init__(self, netlist: GateNetlist, tb_path: str):
+        self.netlist = netlist
+        self.tb_path = tb_path
+        self.widths: Dict[str, Tuple[int, bool]] = {}
+        self.env: Dict[str, int] = {}
+        self.wire_bits: Dict[str, List[Tuple[int, int]]] = {}
+        self.input_conns: List[Tuple[int, object]] = []
+        self.samples: List[List[int]] = []
+        self.displays: List[Tuple[int, str, list, Dict[str, int]]] = []
+        self.value_displays: List[int] = []  # 能解析出输出值的 $display 编号（golden_values 之后有效）
+        self._settled: Dict[str, int] = {}
+        self._settled_sample = -1
+        self._run(self._parse())
+
+    @property
+    def n_samples(self) -> int:
+        return len(self.samples)
+
+    @property
+    def input_bits(self) -> np.ndarray:
+        return np.array(self.samples, dtype=bool).reshape(len(self.samples), len(self.netlist.inputs))
+
+    # ----- 解析 -----
+
+    def _parse(self):
+        try:
+            from pyverilog.vparser.parser import VerilogParser
+        except ImportError:
+            raise ImportError("解析 testbench 需要 pyverilog (`pip install pyverilog`)")
+        with open(self.tb_path, 'r', encoding='utf-8') as f:
+            text = f.read()
+        text = re.sub(r'^\s*`.*$', '', text, flags=re.MULTILINE)
+        # pyverilog 不支持 ANSI 风格的 function 端口；激励块不调用这些辅助函数，直接去掉
+        text = re.sub(r'\bfunction\b.*?\bendfunction\b', '', text, flags=re.DOTALL)
+        parser = VerilogParser(outputdir=os.path.join(tempfile.gettempdir(), 'pyverilog_parsetab'), debug=False)
+        ast = parser.parse(text)
+        return ast.description.definitions[0]
+
+    def _run(self, tb_module):
+        from pyverilog.vparser import ast as vast
+        initials = []
+        dut = None
+        for item in tb_module.items:
+            if isinstance(item, vast.Decl):
+                for d in item.list:
+                    self._declare(d)
+            elif isinstance(item, vast.InstanceList) and net_name(item.module) == self.netlist.module:
+                dut = item.instances[0]
+            elif isinstance(item, vast.Initial):
+                initials.append(item)
+        if dut is None:
+            raise ValueError(f"{self.tb_path}: 未找到 DUT 实例 ({self.netlist.module})")
+        if not initials:
+            raise ValueError(f"{self.tb_path}: 没有 initial 块")
+        self._connect(dut)
+        # 与故障注入脚本一致：第一个 initial 块是激励主块，其余 (dumpfile / 提示信息) 不影响 DUT 输入
+        try:
+            self._exec(initials[0].statement)
+        except _StopSimulation:
+            pass
+
+    def _declare(self, d):
+        from pyverilog.vparser import ast as vast
+        name = net_name(d.name)
+        if isinstance(d, (vast.Parameter, vast.Localparam)):
+            value, width, signed = self._eval(d.value.var if hasattr(d.value, 'var') else d.value)
+            self.widths[name] = (width, signed)
+            self.env[name] = value
+            return
+        if isinstance(d, vast.Integer):
+            self.widths[name] = (32, True)
+        else:
+            width = 1
+            if d.width is not None:
+                width = abs(self._eval(d.width.msb)[0] - self._eval(d.width.lsb)[0]) + 1
+            self.widths[name] = (width, bool(d.signed))
+        self.env.setdefault(name, 0)
+
+    def _connect(self, dut):
+        """DUT 端口连接：输入端口记下 TB 侧表达式，输出端口把 TB 线网的位映射到 DUT 输出线网"""
+        from pyverilog.vparser import ast as vast
+        nl = self.netlist
+        port_order = [nl.net_names[n] for n in nl.inputs + nl.outputs]
+        conns = {}
+        for k, pa in enumerate(dut.portlist):
+            port = net_name(pa.portname) if pa.portname else port_order[k]
+            conns[port] = pa.argname
+        output_set = set(nl.outputs)
+        for port, expr in conns.items():
+            nid = nl.net_index.get(port)
+            if nid is None or expr is None:
+                continue
+            if nid in output_set:
+                if isinstance(expr, vast.Identifier):
+                    self.wire_bits.setdefault(net_name(expr.name), []).append((0, nid))
+                elif isinstance(expr, vast.Pointer):
+                    self.wire_bits.setdefault(net_name(expr.var.name), []).append((self._eval(expr.ptr)[0], nid))
+                else:
+                    raise ValueError(f"{self.tb_path}: 不支持的输出端口连接 .{port}({expr})")
+        self.input_conns = [conns.get(nl.net_names[n]) for n in nl.inputs]
+
+    # ----- 表达式求值：返回 (值, 位宽, 是否有符号) -----
+
+    def _eval(self, node, env: Optional[Dict[str, int]] = None):
+        from pyverilog.vparser import ast as vast
+        env = self.env if env is None else env
+        t = type(node)
+        if t is vast.IntConst:
+            return _verilog_int(node.value)
+        if t is vast.Identifier:
+            name = net_name(node.name)
+            if name not in env:
+                raise ValueError(f"{self.tb_path}: 未声明的变量 {name}")
+            width, signed = self.widths.get(name, (32, True))
+            return env[name], width, signed
+        if t is vast.Pointer:
+            value = self._eval(node.var, env)[0]
+            return (value >> self._eval(node.ptr, env)[0]) & 1, 1, False
+        if t is vast.Partselect:
+            value = self._eval(node.var, env)[0]
+            msb, lsb = self._eval(node.msb, env)[0], self._eval(node.lsb, env)[0]
+            width = abs(msb - lsb) + 1
+            return (value >> min(msb, lsb)) & ((1 << width) - 1), width, False
+        if t in (vast.Concat, vast.LConcat):
+            value, width = 0, 0
+            for item in node.list:
+                v, w, _ = self._eval(item, env)
+                value = (value << w) | (v & ((1 << w) - 1))
+                width += w
+            return value, width, False
+        if t is vast.Repeat:
+            v, w, _ = self._eval(node.value, env)
+            times = self._eval(node.times, env)[0]
+            value = 0
+            for _ in range(times):
+                value = (value << w) | (v & ((1 << w) - 1))
+            return value, w * times, False
+        if t is vast.Cond:
+            return self._eval(node.true_value if self._eval(node.cond, env)[0] else node.false_value, env)
+        if isinstance(node, vast.UnaryOperator):
+            v, w, s = self._eval(node.right, env)
+            mask = (1 << w) - 1
+            if t is vast.Unot:
+                return ~v & mask, w, s
+            if t is vast.Ulnot:
+                return int(v == 0), 1, False
+            if t is vast.Uminus:
+                return -v & mask if not s else -v, w, s
+            if t is vast.Uplus:
+                return v, w, s
+            reduced = {vast.Uand: int(v & mask == mask), vast.Unand: int(v & mask != mask),
+                       vast.Uor: int(v != 0), vast.Unor: int(v == 0),
+                       vast.Uxor: bin(v & mask).count('1') & 1, vast.Uxnor: 1 - (bin(v & mask).count('1') & 1)}
+            if t in reduced:
+                return reduced[t], 1, False
+        if isinstance(node, vast.Operator):
+            a, wa, sa = self._eval(node.left, env)
+            b, wb, sb = self._eval(node.right, env)
+            w, s = max(wa, wb), sa and sb
+            if t in _ARITH_OPS:
+                return _ARITH_OPS[t](a, b), w, s
+            if t in _SHIFT_OPS:
+                return _SHIFT_OPS[t](a, b), wa, sa
+            if t in _COMPARE_OPS:
+                if not s:
+                    a, b = a & ((1 << wa) - 1), b & ((1 << wb) - 1)
+                return int(_COMPARE_OPS[t](a, b)), 1, False
+            if t in _BITWISE_OPS:
+                return _BITWISE_OPS[t](a, b) & ((1 << w) - 1), w, s
+        raise ValueError(f"{self.tb_path}: 不支持的表达式 {t.__name__}")
+
+    # ----- 语句执行 -----
+
+    def _assign(self, lhs, value: int):
+        from pyverilog.vparser import ast as vast
+        t = type(lhs)
+        if t is vast.Identifier:
+            name = net_name(lhs.name)
+            width, _ = self.widths.get(name, (32, True))
+            self.env[name] = value & ((1 << width) - 1)
+        elif t is vast.Pointer:
+            name = net_name(lhs.var.name)
+            bit = self._eval(lhs.ptr)[0]
+            self.env[name] = (self.env[name] & ~(1 << bit)) | ((value & 1) << bit)
+        elif t is vast.Partselect:
+            name = net_name(lhs.var.name)
+            msb, lsb = self._eval(lhs.msb)[0], self._eval(lhs.lsb)[0]
+            lo, width = min(msb, lsb), abs(msb - lsb) + 1
+            mask = ((1 << width) - 1) << lo
+            self.env[name] = (self.env[name] & ~mask) | ((value << lo) & mask)
+        elif isinstance(lhs, vast.Concat):
+            for item in reversed(lhs.list):
+                width = self._eval(item)[1]
+                self._assign(item, value & ((1 << width) - 1))
+                value >>= width
+        else:
+            raise ValueError(f"{self.tb_path}: 不支持的赋值目标 {t.__name__}")
+
+    def _exec(self, node):
+        from pyverilog.vparser import ast as vast
+        if node is None:
+            return
+        t = type(node)
+        if t is vast.Block:
+            for stmt in node.statements:
+                self._exec(stmt)
+        elif t is vast.SingleStatement:
+            self._exec(node.statement)
+        elif t in (vast.BlockingSubstitution, vast.NonblockingSubstitution):
+            if node.ldelay is not None:
+                self._advance_time()
+            self._assign(node.left.var, self._eval(node.right.var)[0])
+        elif t is vast.DelayStatement:
+            self._advance_time()
+        elif t is vast.IfStatement:
+            self._exec(node.true_statement if self._eval(node.cond)[0] else node.false_statement)
+        elif t is vast.ForStatement:
+            self._exec(node.pre)
+            while self._eval(node.cond)[0]:
+                self._exec(node.statement)
+                self._exec(node.post)
+        elif t is vast.WhileStatement:
+            while self._eval(node.cond)[0]:
+                self._exec(node.statement)
+        elif t is vast.CaseStatement:
+            comp = self._eval(node.comp)[0]
+            for case in node.caselist:
+                if case.cond is None or any(self._eval(c)[0] == comp for c in case.cond):
+                    self._exec(case.statement)
+                    break
+        elif t is vast.SystemCall:
+            self._system_call(node)
+        else:
+            raise ValueError(f"{self.tb_path}: 不支持的语句 {t.__name__}")
+
+    def _advance_time(self):
+        """时间推进：此前对 TB 寄存器的赋值在之后的 $display 中才可见（组合逻辑在时间步末尾求值）"""
+        self._settled = dict(self.env)
+        self._settled_sample = -1
+
+    def _system_call(self, node):
+        if node.syscall in ('finish', 'stop'):
+            raise _StopSimulation()
+        if node.syscall not in ('display', 'write'):
+            return
+        args = list(node.args)
+        fmt = args.pop(0).value if args and type(args[0]).__name__ == 'StringConst' else ''
+        if self._settled_sample < 0:
+            self.samples.append([self._input_bit(expr) for expr in self.input_conns])
+            self._settled_sample = len(self.samples) - 1
+        self.displays.append((self._settled_sample, fmt, args, dict(self.env)))
+
+    def _input_bit(self, expr) -> int:
+        return 0 if expr is None else self._eval(expr, self._settled)[0] & 1
+
+    # ----- 输出渲染 -----
+
+    def wire_values(self, out_bits: np.ndarray) -> List[Dict[str, int]]:
+        """DUT 输出位矩阵 [n_samples, n_outputs] → 每个采样点上各 TB 输出线网的整数值"""
+        col = {nid: k for k, nid in enumerate(self.netlist.outputs)}
+        per_sample = [dict() for _ in range(out_bits.shape[0])]
+        for wire, bits in self.wire_bits.items():
+            width = max(b for b, _ in bits) + 1
+            mat = np.zeros((out_bits.shape[0], width), dtype=bool)
+            for b, nid in bits:
+                mat[:, b] = out_bits[:, col[nid]]
+            packed = np.packbits(mat, axis=1, bitorder='little')
+            for s in range(out_bits.shape[0]):
+                per_sample[s][wire] = int.from_bytes(packed[s].tobytes(), 'little')
+        return per_sample
+
+    def observed_outputs(self, node, env: Dict[str, int]) -> set:
+        """$display 参数表达式读到的 DUT 输出线网编号（TB 线网整体引用取全部位，位选/部分选只取对应位）"""
+        from pyverilog.vparser import ast as vast
+        t = type(node)
+        if t is vast.Identifier and net_name(node.name) in self.wire_bits:
+            return {nid for _, nid in self.wire_bits[net_name(node.name)]}
+        if t in (vast.Pointer, vast.Partselect) and type(node.var) is vast.Identifier \
+                and net_name(node.var.name) in self.wire_bits:
+            if t is vast.Pointer:
+                lo = hi = self._eval(node.ptr, env)[0]
+            else:
+                msb, lsb = self._eval(node.msb, env)[0], self._eval(node.lsb, env)[0]
+                lo, hi = min(msb, lsb), max(msb, lsb)
+            return {nid for b, nid in self.wire_bits[net_name(node.var.name)] if lo <= b <= hi}
+        observed = set()
+        for child in node.children():
+            observed |= self.observed_outputs(child, env)
+        return observed
+
+    def render(self, out_bits: np.ndarray) -> List[str]:
+        """按各条 $display 的格式渲染输出文本"""
+        per_sample = self.wire_values(out_bits)
+        lines = []
+        for sample, fmt, args, env in self.displays:
+            scope = dict(env)
+            scope.update(per_sample[sample])
+            values = [self._eval(a, scope) for a in args]
+            lines.append(format_display(fmt, values))
+        return lines
+
+
+_ARITH_OPS = None
+_SHIFT_OPS = None
+_COMPARE_OPS = None
+_BITWISE_OPS = None
+
+
+def _init_operator_tables():
+    """运算符表依赖 pyverilog 的 AST 类，首次解析 testbench 时才建立"""
+    global _ARITH_OPS, _SHIFT_OPS, _COMPARE_OPS, _BITWISE_OPS
+    if _ARITH_OPS is not None:
+        return
+    from pyverilog.vparser import ast as vast
+    _ARITH_OPS = {
+        vast.Plus: lambda a, b: a + b,
+        vast.Minus: lambda a, b: a - b,
+        vast.Times: lambda a, b: a * b,
+        vast.Divide: lambda a, b: int(a / b) if b else 0,
+        vast.Mod: lambda a, b: int(np.fmod(a, b)) if b else 0,
+        vast.Power: lambda a, b: a ** b,
+    }
+    _SHIFT_OPS = {
+        vast.Sll: lambda a, b: a << b, vast.Sla: lambda a, b: a << b,
+        vast.Srl: lambda a, b: a >> b, vast.Sra: lambda a, b: a >> b,
+    }
+    _COMPARE_OPS = {
+        vast.Eq: lambda a, b: a == b, vast.NotEq: lambda a, b: a != b,
+        vast.Eql: lambda a, b: a == b, vast.NotEql: lambda a, b: a != b,
+        vast.LessThan: lambda a, b: a < b, vast.GreaterThan: lambda a, b: a > b,
+        vast.LessEq: lambda a, b: a <= b, vast.GreaterEq: lambda a, b: a >= b,
+        vast.Land: lambda a, b: bool(a) and bool(b), vast.Lor: lambda a, b: bool(a) or bool(b),
+    }
+    _BITWISE_OPS = {
+        vast.And: lambda a, b: a & b, vast.Or: lambda a, b: a | b,
+        vast.Xor: lambda a, b: a ^ b, vast.Xnor: lambda a, b: ~(a ^ b),
+    }
+
+
+_FORMAT_SPEC_RE = re.compile(r'%(0?)(\d*)([hHxXdDbBoOsScC%])')
+
+
+def format_display(fmt: str, values: List[Tuple[int, int, bool]]) -> str:
+    """$display 格式化（%h/%x/%d/%b/%o/%s/%c，可带宽度）；无格式串时参数按十进制空格分隔"""
+    if not fmt:
+        return ' '.join(str(v) for v, _, _ in values)
+    it = iter(values)
+
+    def sub(m):
+        zero, width, conv = m.group(1), m.group(2), m.group(3).lower()
+        if conv == '%':
+            return '%'
+        value, bits, _ = next(it, (0, 1, False))
+        if conv in 'hx':
+            natural = -(-bits // 4)
+            text = format(value, 'x')
+        elif conv == 'b':
+            natural = bits
+            text = format(value, 'b')
+        elif conv == 'o':
+            natural = -(-bits // 3)
+            text = format(value, 'o')
+        elif conv == 'c':
+            return chr(value & 0xFF)
+        elif conv == 's':
+            return value.to_bytes(max(1, -(-bits // 8)), 'big').lstrip(b'\0').decode('latin-1')
+        else:
+            natural = len(str((1 << bits) - 1))
+            text = str(value)
+            if not zero and not width:
+                return text.rjust(natural)
+        if zero and not width:
+            return text
+        pad = int(width) if width else natural
+        return text.rjust(pad, '0')
+
+    return _FORMAT_SPEC_RE.sub(sub, fmt)
+
+
+def parse_output_value(line: str) -> Optional[int]:
+    """与故障注入脚本解析 golden 输出相同：匹配 o_sum=... 或裸十六进制，x/z 记为 -1，不匹配返回 None"""
+    m = OSUM_HEX_RE.search(line) or ALT_HEX_RE.search(line)
+    if not m:
+        return None
+    s = m.group(1).lower()
+    if 'x' in s or 'z' in s:
+        return -1
+    try:
+        return int(s, 16)
+    except ValueError:
+        return -1
+
+
+def load_stimulus(netlist: GateNetlist, tb_path: str) -> TestbenchStimulus:
+    _init_operator_tables()
+    return TestbenchStimulus(netlist, tb_path)
+
+
+def golden_values(netlist: GateNetlist, stim: TestbenchStimulus) -> Tuple[List[int], np.ndarray]:
+    """无故障仿真全部采样点，返回 (golden 值列表, 全线网值 [n_nets, n_words])"""
+    values = netlist.simulate(netlist.pack_patterns(stim.input_bits))
+    out_bits = netlist.unpack(values[netlist.outputs], stim.n_samples)
+    vals = [parse_output_value(line) for line in stim.render(out_bits)]
+    stim.value_displays = [d for d, v in enumerate(vals) if v is not None]
+    return [v for v in vals if v is not None], values
+
+
+# ===== 4. PPSFP 故障仿真 =====
+#
+# 并行激励单故障传播 (Parallel-Pattern Single-Fault Propagation)，结果与 Verilator 全量注入逐故障一致:
+# - 无故障仿真一次，保存全部线网的 good 值（激励按位打包）
+# - 扇出为 1 的线网组成无扇出区 (FFR)：沿唯一扇出门的敏感位（翻转该输入是否翻转输出）向区根 (stem)
+#   做关键路径追踪，得到每个线网到区根的局部可观测位
+# - 区根翻转在各采样点上会让哪些 $display 值改变，用 stem 翻转传播求出：多个 stem 沿字方向并排，
+#   从 good 值出发只重算它们扇出锥内、输入确有变化的门
+# - 故障 (线网 n, 固定值 v) 的 diff_count = Σ_display [good(n)≠v] · 局部可观测(n) · stem 翻转改变该 display
+
+PPSFP_MEM_BYTES = 512 * 1024 * 1024  # stem 批量传播的工作区上限（决定每批并排的 stem 数）
+FAULT_TARGET_EXCLUDE_RE = re.compile(r'^(clk|clock|rst|reset)', re.I)
+
+
+class PPSFPEngine:
+    """单个电路的 PPSFP 故障仿真器：good 值、FFR 局部可观测性、display 观测结构"""
+
+    def __init__(self, netlist: GateNetlist, stim: TestbenchStimulus, golden: List[int], good: np.ndarray):
+        self.netlist = netlist
+        self.golden = golden
+        self.good = good
+        self.n_words = good.shape[1]
+        out_col = {nid: k for k, nid in enumerate(netlist.outputs)}
+
+        # display 观测结构：同一组输出列的 display 合为一组 (输出列, 采样点, display 序号)
+        groups: Dict[Tuple[int, ...], Tuple[List[int], List[int]]] = {}
+        for k, d in enumerate(stim.value_displays):
+            sample, _, args, env = stim.displays[d]
+            observed = set()
+            for a in args:
+                observed |= stim.observed_outputs(a, env)
+            cols = tuple(sorted(out_col[n] for n in observed))
+            groups.setdefault(cols, ([], []))
+            groups[cols][0].append(sample)
+            groups[cols][1].append(k)
+        self.display_groups = [(np.array(c, dtype=np.int64), np.array(s, dtype=np.int64), np.array(i, dtype=np.int64))
+                               for c, (s, i) in groups.items() if c]
+        self.n_displays = len(stim.value_displays)
+        self.display_samples = np.array([stim.displays[d][0] for d in stim.value_displays], dtype=np.int64)
+
+        self._build_ffr()
+
+    def _build_ffr(self):
+        """划分无扇出区：扇出引脚数 ≠ 1、原始输出、或扇出门为多输出单元的线网作为 stem"""
+        nl = self.netlist
+        pin_count = np.zeros(nl.n_nets, dtype=np.int64)
+        fanout_pin = np.full((nl.n_nets, 2), -1, dtype=np.int64)  # 唯一扇出 (门, 引脚)
+        for g, ins in enumerate(nl.gate_inputs):
+            for p, n in enumerate(ins):
+                pin_count[n] += 1
+                fanout_pin[n] = (g, p)
+        is_stem = pin_count != 1
+        is_stem[nl.outputs] = True
+        is_stem[list(CONST_NETS.values())] = True
+        multi = [g for g in range(nl.n_gates) if len(nl.gate_outputs[g]) != 1]
+        for g in multi:
+            is_stem[list(nl.gate_inputs[g])] = True
+        self.is_stem = is_stem
+
+        # 非 stem 线网在唯一扇出引脚上的敏感位: 翻转该输入后门输出的变化
+        sens = np.zeros_like(self.good)
+        for cell, ins, outs, _ in nl.groups:
+            if outs.shape[1] != 1:
+                continue
+            base_in = [self.good[ins[:, p]] for p in range(ins.shape[1])]
+            base = cell.fn(*base_in)[0]
+            for p in range(ins.shape[1]):
+                rows = ~is_stem[ins[:, p]]
+                if not rows.any():
+                    continue
+                flipped = list(base_in)
+                flipped[p] = ~base_in[p]
+                sens[ins[rows, p]] = (cell.fn(*flipped)[0] ^ base)[rows]
+
+        # 逆拓扑序追踪到区根：obs(n) = sens(n) & obs(扇出门输出)，root(n) = root(扇出门输出)
+        self.root = np.arange(nl.n_nets, dtype=np.int64)
+        self.obs = np.empty_like(self.good)
+        self.obs[is_stem] = ALL_ONES
+        net_level = np.zeros(nl.n_nets, dtype=np.int64)
+        driven = nl.driver >= 0
+        net_level[driven] = nl.gate_level[nl.driver[driven]]
+        inner = np.flatnonzero(~is_stem)
+        for n in inner[np.argsort(-net_level[inner], kind='stable')]:
+            out = nl.gate_outputs[fanout_pin[n, 0]][0]
+            self.root[n] = self.root[out]
+            self.obs[n] = sens[n] & self.obs[out]
+        self.net_level = net_level
+
+    def _fanout_groups(self) -> Tuple[np.ndarray, np.ndarray]:
+        """线网 → 扇出门所在门组编号 (CSR: ptr [n_nets+1], 组编号)"""
+        nl = self.netlist
+        gate_group = np.empty(nl.n_gates, dtype=np.int64)
+        for gi, (_, _, _, gates) in enumerate(nl.groups):
+            gate_group[gates] = gi
+        pin_net = np.array([n for ins in nl.gate_inputs for n in ins], dtype=np.int64)
+        pin_group = np.repeat(gate_group, [len(ins) for ins in nl.gate_inputs])
+        pairs = np.unique(np.stack([pin_net, pin_group], axis=1), axis=0) if len(pin_net) else np.zeros((0, 2), np.int64)
+        ptr = np.zeros(nl.n_nets + 1, dtype=np.int64)
+        np.cumsum(np.bincount(pairs[:, 0], minlength=nl.n_nets), out=ptr[1:])
+        return ptr, pairs[:, 1]
+
+    def stem_display_diff(self, stems: np.ndarray, mem_bytes: int = PPSFP_MEM_BYTES) -> np.ndarray:
+        """
+        各 stem 在全部采样点上翻转时，哪些 display 的值会改变 → bool [len(stems), n_displays]
+        按层级排序后分批并排传播：批内每个 stem 占 n_words 个字，只重算输入有变化的门
+        """
+        nl = self.netlist
+        W = self.n_words
+        result = np.zeros((len(stems), self.n_displays), dtype=bool)
+        if not len(stems) or not self.display_groups:
+            return result
+        batch = max(1, min(len(stems), mem_bytes // max(1, nl.n_nets * W * 8)))
+        order = np.argsort(self.net_level[stems], kind='stable')
+        fo_ptr, fo_group = self._fanout_groups()
+        outputs = np.array(nl.outputs, dtype=np.int64)
+        good_out = self.good[outputs][:, None, :]
+        work = np.empty((nl.n_nets, batch * W), dtype=np.uint64)
+        forced_col = np.full(nl.n_nets, -1, dtype=np.int64)
+        pending = np.zeros(len(nl.groups), dtype=bool)
+
+        def schedule(nets):
+            """变化线网的扇出门组标记为待算（组按层级编号，扇出组编号总大于当前组）"""
+            starts, counts = fo_ptr[nets], fo_ptr[nets + 1] - fo_ptr[nets]
+            total = int(counts.sum())
+            if total:
+                pending[fo_group[np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)]] = True
+
+        for start in range(0, len(stems), batch):
+            idx = order[start:start + batch]
+            b = len(idx)
+            batch_stems = stems[idx]
+            F = work[:, :b * W]
+            F.reshape(nl.n_nets, b, W)[:] = self.good[:, None, :]
+            changed = np.zeros(nl.n_nets, dtype=bool)
+            for j, s in enumerate(batch_stems):
+                F[s, j * W:(j + 1) * W] = ~self.good[s]
+                forced_col[s] = j
+            changed[batch_stems] = True
+            schedule(batch_stems)
+
+            for gi in range(len(nl.groups)):
+                if not pending[gi]:
+                    continue
+                pending[gi] = False
+                cell, ins, outs, _ = nl.groups[gi]
+                rows = changed[ins].any(axis=1)
+                r_ins, r_outs = ins[rows], outs[rows]
+                res = cell.fn(*(F[r_ins[:, p]] for p in range(r_ins.shape[1])))
+                for q, val in enumerate(res):
+                    tgt = r_outs[:, q]
+                    diff = (val.reshape(len(tgt), b, W) != self.good[tgt][:, None, :]).any(axis=(1, 2))
+                    F[tgt] = val
+                    # stem 自身被翻转，不能被其驱动门的重算覆盖
+                    forced = forced_col[tgt] >= 0
+                    for n in tgt[forced]:
+                        j = forced_col[n]
+                        F[n, j * W:(j + 1) * W] = ~self.good[n]
+                    fresh = tgt[diff & ~changed[tgt]]
+                    changed[fresh] = True
+                    schedule(fresh)
+
+            out_diff = (F[outputs].reshape(len(outputs), b, W) ^ good_out)
+            for cols, samples, disp in self.display_groups:
+                hit = np.bitwise_or.reduce(out_diff[cols], axis=0)
+                bits = np.unpackbits(hit.view(np.uint8), axis=1, bitorder='little')
+                result[idx[:, None], disp[None, :]] = bits[:, samples].astype(bool)
+            forced_col[batch_stems] = -1
+        return result
+
+    def run(self, targets: List[str], mem_bytes: int = PPSFP_MEM_BYTES) -> Dict[str, Dict]:
+        """全部目标线网的 SA0/SA1 故障 → 与 full_injection_results.json 相同的结构"""
+        nl = self.netlist
+        nids = np.array([nl.net_index[t] for t in targets], dtype=np.int64)
+        roots = self.root[nids]
+        stems, root_pos = np.unique(roots, return_inverse=True)
+        stem_diff = self.stem_display_diff(stems, mem_bytes)
+
+        results = {}
+        disp_word = self.display_samples // WORD_BITS
+        disp_bit = (self.display_samples % WORD_BITS).astype(np.uint64)
+        for k, t in enumerate(targets):
+            n = nids[k]
+            propagated = self.obs[n][disp_word] >> disp_bit & np.uint64(1)
+            good_bit = self.good[n][disp_word] >> disp_bit & np.uint64(1)
+            reach = stem_diff[root_pos[k]] & propagated.astype(bool)
+            entry = {}
+            for name, stuck in (('sa0', 0), ('sa1', 1)):
+                diff_count = int(np.count_nonzero(reach & (good_bit != stuck)))
+                entry[name] = {'status': 'success', 'detected': diff_count > 0, 'diff_count': diff_count}
+            results[t] = entry
+        return results
+
+
+def fault_targets(verilog_path: str, module: str) -> List[str]:
+    """与 Verilator 注入流程相同的目标线网（不含时钟/复位）"""
+    from full_node_injection_verilator_parallel import parse_targets_from_netlist
+    with open(verilog_path, 'r', encoding='utf-8') as f:
+        net_text = f.read()
+    return [n for n in parse_targets_from_netlist(net_text, dut_module_name=module)
+            if not FAULT_TARGET_EXCLUDE_RE.match(n)]
+
+
+def run_ppsfp_campaign(circuit_name: str, verilog_path: str, tb_path: str,
+                       cells: Optional[Dict[str, CellModel]] = None,
+                       mem_bytes: int = PPSFP_MEM_BYTES) -> Tuple[List[int], Dict[str, Dict], Dict[str, float]]:
+    """单电路全量 SA0/SA1 故障仿真，返回 (golden 值, 逐线网结果, 各阶段耗时)"""
+    timing = {}
+    t0 = time.time()
+    cells = cells or compile_cell_library(CELL_LIB)
+    netlist = parse_gate_netlist(verilog_path, cells)
+    stim = load_stimulus(netlist, tb_path)
+    golden, good = golden_values(netlist, stim)
+    timing['golden_time'] = time.time() - t0
+
+    t0 = time.time()
+    engine = PPSFPEngine(netlist, stim, golden, good)
+    targets = fault_targets(verilog_path, netlist.module)
+    results = engine.run(targets, mem_bytes)
+    timing['fault_time'] = time.time() - t0
+    return golden, results, timing
+
+
+def run_ppsfp_injection(circuit_name: str, verilog_path: str, tb_path: str, output_dir: str):
+    """故障注入脚本的 PPSFP 引擎入口：输出文件与缓存规则同 run_circuit_injection_batched"""
+    os.makedirs(output_dir, exist_ok=True)
+    print(f'\n{"="*60}')
+    print(f'PPSFP 故障仿真: {circuit_name}')
+    print(f'{"="*60}')
+    res_json = os.path.join(output_dir, 'full_injection_results.json')
+    golden_json = os.path.join(output_dir, 'golden_result.json')
+    if os.path.exists(res_json) and os.path.exists(golden_json):
+        print('  [跳过] 发现已有结果')
+        try:
+            with open(golden_json, 'r', encoding='utf-8') as gf:
+                golden_data = json.load(gf)
+            with open(res_json, 'r', encoding='utf-8') as rf:
+                return golden_data['values'], json.load(rf)
+        except Exception:
+            pass
+
+    try:
+        golden, results, timing = run_ppsfp_campaign(circuit_name, verilog_path, tb_path)
+    except Exception as e:
+        print(f'  [错误] PPSFP 故障仿真失败: {e}')
+        return None, None
+    if not golden:
+        print('  [错误] 未找到 Golden 输出')
+        return None, None
+
+    with open(golden_json, 'w', encoding='utf-8') as f:
+        json.dump({'values': golden}, f)
+    with open(res_json, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    total_faults = 2 * len(results)
+    total_time = timing['golden_time'] + timing['fault_time']
+    print(f'  [Golden] 获取到 {len(golden)} 个输出值')
+    print(f'  [完成] 总时间: {total_time:.1f}s (golden: {timing["golden_time"]:.1f}s, 故障: {timing["fault_time"]:.1f}s)')
+    print(f'  [速率] {total_faults / max(total_time, 0.1):.1f} 故障/秒')
+    return golden, results
+
+
+# ===== 5. 结构故障压缩 =====
+#
+# 由 cells.v 单元语义推出线网级 stuck-at 故障的等价/支配关系（与 Verilator MUX 注入的线网故障模型一致）:
+# - 单元输入引脚 p 取 v 时输出恒为 c（控制值；BUF/INV 同样适用），且驱动 p 的线网只扇出到这一个引脚、
+#   不是原始输出 → (该线网 sa-v) ≡ (输出线网 sa-c)：两个故障电路完全相同，检出与 diff_count 都相同
+# - 同样条件下 (输出 sa-(1-c)) 支配 (该线网 sa-(1-v))：后者的任一测试都检出前者，只能推出"已检出"
+#   （组合网表成立；只用于 detect 比对模式，推出的条目没有 diff_count）
+
+def cell_controlling_values(cell: CellModel) -> List[Tuple[int, int, int]]:
+    """枚举单元真值表，返回 (输入引脚, 取值 v, 输出恒定值 c) 的全部控制关系（仅单输出单元）"""
+    n = len(cell.inputs)
+    if len(cell.outputs) != 1 or n == 0:
+        return []
+    combos = np.arange(1 << n)
+    words = [np.array([np.bitwise_or.reduce(((combos >> p) & 1) << combos)], dtype=np.uint64) for p in range(n)]
+    out = int(cell.fn(*words)[0][0])
+    out_bits = np.array([(out >> k) & 1 for k in range(1 << n)])
+    relations = []
+    for p in range(n):
+        for v in (0, 1):
+            vals = out_bits[((combos >> p) & 1) == v]
+            if (vals == vals[0]).all():
+                relations.append((p, v, int(vals[0])))
+    return relations
+
+
+class FaultCollapse:
+    """
+    一个电路的故障压缩结果（故障记作 (线网名, 固定值)）
+    - faults: 全部目标故障（每个目标线网 SA0/SA1）
+    - rep_of: 故障 → 所在等价类的代表故障（代表总取自目标线网）
+    - dominated: 支配类代表 → 被其支配的类代表列表（仅 dominance 时）
+    """
+
+    def __init__(self, faults: List[Tuple[str, int]], rep_of: Dict[Tuple[str, int], Tuple[str, int]],
+                 dominated: Dict[Tuple[str, int], List[Tuple[str, int]]]):
+        self.faults = faults
+        self.rep_of = rep_of
+        self.dominated = dominated
+        self.reps = list(dict.fromkeys(rep_of[f] for f in faults))
+
+    @property
+    def first_pass(self) -> List[Tuple[str, int]]:
+        """第一轮仿真的故障: 等价类代表中除去支配类（支配类待第二轮视被支配类的检出情况决定）"""
+        return [r for r in self.reps if r not in self.dominated]
+
+    def second_pass(self, results: Dict[Tuple[str, int], Dict]) -> List[Tuple[str, int]]:
+        """第二轮仍需仿真的支配类: 被其支配的类在第一轮都未检出（或未仿真）"""
+        return [d for d in self.reps if d in self.dominated
+                and not any((results.get(s) or {}).get('detected') for s in self.dominated[d])]
+
+    def expand(self, results: Dict[Tuple[str, int], Dict]) -> Dict[str, Dict]:
+        """代表故障结果展开回每个目标线网，结构同 full_injection_results.json"""
+        node_results = {}
+        for net, stuck in self.faults:
+            rep = self.rep_of[(net, stuck)]
+            res = results.get(rep)
+            if res is None and rep in self.dominated:
+                detected_by = next((s for s in self.dominated[rep] if (results.get(s) or {}).get('detected')), None)
+                if detected_by is not None:
+                    res = {'status': 'success', 'detected': True, 'dominates': f'{detected_by[0]}/sa{detected_by[1]}'}
+            node_results.setdefault(net, {'sa0': None, 'sa1': None})[f'sa{stuck}'] = dict(res) if res else None
+        return node_results
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'faults': len(self.faults),
+            'equiv_classes': len(self.reps),
+            'dominators': len(self.dominated),
+            'collapse_ratio': round(len(self.reps) / max(1, len(self.faults)), 4),
+        }
+
+
+def collapse_faults(netlist: GateNetlist, targets: List[str], dominance: bool = False) -> FaultCollapse:
+    """按 cells.v 单元语义做结构故障压缩（等价，可选支配）"""
+    nl = netlist
+    parent = list(range(2 * nl.n_nets))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    pin_count = np.zeros(nl.n_nets, dtype=np.int64)
+    for ins in nl.gate_inputs:
+        for n in ins:
+            pin_count[n] += 1
+    single = pin_count == 1
+    single[nl.outputs] = False
+    single[list(CONST_NETS.values())] = False
+
+    relations = {name: cell_controlling_values(cell) for name, cell in nl.cells.items()}
+    dom_pairs = []
+    for g, ins in enumerate(nl.gate_inputs):
+        if len(nl.gate_outputs[g]) != 1:
+            continue
+        y = nl.gate_outputs[g][0]
+        for p, v, c in relations[nl.gate_cell[g]]:
+            a = ins[p]
+            if not single[a]:
+                continue
+            ra, ry = find(2 * a + v), find(2 * y + c)
+            if ra != ry:
+                parent[max(ra, ry)] = min(ra, ry)
+            if dominance:
+                dom_pairs.append((2 * y + 1 - c, 2 * a + 1 - v))
+
+    faults = [(t, v) for t in targets for v in (0, 1)]
+    class_rep: Dict[int, Tuple[str, int]] = {}
+    rep_of = {}
+    for net, v in faults:
+        key = find(2 * nl.net_index[net] + v)
+        rep_of[(net, v)] = class_rep.setdefault(key, (net, v))
+
+    dominated: Dict[Tuple[str, int], List[Tuple[str, int]]] = {}
+    for dom, sub in dom_pairs:
+        d, s = class_rep.get(find(dom)), class_rep.get(find(sub))
+        if d is not None and s is not None and d != s and s not in dominated.get(d, []):
+            dominated.setdefault(d, []).append(s)
+    return FaultCollapse(faults, rep_of, dominated)
+
+
+def collapse_circuit_faults(verilog_path: str, targets: List[str], dominance: bool = False,
+                            cells: Optional[Dict[str, CellModel]] = None) -> FaultCollapse:
+    """故障注入脚本入口: 解析网表并压缩 targets 的 SA0/SA1 故障（网表不受支持时抛 ValueError）"""
+    cells = cells or compile_cell_library(CELL_LIB)
+    return collapse_faults(parse_gate_netlist(verilog_path, cells), targets, dominance)
+
+
+# ===== 6. 吞吐基准 =====
+
+def collapse_fault_stats(netlist: GateNetlist, targets: List[str], engine: PPSFPEngine,
+                         full_results: Dict[str, Dict]) -> Dict:
+    """按 Verilator 流程的两轮方式只仿真代表故障，统计仿真故障数/耗时，并与全量结果逐条核对"""
+    t0 = time.time()
+    col = collapse_faults(netlist, targets, dominance=True)
+    row = dict(col.summary(), collapse_time=round(time.time() - t0, 3))
+
+    def simulate(faults):
+        nets = list(dict.fromkeys(net for net, _ in faults))
+        res = engine.run(nets)
+        return {(net, v): res[net][f'sa{v}'] for net, v in faults}
+
+    t0 = time.time()
+    equiv = col.expand(simulate(col.reps))
+    row['equiv_fault_time'] = round(time.time() - t0, 3)
+    t0 = time.time()
+    rep_results = simulate(col.first_pass)
+    rep_results.update(simulate(col.second_pass(rep_results)))
+    dom = col.expand(rep_results)
+    row.update(dom_fault_time=round(time.time() - t0, 3),
+               dom_simulated=len(rep_results))
+    row['collapse_match'] = equiv == full_results and all(
+        (dom[net][s] or {}).get('detected') == full_results[net][s]['detected']
+        for net in full_results for s in ('sa0', 'sa1'))
+    return row
+
+
+def benchmark_circuit(circuit: str, cells: Dict[str, CellModel], n_patterns: int = BENCH_PATTERNS,
+                      repeats: int = BENCH_REPEATS, netlist_dir: str = INPUT_NETLIST_DIR,
+                      results_dir: str = BASE_RESULTS_DIR, ppsfp: bool = False, collapse: bool = False) -> Dict:
+    """
+    单个电路：解析/分层耗时、golden 是否与 Verilator 结果一致、随机激励下的向量吞吐；ppsfp 时再跑全量故障仿真；
+    collapse 时统计结构故障压缩，与 ppsfp 同用时只仿真代表故障，校验展开结果与全量结果一致
+    """
+    row = {'circuit': circuit}
+    t0 = time.time()
+    netlist = parse_gate_netlist(os.path.join(netlist_dir, f'{circuit}.v'), cells)
+    row.update(gates=netlist.n_gates, depth=netlist.depth, groups=len(netlist.groups),
+               parse_time=round(time.time() - t0, 3))
+
+    tb_path = os.path.join(netlist_dir, f'tb_{circuit}.v')
+    golden_path = os.path.join(results_dir, circuit, 'golden_result.json')
+    if os.path.exists(tb_path):
+        t0 = time.time()
+        stim = load_stimulus(netlist, tb_path)
+        golden, good = golden_values(netlist, stim)
+        row.update(samples=stim.n_samples, golden_values=len(golden), golden_time=round(time.time() - t0, 3))
+        if os.path.exists(golden_path):
+            with open(golden_path, 'r', encoding='utf-8') as f:
+                reference = json.load(f)['values']
+            row['golden_match'] = golden == reference
+        if ppsfp:
+            t0 = time.time()
+            targets = fault_targets(os.path.join(netlist_dir, f'{circuit}.v'), netlist.module)
+            engine = PPSFPEngine(netlist, stim, golden, good)
+            results = engine.run(targets)
+            row.update(faults=2 * len(results), fault_time=round(time.time() - t0, 3))
+            results_path = os.path.join(results_dir, circuit, 'full_injection_results.json')
+            if os.path.exists(results_path):
+                with open(results_path, 'r', encoding='utf-8') as f:
+                    row['ppsfp_match'] = json.load(f) == results
+            if collapse:
+                row.update(collapse_fault_stats(netlist, targets, engine, results))
+    if collapse and 'equiv_classes' not in row:
+        targets = fault_targets(os.path.join(netlist_dir, f'{circuit}.v'), netlist.module)
+        t0 = time.time()
+        row.update(collapse_faults(netlist, targets, dominance=True).summary(), collapse_time=round(time.time() - t0, 3))
+
+    rng = np.random.default_rng(0)
+    n_words = -(-n_patterns // WORD_BITS)
+    in_words = rng.integers(0, 1 << 63, size=(len(netlist.inputs), n_words), dtype=np.uint64) * np.uint64(2) \
+        + rng.integers(0, 2, size=(len(netlist.inputs), n_words), dtype=np.uint64)
+    best = float('inf')
+    for _ in range(repeats):
+        t0 = time.time()
+        netlist.simulate(in_words)
+        best = min(best, time.time() - t0)
+    row.update(bench_patterns=n_words * WORD_BITS, sim_time=round(best, 4),
+               patterns_per_s=round(n_words * WORD_BITS / best),
+               gate_evals_per_s=round(n_words * WORD_BITS * netlist.n_gates / best))
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="位并行门级仿真器：golden 对比 + 向量吞吐基准")
+    parser.add_argument('--netlist_dir', type=str, default=INPUT_NETLIST_DIR, help="网表与 testbench 目录")
+    parser.add_argument('--results_dir', type=str, default=BASE_RESULTS_DIR, help="Verilator 结果目录（golden_result.json）")
+    parser.add_argument('--circuits', type=str, default='', help="逗号分隔的电路名（默认目录下全部网表）")
+    parser.add_argument('--bench_patterns', type=int, default=BENCH_PATTERNS, help="吞吐基准的随机激励向量数")
+    parser.add_argument('--repeats', type=int, default=BENCH_REPEATS, help="吞吐基准重复次数（取最快）")
+    parser.add_argument('--ppsfp', action='store_true', help="同时运行 PPSFP 全量故障仿真，并与 full_injection_results.json 对比")
+    parser.add_argument('--collapse', action='store_true',
+                        help="统计结构故障压缩（等价/支配）；与 --ppsfp 同用时只仿真代表故障并校验展开结果")
+    args = parser.parse_args()
+
+    cells = compile_cell_library(CELL_LIB)
+    print(f"[单元库] {CELL_LIB}: 编译 {len(cells)} 个组合单元")
+    if args.circuits:
+        circuits = [c.strip() for c in args.circuits.split(',') if c.strip()]
+    else:
+        circuits = sorted(os.path.splitext(f)[0] for f in os.listdir(args.netlist_dir)
+                          if f.endswith('.v') and not f.startswith('tb_'))
+
+    rows = []
+    for circuit in circuits:
+        try:
+            row = benchmark_circuit(circuit, cells, args.bench_patterns, args.repeats, args.netlist_dir, args.results_dir,
+                                    args.ppsfp, args.collapse)
+        except Exception as e:
+            print(f"  [{circuit}] ❌ {e}")
+            continue
+        rows.append(row)
+        match = {True: '✅ 一致', False: '❌ 不一致'}.get(row.get('golden_match'), '-')
+        print(f"  [{circuit}] 门: {row['gates']} | 层: {row['depth']} | 解析: {row['parse_time']:.2f}s | "
+              f"golden: {row.get('golden_values', '-')} 值 {match} | "
+              f"吞吐: {row['patterns_per_s'] / 1e6:.2f} M 向量/s ({row['gate_evals_per_s'] / 1e9:.2f} G 门次/s)")
+        if 'fault_time' in row:
+            match = {True: '✅ 一致', False: '❌ 不一致'}.get(row.get('ppsfp_match'), '-')
+            print(f"      PPSFP: {row['faults']} 故障 | {row['fault_time']:.2f}s | "
+                  f"{row['faults'] / max(row['fault_time'], 1e-3):.0f} 故障/s | 注入结果 {match}")
+        if 'equiv_classes' in row:
+            line = (f"      压缩: {row['faults']} 故障 → {row['equiv_classes']} 等价类 "
+                    f"(比例 {row['collapse_ratio']:.3f}, 支配类 {row['dominators']})")
+            if 'collapse_match' in row:
+                match = '✅ 一致' if row['collapse_match'] else '❌ 不一致'
+                line += (f" | 等价: {row['equiv_fault_time']:.2f}s | 支配两轮: {row['dom_simulated']} 故障 "
+                         f"{row['dom_fault_time']:.2f}s | 展开结果 {match}")
+            print(line)
+
+    if rows:
+        csv_path = os.path.join(args.results_dir, BENCH_CSV)
+        fields = ['circuit', 'gates', 'depth', 'groups', 'parse_time', 'samples', 'golden_values', 'golden_time',
+                  'golden_match', 'bench_patterns', 'sim_time', 'patterns_per_s', 'gate_evals_per_s',
+                  'faults', 'fault_time', 'ppsfp_match', 'equiv_classes', 'dominators', 'collapse_ratio',
+                  'collapse_time', 'equiv_fault_time', 'dom_simulated', 'dom_fault_time', 'collapse_match']
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+        matched = sum(1 for r in rows if r.get('golden_match'))
+        print(f"\n[完成] golden 一致: {matched}/{len(rows)} | 基准: {csv_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,10 @@
 - Verilator 不支持 force/release，因此使用 网表修改 方式注入故障
 - 在网表中为每个目标信号添加故障注入 MUX
 - 通过 plusargs (+FAULT_ID=N +FAULT_VAL=X) 在运行时选择故障
+- --compare count|detect: golden 以 $readmemh 镜像嵌入 TB，仿真内比对，每个故障只输出一行结果
+- --shards K / --shard_sweep 1,2,4: 注入网表按目标线网分成 K 片，各自编译（内存感知并发），报告编译时间/峰值 RSS
+- --collapse equiv|dominance: 按 cells.v 单元语义做结构故障压缩，只仿真代表故障，结果展开回全部线网
+- --engine ppsfp: 改用 bitparallel_sim.py 的位并行 PPSFP 故障仿真（纯 Python，无需 Verilator/WSL），结果文件格式相同
 """
 
 import os
@@ -18,6 +22,7 @@ import shutil
 import subprocess
 import glob
 import concurrent.futures
+import argparse
 import multiprocessing
 from typing import List, Tuple, Set, Dict
 
@@ -39,11 +44,40 @@ MAX_UNKNOWN_RATIO = 0.2
 CPU_COUNT = os.cpu_count() or 4
 WORKER_COUNT = max(1, CPU_COUNT - 2)
 
+# 注入引擎: 'verilator' (WSL + Verilator 编译注入网表) | 'ppsfp' (bitparallel_sim 纯 Python 位并行故障仿真)
+INJECTION_ENGINE = 'verilator'
+
+# Verilator 故障结果比对方式:
+#   'print'  - 每个故障打印全部输出，Python 侧逐行与 golden 比对（原方式）
+#   'count'  - golden 以 $readmemh 镜像嵌入 TB，仿真内比对，每个故障只打印最终 diff_count
+#   'detect' - 同上，但故障在第一次不一致时即中止激励，直接进入下一个 __FAULT_ID（只判定是否检出）
+COMPARE_MODE = 'print'
+GOLDEN_IMAGE_NAME = 'golden_obs.hex'
+
+# 结构故障压缩 (bitparallel_sim.collapse_faults，按 cells.v 单元语义):
+#   'none'      - 每个目标线网的 SA0/SA1 都仿真（原方式）
+#   'equiv'     - 只仿真等价类代表故障，结果展开回全部目标线网
+#   'dominance' - 在 equiv 基础上按支配关系两轮仿真，被支配类检出即推出支配类检出（需 COMPARE_MODE='detect'）
+COLLAPSE_MODE = 'none'
+FAULT_TABLE_NAME = 'fault_table.hex'
+COLLAPSE_REPORT_NAME = 'fault_collapse_report.csv'
+
+# 分片注入网表: 目标线网分成 SHARD_COUNT 组，每组单独插入 MUX、单独编译为一个二进制，
+# 各分片并发编译，同时运行的编译进程总数（各分片 -j 之和）受核数与 WSL 可用内存限制（预留 max(2GB, 20%)）
+SHARD_COUNT = 1
+SHARD_COMPILE_BASE_MB = 500            # 单个编译进程的固定内存估计
+SHARD_COMPILE_MB_PER_NETLIST_MB = 150  # 每 MB 注入网表的单进程编译内存估计（有分片编译完成后按实测峰值 RSS 修正）
+SHARD_REPORT_NAME = 'shard_compile_report.csv'
+
 # 预编译正则表达式 - 支持多种输出格式
 # 匹配: o_sum=xxx, OUT=xxx, OUTPUT=xxx, out=xxx, 或者裸十六进制行
 OSUM_HEX_RE = re.compile(r'^(?:o_sum|OUT|OUTPUT|out|o)\s*[=:]\s*([0-9a-fA-FxzXZ]+)', re.MULTILINE | re.IGNORECASE)
 # 备用正则: 匹配 $display 常见格式如 "value: xxx" 或纯十六进制输出
 ALT_HEX_RE = re.compile(r'^(?:value|result|data|output)?\s*[=:]?\s*([0-9a-fA-F]{2,})[\s$]', re.MULTILINE | re.IGNORECASE)
+# 仿真内比对: 值输出语句的格式串 (与 OSUM_HEX_RE 对应) 及其第一个转换符; 每个故障的结果行
+VALUE_FORMAT_RE = re.compile(r'^(?:o_sum|OUT|OUTPUT|out|o)\s*[=:]', re.IGNORECASE)
+VALUE_CONV_RE = re.compile(r'^(?:o_sum|OUT|OUTPUT|out|o)\s*[=:]\s*%0?\d*([hHxXbB])', re.IGNORECASE)
+FID_RESULT_RE = re.compile(r'^\[FID:(\d+)\]\s+D=(\d+)\s+N=(\d+)\s+F=(-?\d+)', re.MULTILINE)
 
 
 def run_cmd_fast(cmd: List[str], capture=False, timeout=None) -> Tuple[int, str]:
@@ -357,8 +391,166 @@ def generate_fault_injection_netlist(netlist_text: str, dut_module_name: str,
     return modified_netlist
 
 
+def find_display_calls(text: str) -> List[Tuple[int, int, List[str]]]:
+    """找出 $display(...); 调用: (起点, 终点(含分号), 参数列表)；按括号/字符串配对切分参数"""
+    calls = []
+    for m in re.finditer(r'\$display\s*\(', text):
+        depth, i, in_str = 1, m.end(), False
+        args, cur = [], m.end()
+        while i < len(text) and depth:
+            ch = text[i]
+            if in_str:
+                if ch == '\\':
+                    i += 1
+                elif ch == '"':
+                    in_str = False
+            elif ch == '"':
+                in_str = True
+            elif ch in '({[':
+                depth += 1
+            elif ch in ')}]':
+                depth -= 1
+            elif ch == ',' and depth == 1:
+                args.append(text[cur:i].strip())
+                cur = i + 1
+            i += 1
+        args.append(text[cur:i - 1].strip())
+        end = re.match(r'\s*;', text[i:])
+        if depth == 0 and end:
+            calls.append((m.start(), i + end.end(), args))
+    return calls
+
+
+def rewrite_value_displays(task_text: str, detect_only: bool) -> Tuple[str, bool]:
+    """
+    把激励 task 中的值输出 $display 改写为仿真内比对 __observe(...)，其余 $display 改为空语句
+    返回 (改写后文本, 是否含 %b 输出)；出现无法在仿真内还原解析值的格式 (如 %d) 时抛 ValueError
+    - %h/%x: 解析值即输出值本身
+    - %b: Python 侧把二进制数字串按十六进制解析，TB 侧用 __bin_as_hex 做同样的展开
+    """
+    out, last, has_bin = [], 0, False
+    for start, end, args in find_display_calls(task_text):
+        fmt = args[0][1:-1] if args and args[0].startswith('"') else ''
+        if not VALUE_FORMAT_RE.match(fmt):
+            stmt = ';'
+        else:
+            conv = VALUE_CONV_RE.match(fmt)
+            if not conv or len(args) < 2:
+                raise ValueError(f'无法在仿真内比对的输出格式: "{fmt}"')
+            # 转义标识符 (\\result[31] ) 必须以空白结尾
+            value = args[1] + (' ' if '\\' in args[1] else '')
+            if conv.group(1).lower() == 'b':
+                value = f'__bin_as_hex({value})'
+                has_bin = True
+            stmt = f'begin __observe({value}); if (__abort) disable __stim_pass; end' if detect_only \
+                else f'__observe({value});'
+        out.append(task_text[last:start])
+        out.append(stmt)
+        last = end
+    out.append(task_text[last:])
+    return ''.join(out), has_bin
+
+
+def tb_signal_bits(tb_text: str) -> int:
+    """TB 中 reg/wire/integer 声明的总位数 —— 任一 $display 参数表达式位宽的上界"""
+    total = 0
+    for kind, rng, names in re.findall(r'\b(reg|wire|integer)\b\s*(?:signed\s+)?(\[\s*\d+\s*:\s*\d+\s*\])?([^;]*);', tb_text):
+        count = len([n for n in names.split(',') if n.strip()])
+        if kind == 'integer':
+            width = 32
+        elif rng:
+            hi, lo = map(int, re.findall(r'\d+', rng))
+            width = abs(hi - lo) + 1
+        else:
+            width = 1
+        total += count * width
+    return total
+
+
+def write_golden_image(path: str, golden_vals: List[int], obs_width: int):
+    """
+    golden 值写成 $readmemh 镜像：每行 1 个标志位十六进制数 + obs_width 位十六进制数
+    标志为 1 表示 golden 含 x/z（parse_output_values 记为 -1），此时数值位写 0；两态写法 Verilator / iverilog 都能读
+    """
+    digits = obs_width // 4
+    with open(path, 'w', encoding='utf-8') as f:
+        for v in golden_vals:
+            f.write(('1' if v < 0 else '0') + format(max(v, 0), f'0{digits}x') + '\n')
+
+
+def write_fault_table(path: str, fault_list: List[Tuple[str, int]], legal_targets: List[str]):
+    """故障子集写成 $readmemh 表: 每行一个注入网表中的 __FAULT_ID (目标序号*2 + 固定值)"""
+    target_index = {net: i for i, net in enumerate(legal_targets)}
+    with open(path, 'w', encoding='utf-8') as f:
+        for net, stuck in fault_list:
+            f.write(format(2 * target_index[net] + stuck, '08x') + '\n')
+
+
+def build_in_sim_compare(patched_tb: str, golden_vals: List[int], golden_image: str, detect_only: bool) -> str:
+    """
+    在已转换为 run_stimulus_pass 的 TB 中加入仿真内 golden 比对:
+    golden 镜像存储器 + __observe 比对任务；task 主体命名为 __stim_pass，detect 模式首次不一致即 disable 退出
+    """
+    t_start = patched_tb.index('  task run_stimulus_pass;')
+    t_end = patched_tb.index('  endtask', t_start)
+    task_text, has_bin = rewrite_value_displays(patched_tb[t_start:t_end], detect_only)
+    task_text = task_text.replace('  task run_stimulus_pass;\n  begin', '  task run_stimulus_pass;\n  begin : __stim_pass', 1)
+
+    bits = tb_signal_bits(patched_tb) * (4 if has_bin else 1)
+    obs_width = max(64, (bits + 63) // 64 * 64)
+    golden_n = max(1, len(golden_vals))
+    write_golden_image(golden_image, golden_vals, obs_width)
+
+    decl = [
+        "  // ===== 仿真内 golden 比对 =====",
+        f"  localparam __OBS_W = {obs_width};",
+        f"  localparam __GOLDEN_N = {len(golden_vals)};",
+        f"  reg [__OBS_W+3:0] __golden [0:{golden_n - 1}];   // 位 __OBS_W: golden 含 x/z",
+        "  reg [8*1024-1:0] __golden_file;",
+        "  integer __obs_idx, __diff_count, __first_diff;",
+        "  reg __abort;",
+        "",
+        "  // 与 print 模式的 analyze_vals 一致: 含 x/z 的值彼此相等，与任何确定值都不等",
+        "  task __observe;",
+        "    input [__OBS_W-1:0] v;",
+        "    reg v_x, g_x;",
+        "    begin",
+        "      if (__obs_idx < __GOLDEN_N) begin",
+        "        v_x = (^v !== 1'b0) && (^v !== 1'b1);",
+        "        g_x = __golden[__obs_idx][__OBS_W];",
+        "        if (v_x != g_x || (!v_x && v != __golden[__obs_idx][__OBS_W-1:0])) begin",
+        "          if (__diff_count == 0) __first_diff = __obs_idx;",
+        "          __diff_count = __diff_count + 1;",
+        f"          __abort = 1'b{1 if detect_only else 0};",
+        "        end",
+        "      end",
+        "      __obs_idx = __obs_idx + 1;",
+        "    end",
+        "  endtask",
+        "",
+    ]
+    if has_bin:
+        decl += [
+            "  // %b 输出按十六进制解析: 第 k 位展开到第 k 个十六进制位",
+            "  function [__OBS_W-1:0] __bin_as_hex;",
+            "    input [__OBS_W-1:0] b;",
+            "    integer k;",
+            "    begin",
+            "      __bin_as_hex = 0;",
+            "      for (k = 0; k < __OBS_W / 4; k = k + 1) __bin_as_hex[4*k] = b[k];",
+            "    end",
+            "  endfunction",
+            "",
+        ]
+    return patched_tb[:t_start] + '\n'.join(decl) + '\n' + task_text + patched_tb[t_end:]
+
+
 def generate_fault_injection_testbench(tb_text: str, legal_targets: List[str], 
-                                        dut_module_name: str) -> Tuple[str, List[Tuple[str, int]]]:
+                                        dut_module_name: str, compare_mode: str = 'print',
+                                        golden_vals: List[int] = None, golden_image: str = '',
+                                        golden_image_sim: str = '', fault_list: List[Tuple[str, int]] = None,
+                                        fault_table: str = '', fault_table_sim: str = '',
+                                        fault_table_depth: int = 0) -> Tuple[str, List[Tuple[str, int]]]:
     """
     生成 Verilator 兼容的故障注入 Testbench
     
@@ -368,16 +560,29 @@ def generate_fault_injection_testbench(tb_text: str, legal_targets: List[str],
     - 然后运行 stimulus 并观察输出
     
     新增: 自动检测并注入输出观测语句
+    
+    compare_mode 为 'count' / 'detect' 时，golden_vals 写入 golden_image ($readmemh 镜像，
+    TB 中按 golden_image_sim 路径读取，可用 +GOLDEN=<路径> 覆盖)，
+    激励中的值输出改为仿真内比对，每个故障只打印一行 [FID:n] D=<diff_count> N=<输出数> F=<首个不一致>
+    （格式无法在仿真内比对时抛 ValueError，由调用方回退到 'print'）
+    
+    给定 fault_list（故障压缩后的代表故障）时只注入这些故障: 其 __FAULT_ID 写入 fault_table
+    ($readmemh 表，TB 中按 fault_table_sim 路径读取，可用 +FAULT_TABLE=<路径> 换成其它故障子集)，
+    第 i 个故障注入 uut.__FAULT_ID = 表[i]；表容量取 max(len(fault_list), fault_table_depth)
     """
     endmod_idx = tb_text.rfind('endmodule')
     if endmod_idx == -1:
         return tb_text, []
     
     # 构建故障映射表: (target_name, stuck_value)
-    fault_map = []
-    for net in legal_targets:
-        fault_map.append((net, 0))  # SA0
-        fault_map.append((net, 1))  # SA1
+    if fault_list is not None:
+        fault_map = list(fault_list)
+        write_fault_table(fault_table, fault_map, legal_targets)
+    else:
+        fault_map = []
+        for net in legal_targets:
+            fault_map.append((net, 0))  # SA0
+            fault_map.append((net, 1))  # SA1
     
     total_faults = len(fault_map)
     
@@ -495,6 +700,9 @@ def generate_fault_injection_testbench(tb_text: str, legal_targets: List[str],
         i += 1
 
     patched_tb = '\n'.join(final_lines)
+    in_sim_compare = compare_mode in ('count', 'detect') and main_converted
+    if in_sim_compare:
+        patched_tb = build_in_sim_compare(patched_tb, golden_vals or [], golden_image, compare_mode == 'detect')
     endmod_idx = patched_tb.rfind('endmodule')
     
     # 打印调试信息
@@ -513,19 +721,36 @@ def generate_fault_injection_testbench(tb_text: str, legal_targets: List[str],
     inject_code_lines.append("  // 故障注入控制器")
     inject_code_lines.append("  integer __batch_fid;")
     inject_code_lines.append("  integer __BATCH_START, __BATCH_END;")
+    if fault_list is not None:
+        inject_code_lines.append(f"  reg [31:0] __fault_ids [0:{max(1, total_faults, fault_table_depth) - 1}];")
+        inject_code_lines.append("  reg [8*1024-1:0] __fault_table_file;")
     inject_code_lines.append("")
     inject_code_lines.append("  initial begin")
     inject_code_lines.append("    if (!$value$plusargs(\"BATCH_START=%d\", __BATCH_START)) __BATCH_START = 0;")
     inject_code_lines.append(f"    if (!$value$plusargs(\"BATCH_END=%d\", __BATCH_END)) __BATCH_END = {total_faults};")
     inject_code_lines.append("")
     inject_code_lines.append("    $display(\"[BATCH] Start=%0d End=%0d\", __BATCH_START, __BATCH_END);")
+    if in_sim_compare:
+        inject_code_lines.append("    if (!$value$plusargs(\"GOLDEN=%s\", __golden_file)) __golden_file = \"" + (golden_image_sim or golden_image) + "\";")
+        inject_code_lines.append("    $readmemh(__golden_file, __golden);")
+    if fault_list is not None:
+        inject_code_lines.append("    if (!$value$plusargs(\"FAULT_TABLE=%s\", __fault_table_file)) __fault_table_file = \"" + (fault_table_sim or fault_table) + "\";")
+        inject_code_lines.append("    $readmemh(__fault_table_file, __fault_ids);")
     inject_code_lines.append("")
     inject_code_lines.append("    // 批量故障注入循环")
     inject_code_lines.append("    for (__batch_fid = __BATCH_START; __batch_fid < __BATCH_END; __batch_fid = __batch_fid + 1) begin")
     inject_code_lines.append("      // 通过 hierarchical reference 设置 DUT 内部的 __FAULT_ID")
-    inject_code_lines.append("      uut.__FAULT_ID = __batch_fid;")
-    inject_code_lines.append("      $display(\"[FID:%0d]\", __batch_fid);")
-    inject_code_lines.append("      run_stimulus_pass();")
+    if fault_list is not None:
+        inject_code_lines.append("      uut.__FAULT_ID = __fault_ids[__batch_fid];")
+    else:
+        inject_code_lines.append("      uut.__FAULT_ID = __batch_fid;")
+    if in_sim_compare:
+        inject_code_lines.append("      __obs_idx = 0; __diff_count = 0; __first_diff = -1; __abort = 1'b0;")
+        inject_code_lines.append("      run_stimulus_pass();")
+        inject_code_lines.append("      $display(\"[FID:%0d] D=%0d N=%0d F=%0d\", __batch_fid, __diff_count, __obs_idx, __first_diff);")
+    else:
+        inject_code_lines.append("      $display(\"[FID:%0d]\", __batch_fid);")
+        inject_code_lines.append("      run_stimulus_pass();")
     inject_code_lines.append("    end")
     inject_code_lines.append("")
     inject_code_lines.append("    $finish;")
@@ -589,6 +814,55 @@ def parse_batched_output(log_output: str, golden_vals: List[int],
     return results
 
 
+def parse_output_values(log_output: str) -> List[int]:
+    """解析仿真输出中的全部输出值 (o_sum=... 或裸十六进制行)，x/z 记为 -1"""
+    vals = []
+    for line in log_output.splitlines():
+        # 尝试多种匹配模式
+        m = OSUM_HEX_RE.search(line)
+        if not m:
+            m = ALT_HEX_RE.search(line)
+        if m:
+            s = m.group(1).lower()
+            if 'x' in s or 'z' in s:
+                vals.append(-1)
+            else:
+                try:
+                    vals.append(int(s, 16))
+                except:
+                    vals.append(-1)
+    return vals
+
+
+def parse_compare_output(log_output: str, fault_map: List[Tuple[str, int]], detect_only: bool,
+                         golden_n: int) -> Dict[str, Dict]:
+    """
+    解析仿真内比对模式的输出: 每个故障一行 [FID:n] D=<不一致数> N=<输出数> F=<首个不一致序号>
+    输出数 N 与 golden 个数 golden_n 不符时（detect 模式检出后中止的除外）只比对了一部分输出，
+    结果记为 status='obs_count_mismatch'，不计入成功
+    """
+    results = {}
+    for m in FID_RESULT_RE.finditer(log_output):
+        fid, diff_count, n_obs, first_diff = (int(g) for g in m.groups())
+        if not 0 <= fid < len(fault_map):
+            continue
+        net, stuck = fault_map[fid]
+        aborted = detect_only and diff_count > 0
+        if n_obs == 0:
+            res = {'status': 'no_output', 'detected': False}
+        elif n_obs != golden_n and not aborted:
+            res = {'status': 'obs_count_mismatch', 'detected': False, 'n_obs': n_obs, 'golden_n': golden_n}
+        elif detect_only:
+            # 首次不一致即中止，diff_count 不完整，只记录检出与首个不一致的输出序号
+            res = {'status': 'success', 'detected': diff_count > 0, 'first_diff': first_diff}
+        else:
+            res = {'status': 'success', 'detected': diff_count > 0, 'diff_count': diff_count}
+        if net not in results:
+            results[net] = {'sa0': None, 'sa1': None}
+        results[net][f'sa{stuck}'] = res
+    return results
+
+
 def analyze_vals(vals: List[int], golden: List[int]) -> Dict:
     """分析单个故障结果"""
     if not vals:
@@ -604,13 +878,135 @@ def analyze_vals(vals: List[int], golden: List[int]) -> Dict:
     }
 
 
-def run_batch_worker(args) -> Dict:
-    """并行批量工作器 - 运行一个批次的故障 (WSL)"""
-    wsl_exe_path, start_idx, end_idx, golden_vals, fault_map = args
+def wsl_memory_mb() -> Tuple[float, float]:
+    """WSL 内的 (可用内存, 总内存) MB，读取失败返回 (0, 0)"""
+    rc, out = run_wsl_cmd("grep -E 'MemAvailable|MemTotal' /proc/meminfo", capture=True, timeout=30)
+    info = dict(re.findall(r'(MemAvailable|MemTotal):\s*(\d+)', out))
+    if rc != 0 or len(info) < 2:
+        return 0.0, 0.0
+    return int(info['MemAvailable']) / 1024, int(info['MemTotal']) / 1024
+
+
+def compile_fi_binary(wsl_cell_lib: str, netlist_path: str, tb_path: str, obj_dir: str,
+                      jobs: int, exe_name: str = 'Vtb') -> Tuple[int, str, float, int]:
+    """
+    Verilator 编译注入网表 + TB (WSL + Clang)，返回 (返回码, 输出, 耗时, 峰值 RSS KB)
+    峰值 RSS 由 /usr/bin/time 给出（编译进程树中最大的单个进程），WSL 中没有 /usr/bin/time 时为 0
+    """
+    # --binary: Build binary directly
+    # --compiler clang: Use clang
+    # -j: Parallel jobs
+    verilator_cmd = (
+        f'verilator --binary --timing -j {jobs} '
+        f'--compiler clang ' 
+        f'--top-module tb '
+        f'-Wno-fatal -Wno-WIDTHTRUNC -Wno-WIDTHEXPAND '
+        f'-Wno-ASSIGNDLY -Wno-STMTDLY -Wno-MULTIDRIVEN '
+        f'--error-limit 100 '
+        f'-o {exe_name} --Mdir "{to_wsl_path(obj_dir)}" '
+        f'"{wsl_cell_lib}" "{to_wsl_path(netlist_path)}" "{to_wsl_path(tb_path)}"'
+    )
+    timed_cmd = (f'if [ -x /usr/bin/time ]; then /usr/bin/time -f "__PEAK_RSS_KB=%M" {verilator_cmd}; '
+                 f'else {verilator_cmd}; fi')
+    t0 = time.time()
+    rc, out = run_wsl_cmd(timed_cmd, capture=True, timeout=600)
+    peak = re.search(r'__PEAK_RSS_KB=(\d+)', out)
+    return rc, out, time.time() - t0, int(peak.group(1)) if peak else 0
+
+
+def compile_fi_shards(shards: List[Dict], wsl_cell_lib: str, compile_jobs: int) -> Tuple[bool, Dict]:
+    """
+    并发编译各分片的注入网表（内存感知）
+    
+    单个编译进程的内存按网表大小估计（实测峰值 RSS 是进程树中最大的单个进程，-j J 时同时有 J 个），
+    一个分片的估计 = 单进程估计 × J。启动分片时，在剩余核数（compile_jobs 减去运行中各分片的 -j）
+    与 WSL 剩余可用内存（预留 max(2GB, 20%)）允许的进程数内，平分给可以同时启动的待编译分片作为 -j；
+    没有任何分片在编译时至少以 -j 1 启动一个。每完成一个分片按实测峰值 RSS 修正每 MB 网表的单进程估计。
+    读不到 WSL 内存信息时退回逐个分片串行编译（-j compile_jobs，与不分片时相同）。
+    shards 中每项需有 'netlist' / 'tb' / 'obj_dir'，编译成功后写入 'exe' (WSL 路径)
+    返回 (是否全部成功, 编译统计)
+    """
+    avail_mb, total_mb = wsl_memory_mb()
+    mem_known = total_mb > 0
+    usable_mb = max(0.0, avail_mb - max(2000, total_mb * 0.2)) if mem_known else 0.0
+    if not mem_known:
+        print('    [警告] 读取 WSL 内存信息失败，分片改为串行编译')
+    mb_per_netlist_mb = SHARD_COMPILE_MB_PER_NETLIST_MB
+    observed = []
+    
+    def per_process_estimate(shard):
+        size_mb = os.path.getsize(shard['netlist']) / (1024 * 1024)
+        return SHARD_COMPILE_BASE_MB + size_mb * mb_per_netlist_mb
+    
+    def admit(shard):
+        """返回新分片的 (-j, 内存估计)，当前不能启动时返回 None"""
+        if not mem_known:
+            return None if running else (compile_jobs, 0.0)
+        per_proc = per_process_estimate(shard)
+        free_jobs = compile_jobs - sum(j for _, j, _ in running.values())
+        free_mb = usable_mb - sum(e for _, _, e in running.values())
+        procs = min(free_jobs, int(free_mb // per_proc))
+        if procs < 1:
+            if running:
+                return None
+            procs = 1
+        jobs = max(1, procs // min(len(pending), procs))
+        return jobs, per_proc * jobs
+    
+    stats = {'mem_budget_mb': usable_mb if mem_known else float('nan'), 'max_parallel': 0, 'max_jobs': 0,
+             'peak_rss_mb': 0.0, 'shard_compile_max': 0.0}
+    pending = list(range(len(shards)))
+    running = {}
+    ok = True
+    t0 = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        while pending or running:
+            while pending and ok:
+                admitted = admit(shards[pending[0]])
+                if admitted is None:
+                    break
+                jobs, est = admitted
+                idx = pending.pop(0)
+                shard = shards[idx]
+                future = executor.submit(compile_fi_binary, wsl_cell_lib, shard['netlist'], shard['tb'],
+                                         shard['obj_dir'], jobs)
+                running[future] = (idx, jobs, est)
+                stats['max_parallel'] = max(stats['max_parallel'], len(running))
+                stats['max_jobs'] = max(stats['max_jobs'], sum(j for _, j, _ in running.values()))
+                print(f'    [分片 {idx}] 开始编译 (估计 {est:.0f} MB, 并发 {len(running)}, -j {jobs})')
+            if not running:
+                break
+            
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                idx, _, _ = running.pop(future)
+                rc, out, elapsed, peak_kb = future.result()
+                peak_mb = peak_kb / 1024
+                stats['peak_rss_mb'] = max(stats['peak_rss_mb'], peak_mb)
+                stats['shard_compile_max'] = max(stats['shard_compile_max'], elapsed)
+                if rc != 0:
+                    print(f'  [错误] 分片 {idx} Verilator 编译失败:')
+                    for line in out.split('\n')[:30]:
+                        print(f'    {line}')
+                    ok = False
+                    continue
+                shards[idx]['exe'] = f"{to_wsl_path(shards[idx]['obj_dir'])}/Vtb"
+                size_mb = os.path.getsize(shards[idx]['netlist']) / (1024 * 1024)
+                if peak_kb and size_mb > 0:
+                    observed.append(max(0.0, peak_mb - SHARD_COMPILE_BASE_MB) / size_mb)
+                    mb_per_netlist_mb = max(observed)
+                print(f'    [分片 {idx}] 编译完成: {elapsed:.1f}s, 单进程峰值 RSS {peak_mb:.0f} MB')
+    stats['compile_time'] = time.time() - t0
+    return ok, stats
+
+
+def run_batch_worker(args) -> Tuple[Dict, int]:
+    """并行批量工作器 - 运行一个批次的故障 (WSL)，返回 (批次结果, 仿真输出字节数)"""
+    wsl_exe_path, start_idx, end_idx, golden_vals, fault_map, compare_mode, extra_args = args
     
     # Run in WSL
     # Note: wsl_exe_path must be a WSL path
-    cmd_str = f'"{wsl_exe_path}" +BATCH_START={start_idx} +BATCH_END={end_idx} +DUMPFILE=none.vcd'
+    cmd_str = f'"{wsl_exe_path}" +BATCH_START={start_idx} +BATCH_END={end_idx} +DUMPFILE=none.vcd{extra_args}'
     
     # Run via WSL
     # We shouldn't use run_cmd_fast directly as it spawns subprocess on Windows without wsl prefix
@@ -628,12 +1024,79 @@ def run_batch_worker(args) -> Dict:
         output = str(e)
         rc = -1
 
-    return parse_batched_output(output, golden_vals, fault_map)
+    if compare_mode in ('count', 'detect'):
+        return parse_compare_output(output, fault_map, compare_mode == 'detect', len(golden_vals)), len(output)
+    return parse_batched_output(output, golden_vals, fault_map), len(output)
+
+
+def run_fault_batches(shard_runs: List[Tuple[str, List[Tuple[str, int]], str]], golden_vals: List[int],
+                      compare_mode: str) -> Tuple[Dict[Tuple[str, int], Dict], int]:
+    """
+    各分片二进制的故障分批并行运行，返回 ({(线网, 固定值): 结果}, 仿真输出字节数)
+    shard_runs: [(WSL 可执行文件路径, 该二进制的 fault_map, 额外 plusargs)]，批次按故障数在分片间分配
+    """
+    total_faults = sum(len(fault_map) for _, fault_map, _ in shard_runs)
+    fault_results = {}
+    if total_faults == 0:
+        return fault_results, 0
+    num_batches = min(WORKER_COUNT, total_faults)
+    faults_per_batch = (total_faults + num_batches - 1) // num_batches
+    
+    jobs = []
+    for wsl_exe_path, fault_map, extra_args in shard_runs:
+        for start in range(0, len(fault_map), faults_per_batch):
+            end = min(start + faults_per_batch, len(fault_map))
+            # Pass WSL path to worker
+            jobs.append((wsl_exe_path, start, end, golden_vals, fault_map, compare_mode, extra_args))
+    
+    print(f'  [运行] {total_faults} 故障, 分 {len(jobs)} 批, 每批约 {faults_per_batch} 故障 (比对模式: {compare_mode})')
+    
+    run_start = time.time()
+    log_bytes = 0
+    
+    with concurrent.futures.ProcessPoolExecutor(max_workers=WORKER_COUNT) as executor:
+        futures = {executor.submit(run_batch_worker, job): job for job in jobs}
+        
+        done_cnt = 0
+        for future in concurrent.futures.as_completed(futures):
+            done_cnt += 1
+            batch_results, batch_log_bytes = future.result()
+            log_bytes += batch_log_bytes
+            
+            for net, res_dict in batch_results.items():
+                for stuck in (0, 1):
+                    if res_dict.get(f'sa{stuck}'):
+                        fault_results[(net, stuck)] = res_dict[f'sa{stuck}']
+            
+            elapsed = time.time() - run_start
+            progress_pct = 100 * done_cnt / len(jobs)
+            eta = elapsed / done_cnt * (len(jobs) - done_cnt) if done_cnt > 0 else 0
+            print(f"    批次: {done_cnt}/{len(jobs)} ({progress_pct:.0f}%) | "
+                  f"耗时: {elapsed:.1f}s | 剩余: {eta:.0f}s", end='\r')
+    
+    print("")
+    return fault_results, log_bytes
+
+
+def append_report_row(report_name: str, row: Dict):
+    """追加一行统计到 BASE_RESULTS_DIR 下的报告 CSV（压缩/分片报告）"""
+    path = os.path.join(BASE_RESULTS_DIR, report_name)
+    os.makedirs(BASE_RESULTS_DIR, exist_ok=True)
+    write_header = not os.path.exists(path)
+    with open(path, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=list(row.keys()))
+        if write_header:
+            writer.writeheader()
+        writer.writerow(row)
 
 
 def run_circuit_injection_batched(circuit_name: str, verilog_path: str, 
-                                   tb_path: str, output_dir: str):
-    """Verilator 批量故障注入"""
+                                   tb_path: str, output_dir: str, shards: int = None):
+    """
+    Verilator 批量故障注入
+    shards (默认 SHARD_COUNT) > 1 时目标线网分成若干组，每组一份注入网表/TB/二进制 (output_dir/shard_<i>)，
+    并发编译后按故障所在分片派发批次，结果合并；指定 shards 或 SHARD_COUNT > 1 时追加一行分片编译报告
+    """
     os.makedirs(output_dir, exist_ok=True)
     
     print(f'\n{"="*60}')
@@ -662,16 +1125,46 @@ def run_circuit_injection_batched(circuit_name: str, verilog_path: str,
     total_faults = len(legal_targets) * 2
     print(f'  [故障] 总计 {total_faults} 个故障 (SA0+SA1)')
     
-    # 2. 生成故障注入版网表 (插入 MUX)
-    print(f'  [网表] 插入故障注入 MUX...')
-    fi_netlist = generate_fault_injection_netlist(net_text, dut_module_name, legal_targets)
-    
-    # 2.5 预处理网表 (拆分超长行，解决 Verilator token 限制)
-    fi_netlist_processed = preprocess_netlist_for_verilator(fi_netlist)
-    fi_netlist_path = os.path.join(output_dir, f'{circuit_name}_fi.v')
-    with open(fi_netlist_path, 'w', encoding='utf-8') as f:
-        f.write(fi_netlist_processed)
-    print(f'  [网表] 故障注入网表: {fi_netlist_path}')
+    # 1.6 结构故障压缩: 只为代表故障所在的线网插入 MUX
+    collapse = None
+    sim_targets = legal_targets
+    if COLLAPSE_MODE != 'none':
+        from bitparallel_sim import collapse_circuit_faults
+        try:
+            collapse = collapse_circuit_faults(verilog_path, legal_targets, COLLAPSE_MODE == 'dominance')
+        except ValueError as e:
+            print(f'  [警告] 故障压缩失败 ({e})，仿真全部故障')
+    if collapse:
+        sim_targets = list(dict.fromkeys(net for net, _ in collapse.reps))
+        stats = collapse.summary()
+        print(f'  [压缩] {stats["faults"]} 故障 → {stats["equiv_classes"]} 个等价类 '
+              f'(比例 {stats["collapse_ratio"]:.3f}, 支配类 {stats["dominators"]}), 注入线网 {len(sim_targets)}')
+    
+    # 2. 生成故障注入版网表 (插入 MUX)；分片时每组目标线网各生成一份
+    n_shards = max(1, min(shards or SHARD_COUNT, len(sim_targets)))
+    print(f'  [网表] 插入故障注入 MUX...' + (f' ({n_shards} 个分片)' if n_shards > 1 else ''))
+    shard_list = []
+    shard_of = {}
+    for i in range(n_shards):
+        shard_dir = output_dir if n_shards == 1 else os.path.join(output_dir, f'shard_{i}')
+        os.makedirs(shard_dir, exist_ok=True)
+        shard_targets = sim_targets[i * len(sim_targets) // n_shards:(i + 1) * len(sim_targets) // n_shards]
+        shard_of.update((net, i) for net in shard_targets)
+        fi_netlist = generate_fault_injection_netlist(net_text, dut_module_name, shard_targets)
+        
+        # 2.5 预处理网表 (拆分超长行，解决 Verilator token 限制)
+        fi_netlist_processed = preprocess_netlist_for_verilator(fi_netlist)
+        fi_netlist_path = os.path.join(shard_dir, f'{circuit_name}_fi.v')
+        with open(fi_netlist_path, 'w', encoding='utf-8') as f:
+            f.write(fi_netlist_processed)
+        shard_list.append({'dir': shard_dir, 'targets': shard_targets, 'netlist': fi_netlist_path,
+                           'tb': os.path.join(shard_dir, 'tb_fault_inject.v'),
+                           'obj_dir': os.path.join(shard_dir, 'obj_dir')})
+    fi_netlist_mb = sum(os.path.getsize(shard['netlist']) for shard in shard_list) / (1024 * 1024)
+    if n_shards == 1:
+        print(f'  [网表] 故障注入网表: {shard_list[0]["netlist"]}')
+    else:
+        print(f'  [网表] {n_shards} 个分片注入网表: {output_dir}/shard_*/ (共 {fi_netlist_mb:.1f} MB)')
     
     # 检查缓存
     res_json = os.path.join(output_dir, 'full_injection_results.json')
@@ -686,61 +1179,14 @@ def run_circuit_injection_batched(circuit_name: str, verilog_path: str,
         except:
             pass
     
-    # 3. 生成带故障注入的 Testbench
-    print(f'  [生成] 创建故障注入 Testbench...')
-    batched_tb, fault_map = generate_fault_injection_testbench(tb_src, legal_targets, circuit_name)
-    batched_tb_path = os.path.join(output_dir, 'tb_fault_inject.v')
-    with open(batched_tb_path, 'w', encoding='utf-8') as f:
-        f.write(batched_tb)
-    
-    # 4. Verilator 编译 (WSL + Clang)
-    print(f'  [编译] Verilator 编译中 (WSL + Clang)...')
-    obj_dir = os.path.join(output_dir, 'obj_dir')
-    # Linux binary has no extension
-    exe_name = 'Vtb' 
-    # But for Windows path checks we might need to know where it lands. 
-    # It will be in obj_dir/Vtb
-    win_exe_path = os.path.join(obj_dir, exe_name)
-    
-    # Convert paths to WSL
+    compare_mode = COMPARE_MODE
     wsl_cell_lib = to_wsl_path(CELL_LIB)
-    wsl_fi_netlist = to_wsl_path(fi_netlist_path)
-    wsl_tb = to_wsl_path(batched_tb_path)
-    wsl_obj_dir = to_wsl_path(obj_dir)
-    
     # Calculate jobs
     compile_jobs = max(1, (os.cpu_count() or 4) - 2)
     
-    # Verilator command with Clang
-    # --binary: Build binary directly
-    # --compiler clang: Use clang
-    # -j: Parallel jobs
-    verilator_cmd = (
-        f'verilator --binary --timing -j {compile_jobs} '
-        f'--compiler clang ' 
-        f'--top-module tb '
-        f'-Wno-fatal -Wno-WIDTHTRUNC -Wno-WIDTHEXPAND '
-        f'-Wno-ASSIGNDLY -Wno-STMTDLY -Wno-MULTIDRIVEN '
-        f'--error-limit 100 '
-        f'-o {exe_name} --Mdir "{wsl_obj_dir}" '
-        f'"{wsl_cell_lib}" "{wsl_fi_netlist}" "{wsl_tb}"'
-    )
-    
-    print(f'  [Verilator] Generating and compiling C++ code (Clang, j={compile_jobs})...')
-    rc, out = run_wsl_cmd(verilator_cmd, capture=True, timeout=600)
-    if rc != 0:
-        print(f'  [错误] Verilator 编译失败:')
-        error_lines = out.split('\n')[:30]
-        for line in error_lines:
-            print(f'    {line}')
-        return None, None
-    
-    compile_time = time.time() - t0
-    print(f'  [编译完成] 耗时: {compile_time:.2f}s')
-    
-    # 5. Golden Run (No fault)
-    print(f'  [Golden] 运行无故障仿真...')
-    
+    # 3. Golden 编译 (原网表 + 原 TB)
+    # 仿真内比对模式需要在生成故障注入 TB 之前拿到 golden，因此先于注入版编译
+    print(f'  [Golden] 编译无故障仿真...')
     golden_obj_dir = os.path.join(output_dir, 'obj_dir_golden')
     
     # Golden paths
@@ -760,33 +1206,61 @@ def run_circuit_injection_batched(circuit_name: str, verilog_path: str,
     rc, out = run_wsl_cmd(golden_verilator_cmd, capture=True, timeout=600)
     golden_compiled = (rc == 0)
     
-    wsl_exe_path = f"{wsl_obj_dir}/{exe_name}"
+    golden_vals = []
+    gold_out = ""
+    if golden_compiled:
+        wsl_golden_exe = f"{wsl_golden_dir}/Vtb_golden"
+        rc, gold_out = run_wsl_cmd(f'"{wsl_golden_exe}" +DUMPFILE=none.vcd', capture=True, timeout=120)
+        golden_vals = parse_output_values(gold_out)
+    if not golden_vals and compare_mode != 'print':
+        print(f'  [警告] 没有 Golden 基准，仿真内比对不可用，回退到 print 模式')
+        compare_mode = 'print'
+    
+    # 4. 生成带故障注入的 Testbench (每个分片一份)
+    print(f'  [生成] 创建故障注入 Testbench (比对模式: {compare_mode})...')
+    golden_image = os.path.join(output_dir, GOLDEN_IMAGE_NAME)
+    
+    def write_shard_testbenches(mode):
+        for shard in shard_list:
+            fault_table_args = {}
+            if collapse:
+                shard_nets = set(shard['targets'])
+                fault_table = os.path.join(shard['dir'], FAULT_TABLE_NAME)
+                fault_table_args = dict(fault_list=[f for f in collapse.first_pass if f[0] in shard_nets],
+                                        fault_table=fault_table, fault_table_sim=to_wsl_path(fault_table),
+                                        fault_table_depth=len([d for d in collapse.dominated if d[0] in shard_nets]))
+            batched_tb, shard['fault_map'] = generate_fault_injection_testbench(
+                tb_src, shard['targets'], circuit_name, mode,
+                golden_vals, golden_image, to_wsl_path(golden_image), **fault_table_args
+            )
+            with open(shard['tb'], 'w', encoding='utf-8') as f:
+                f.write(batched_tb)
+    
+    try:
+        write_shard_testbenches(compare_mode)
+    except ValueError as e:
+        print(f'  [警告] {e}，回退到 print 模式')
+        compare_mode = 'print'
+        write_shard_testbenches(compare_mode)
+    
+    # 5. Verilator 编译 (WSL + Clang)，各分片在内存预算内并发
+    print(f'  [编译] Verilator 编译中 (WSL + Clang, {n_shards} 个分片)...')
+    compile_ok, compile_stats = compile_fi_shards(shard_list, wsl_cell_lib, compile_jobs)
+    if not compile_ok:
+        return None, None
+    
+    compile_time = time.time() - t0
+    print(f'  [编译完成] 耗时: {compile_time:.2f}s (注入网表编译: {compile_stats["compile_time"]:.1f}s, '
+          f'最大并发 {compile_stats["max_parallel"]} (-j 合计 {compile_stats["max_jobs"]}), 单进程峰值 RSS {compile_stats["peak_rss_mb"]:.0f} MB)')
+    
+    wsl_exe_path = shard_list[0]['exe']
     
     if not golden_compiled:
          print(f'  [警告] Golden 编译失败，尝试从注入版获取基准')
-         gold_out = ""
          # Fallback to FI version with no fault
          cmd_str = f'"{wsl_exe_path}" +FAULT_ID=-1 +BATCH_START=0 +BATCH_END=1 +DUMPFILE=none.vcd'
          rc, gold_out = run_wsl_cmd(cmd_str, capture=True, timeout=120)
-    else:
-        wsl_golden_exe = f"{wsl_golden_dir}/Vtb_golden"
-        rc, gold_out = run_wsl_cmd(f'"{wsl_golden_exe}" +DUMPFILE=none.vcd', capture=True, timeout=120)
-    
-    golden_vals = []
-    for line in gold_out.splitlines():
-        # 尝试多种匹配模式
-        m = OSUM_HEX_RE.search(line)
-        if not m:
-            m = ALT_HEX_RE.search(line)
-        if m:
-            s = m.group(1).lower()
-            if 'x' in s or 'z' in s:
-                golden_vals.append(-1)
-            else:
-                try:
-                    golden_vals.append(int(s, 16))
-                except:
-                    golden_vals.append(-1)
+         golden_vals = parse_output_values(gold_out)
     
     if not golden_vals:
         print('  [错误] 未找到 Golden 输出')
@@ -798,53 +1272,42 @@ def run_circuit_injection_batched(circuit_name: str, verilog_path: str,
     with open(golden_json, 'w', encoding='utf-8') as f:
         json.dump({'values': golden_vals}, f)
     
-    # 6. 批量故障注入
-    num_batches = min(WORKER_COUNT, total_faults)
-    faults_per_batch = (total_faults + num_batches - 1) // num_batches
-    
-    jobs = []
-    for i in range(num_batches):
-        start = i * faults_per_batch
-        end = min(start + faults_per_batch, total_faults)
-        if start < total_faults:
-            # Pass WSL path to worker
-            jobs.append((wsl_exe_path, start, end, golden_vals, fault_map))
-    
-    print(f'  [运行] {total_faults} 故障, 分 {len(jobs)} 批, 每批约 {faults_per_batch} 故障')
-    
-    # 7. 并行运行
-    node_results = {net: {'sa0': None, 'sa1': None} for net in legal_targets}
+    # 6. 批量故障注入 (并行运行，批次派发到故障所在分片的二进制)
     run_start = time.time()
-    
-    with concurrent.futures.ProcessPoolExecutor(max_workers=WORKER_COUNT) as executor:
-        futures = {executor.submit(run_batch_worker, job): job for job in jobs}
-        
-        done_cnt = 0
-        for future in concurrent.futures.as_completed(futures):
-            done_cnt += 1
-            batch_results = future.result()
-            
-            for net, res_dict in batch_results.items():
-                if net in node_results:
-                    if res_dict.get('sa0'):
-                        node_results[net]['sa0'] = res_dict['sa0']
-                    if res_dict.get('sa1'):
-                        node_results[net]['sa1'] = res_dict['sa1']
-            
-            elapsed = time.time() - run_start
-            progress_pct = 100 * done_cnt / len(jobs)
-            eta = elapsed / done_cnt * (len(jobs) - done_cnt) if done_cnt > 0 else 0
-            print(f"    批次: {done_cnt}/{len(jobs)} ({progress_pct:.0f}%) | "
-                  f"耗时: {elapsed:.1f}s | 剩余: {eta:.0f}s", end='\r')
-    
-    print("")
+    shard_runs = [(shard['exe'], shard['fault_map'], '') for shard in shard_list]
+    fault_results, log_bytes = run_fault_batches(shard_runs, golden_vals, compare_mode)
+    simulated = sum(len(shard['fault_map']) for shard in shard_list)
+    
+    # 6.5 支配关系第二轮: 只补跑被支配类都未检出的支配类
+    if collapse and collapse.dominated:
+        second = collapse.second_pass(fault_results)
+        print(f'  [支配] {len(collapse.dominated) - len(second)} 个支配类由被支配故障推出检出, 第二轮仿真 {len(second)} 个')
+        if second:
+            second_runs = []
+            for i, shard in enumerate(shard_list):
+                shard_second = [f for f in second if shard_of[f[0]] == i]
+                if shard_second:
+                    second_table = os.path.join(shard['dir'], 'dom_' + FAULT_TABLE_NAME)
+                    write_fault_table(second_table, shard_second, shard['targets'])
+                    second_runs.append((shard['exe'], shard_second, f' +FAULT_TABLE="{to_wsl_path(second_table)}"'))
+            second_results, second_bytes = run_fault_batches(second_runs, golden_vals, compare_mode)
+            fault_results.update(second_results)
+            log_bytes += second_bytes
+            simulated += len(second)
+    
+    # 7. 结果展开回全部目标线网
+    if collapse:
+        node_results = collapse.expand(fault_results)
+    else:
+        node_results = {net: {'sa0': fault_results.get((net, 0)), 'sa1': fault_results.get((net, 1))}
+                        for net in legal_targets}
+    run_time = time.time() - run_start
     
     # 8. 保存结果
     with open(res_json, 'w', encoding='utf-8') as f:
         json.dump(node_results, f, indent=2)
     
     total_time = time.time() - t0
-    run_time = time.time() - run_start
     
     success_count = sum(1 for net in node_results.values() 
                         for fault in [net['sa0'], net['sa1']] 
@@ -852,7 +1315,47 @@ def run_circuit_injection_batched(circuit_name: str, verilog_path: str,
     
     print(f'  [完成] 总时间: {total_time:.1f}s (编译: {compile_time:.1f}s, 运行: {run_time:.1f}s)')
     print(f'  [速率] {total_faults/max(total_time, 0.1):.1f} 故障/秒')
+    print(f'  [输出] 仿真 stdout 共 {log_bytes / 1024:.1f} KB ({log_bytes / max(simulated, 1):.0f} B/故障)')
     print(f'  [成功] {success_count}/{total_faults} 故障测试成功')
+    mismatch_count = sum(1 for net in node_results.values()
+                         for fault in [net['sa0'], net['sa1']]
+                         if fault and fault.get('status') == 'obs_count_mismatch')
+    if mismatch_count:
+        print(f'  [警告] {mismatch_count} 个故障的输出个数与 Golden ({len(golden_vals)}) 不符，记为 obs_count_mismatch')
+    
+    if collapse:
+        # 未压缩时的运行时间按实测单故障耗时外推
+        est_full_run_time = run_time / max(simulated, 1) * total_faults
+        print(f'  [压缩] 仿真 {simulated}/{total_faults} 故障, 运行 {run_time:.1f}s, '
+              f'未压缩估计 {est_full_run_time:.1f}s (节省 {est_full_run_time - run_time:.1f}s)')
+        append_report_row(COLLAPSE_REPORT_NAME, {
+            'circuit': circuit_name,
+            'collapse_mode': COLLAPSE_MODE,
+            'faults': total_faults,
+            'equiv_classes': len(collapse.reps),
+            'simulated': simulated,
+            'collapse_ratio': f'{simulated / max(total_faults, 1):.4f}',
+            'run_time': f'{run_time:.2f}',
+            'est_full_run_time': f'{est_full_run_time:.2f}',
+            'time_saved': f'{est_full_run_time - run_time:.2f}',
+        })
+    
+    if shards is not None or SHARD_COUNT > 1:
+        print(f'  [分片] K={n_shards}: 注入网表编译 {compile_stats["compile_time"]:.1f}s '
+              f'(单分片最长 {compile_stats["shard_compile_max"]:.1f}s), 峰值 RSS {compile_stats["peak_rss_mb"]:.0f} MB, '
+              f'端到端 {total_time:.1f}s')
+        append_report_row(SHARD_REPORT_NAME, {
+            'circuit': circuit_name,
+            'shards': n_shards,
+            'fi_netlist_mb': f'{fi_netlist_mb:.2f}',
+            'max_parallel': compile_stats['max_parallel'],
+            'mem_budget_mb': f'{compile_stats["mem_budget_mb"]:.0f}',
+            'compile_time': f'{compile_stats["compile_time"]:.2f}',
+            'shard_compile_max': f'{compile_stats["shard_compile_max"]:.2f}',
+            'peak_rss_mb': f'{compile_stats["peak_rss_mb"]:.0f}',
+            'run_time': f'{run_time:.2f}',
+            'total_time': f'{total_time:.2f}',
+        })
     
     return golden_vals, node_results
 
@@ -1080,6 +1583,30 @@ def generate_summary_csv(circuit_coverage_data: Dict[str, Dict], output_path: st
 
 
 def main():
+    global INJECTION_ENGINE, COMPARE_MODE, COLLAPSE_MODE, SHARD_COUNT
+    parser = argparse.ArgumentParser(description="全节点故障注入与排名覆盖率分析")
+    parser.add_argument('--engine', type=str, default=INJECTION_ENGINE, choices=['verilator', 'ppsfp'],
+                        help="故障注入引擎: verilator (默认) 或 ppsfp (无需仿真器)")
+    parser.add_argument('--compare', type=str, default=COMPARE_MODE, choices=['print', 'count', 'detect'],
+                        help="Verilator 结果比对: print (打印全部输出) / count (仿真内比对, 只输出 diff_count) / "
+                             "detect (首次不一致即中止)")
+    parser.add_argument('--collapse', type=str, default=COLLAPSE_MODE, choices=['none', 'equiv', 'dominance'],
+                        help="Verilator 结构故障压缩: none / equiv (只仿真等价类代表) / "
+                             "dominance (再按支配关系两轮仿真, 需 --compare detect)")
+    parser.add_argument('--shards', type=int, default=SHARD_COUNT,
+                        help="Verilator 注入网表分片数 K: 每片单独插入 MUX 并编译，按内存预算并发编译")
+    parser.add_argument('--shard_sweep', type=str, default='',
+                        help="逗号分隔的 K 列表 (如 1,2,4,8): 每个电路按各 K 完整运行一次注入 "
+                             "(结果在 <电路>/shards_k<K>/)，只输出分片编译报告，不做排名分析")
+    args = parser.parse_args()
+    INJECTION_ENGINE = args.engine
+    COMPARE_MODE = args.compare
+    COLLAPSE_MODE = args.collapse
+    SHARD_COUNT = max(1, args.shards)
+    if COLLAPSE_MODE == 'dominance' and COMPARE_MODE != 'detect':
+        print("[警告] 支配压缩推出的故障没有 diff_count，只适用于 --compare detect，改用 equiv")
+        COLLAPSE_MODE = 'equiv'
+
     if not os.path.exists(CELL_LIB):
         print(f"[错误] 未找到 {CELL_LIB}")
         return
@@ -1087,7 +1614,7 @@ def main():
     os.makedirs(BASE_RESULTS_DIR, exist_ok=True)
     
     rank_files = glob.glob(os.path.join(RANK_DIR, 'gnn_rank_*_v*.txt'))
-    print(f"[开始] 故障注入与分析 (并行进程: {WORKER_COUNT})")
+    print(f"[开始] 故障注入与分析 (引擎: {INJECTION_ENGINE}, 并行进程: {WORKER_COUNT})")
 
     circuit_ranks = {}
     for rank_f in rank_files:
@@ -1104,6 +1631,22 @@ def main():
             circuit_ranks[circuit_name] = {}
         circuit_ranks[circuit_name][full_version] = rank_f
 
+    if args.shard_sweep:
+        shard_ks = [int(k) for k in args.shard_sweep.split(',') if k.strip()]
+        for circuit_name in sorted(circuit_ranks):
+            verilog_path = os.path.join(INPUT_NETLIST_DIR, f'{circuit_name}.v')
+            tb_path = os.path.join(INPUT_NETLIST_DIR, f'tb_{circuit_name}.v')
+            if not os.path.exists(verilog_path) or not os.path.exists(tb_path):
+                print(f"[跳过] {circuit_name}: 文件不存在")
+                continue
+            for k in shard_ks:
+                run_circuit_injection_batched(
+                    circuit_name, verilog_path, tb_path,
+                    os.path.join(BASE_RESULTS_DIR, circuit_name, f'shards_k{k}'), shards=k
+                )
+        print(f"\n[完成] 分片编译报告: {os.path.join(BASE_RESULTS_DIR, SHARD_REPORT_NAME)}")
+        return
+
     circuit_coverage_data = {}
     injection_times = {}  # 记录每个电路的注入时间
 
@@ -1118,9 +1661,14 @@ def main():
         circuit_out_dir = os.path.join(BASE_RESULTS_DIR, circuit_name)
         
         injection_start = time.time()
-        golden, results = run_circuit_injection_batched(
-            circuit_name, verilog_path, tb_path, circuit_out_dir
-        )
+        if INJECTION_ENGINE == 'ppsfp':
+            # 延迟导入: bitparallel_sim 依赖本模块的配置与解析函数
+            from bitparallel_sim import run_ppsfp_injection
+            golden, results = run_ppsfp_injection(circuit_name, verilog_path, tb_path, circuit_out_dir)
+        else:
+            golden, results = run_circuit_injection_batched(
+                circuit_name, verilog_path, tb_path, circuit_out_dir
+            )
         injection_times[circuit_name] = time.time() - injection_start
         
         if golden and results:
@@ -15,19 +15,28 @@ Verilog 网表无监督/自监督敏感度评分器（批量模式）- V1 Only 
 
 import os
 import re
+import sys
 import math
 import argparse
 import random
 import glob
 import time
-import pickle
+import json
 import hashlib
 import shutil
 import tempfile
+import mmap
+import array
+import itertools
+import queue
+import threading
 import multiprocessing as mp
+from multiprocessing import shared_memory
 import numpy as np
+import scipy.sparse as sp
 import networkit as nk  # NetworkKit: 高性能图计算库
-from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed, wait
+from collections.abc import Mapping
 from typing import List, Tuple, Dict, Set, Optional
 
 import torch
@@ -47,6 +56,9 @@ SAMPLE_THRESHOLD = 500000
 # 运行模式（固定为 V1）
 RUN_MODE = 'v1'
 
+# 本进程可用的核心预算（0 = 不限制，即 CPU 核心数 - 2）；阶段1打包并发时每个子进程只分到其中一份
+CORE_BUDGET = 0
+
 
 # 尝试导入 psutil 用于内存监控
 try:
@@ -56,19 +68,24 @@ except ImportError:
     HAS_PSUTIL = False
     print("[警告] psutil 未安装，无法自动调整进程数。建议安装: pip install psutil")
 
-def get_adaptive_workers(n_nodes: int, task_type: str = 'distance') -> int:
+def available_cores() -> int:
+    """默认并行度：CORE_BUDGET（--workers 指定或阶段1分配），未设置时为 CPU 核心数 - 2"""
+    return CORE_BUDGET if CORE_BUDGET > 0 else max(1, mp.cpu_count() - 2)
+
+def get_adaptive_workers(n_nodes: int, task_type: str = 'distance', shared_bytes: int = 0) -> int:
     """
     根据可用内存和图大小自动计算进程/线程数
     
     Args:
         n_nodes: 节点数量
-        task_type: 任务类型 ('distance' 或 'node_features')
+        task_type: 任务类型 ('distance'、'node_features' 或 'netlist')
+        shared_bytes: 已发布到共享内存的图大小（字节），只计一次，不按进程重复计算
     
     Returns:
         推荐的进程数
     """
-    # 默认值：CPU 核心数 - 2
-    default_workers = max(1, mp.cpu_count() - 2)
+    # 默认值：核心预算（未设置时为 CPU 核心数 - 2）
+    default_workers = available_cores()
     
     if not HAS_PSUTIL:
         return default_workers
@@ -76,11 +93,14 @@ def get_adaptive_workers(n_nodes: int, task_type: str = 'distance') -> int:
     try:
         # 估算每个进程的内存需求 (MB)
         # distance 任务需要存储 BFS 结果，内存需求较高
-        # node_features 任务内存需求较低
+        # node_features 任务的图在共享内存中，每进程只需一个区间的稀疏前沿工作集（与图规模基本无关）
+        # netlist 任务（阶段1打包并发）每进程独立完成一个网表：固定开销 + 图与特征的峰值工作集
         if task_type == 'distance':
             mem_per_worker = max(100, n_nodes * 0.002)  # 大约每千节点 2MB
+        elif task_type == 'netlist':
+            mem_per_worker = PHASE1_WORKER_BASE_MB + n_nodes / 1000 * PHASE1_MB_PER_KNODE
         else:
-            mem_per_worker = max(50, n_nodes * 0.001)   # 大约每千节点 1MB
+            mem_per_worker = 150
         
         # 获取可用物理内存 (MB)
         mem_info = psutil.virtual_memory()
@@ -89,7 +109,7 @@ def get_adaptive_workers(n_nodes: int, task_type: str = 'distance') -> int:
         
         # 保留至少 2GB 或 20% 内存给系统
         reserved_mem = max(2000, total_mem * 0.2)
-        usable_mem = max(0, available_mem - reserved_mem)
+        usable_mem = max(0, available_mem - reserved_mem - shared_bytes / (1024 * 1024))
         
         # 计算最大进程数
         max_workers_by_mem = max(1, int(usable_mem / mem_per_worker))
@@ -143,6 +163,26 @@ def minmax_norm(arr: np.ndarray) -> np.ndarray:
 
 def z2u01(x: float) -> float: return 0.5 * (x + 1.0)
 
+def edges_to_csr(src: np.ndarray, dst: np.ndarray, n_nodes: int) -> Tuple[np.ndarray, np.ndarray]:
+    """由边数组构建 CSR (indptr, indices)，同一源节点的邻居保持原边序"""
+    src = np.asarray(src, dtype=np.int64)
+    order = np.argsort(src, kind='stable')
+    indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n_nodes), out=indptr[1:])
+    indices = np.asarray(dst, dtype=np.int32)[order]
+    return indptr, indices
+
+def csr_gather(indptr: np.ndarray, indices: np.ndarray, nodes: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """批量取出 nodes 的全部邻居，返回 (邻居数组, 每个邻居对应的 nodes 下标)"""
+    starts = indptr[nodes]
+    degs = indptr[nodes + 1] - starts
+    total = int(degs.sum())
+    if total == 0:
+        return np.empty(0, dtype=indices.dtype), np.empty(0, dtype=np.int64)
+    owner = np.repeat(np.arange(len(nodes), dtype=np.int64), degs)
+    pos = np.arange(total, dtype=np.int64) - np.repeat(np.cumsum(degs) - degs, degs) + starts[owner]
+    return indices[pos], owner
+
 def get_node_name(net):
     if hasattr(net, 'name'): return str(net.name)
     elif hasattr(net, 'var') and hasattr(net, 'ptr'): return f"{get_node_name(net.var)}[{get_node_name(net.ptr)}]"
@@ -152,9 +192,18 @@ def get_node_name(net):
 SEQ_CELL_RE = re.compile(r'(DFF|SDFF|DFFR|DFFS|DFFX|DLH|DLR|LATCH)', re.IGNORECASE)
 OUT_PORT_HINT = {'Z', 'ZN', 'Q', 'QN', 'OUT', 'Y', 'o_sum'}
 
+# 特征提取参数（参与缓存键，见 feature_extraction_params）
+PAGERANK_DAMP = 0.85
+PAGERANK_MAX_ITER = 100
+BET_SAMPLES_MIN, BET_SAMPLES_MAX, BET_SAMPLES_DIV = 10, 200, 10   # k_bet = clip(N // DIV, MIN, MAX)
+BET_SEED = 42
+EIGEN_MAX_ITER = 200
+DEPTH_CAP_MIN, DEPTH_CAP_MAX, DEPTH_CAP_DIV = 50, 200, 5          # cap = clip(N // DIV, MIN, MAX)
+
 # 缓存目录
 CACHE_DIR = "./feature_cache"
 USE_CACHE = True  # 由命令行参数 --no_cache 控制
+INCREMENTAL = False  # 由命令行参数 --incremental 控制：缓存未命中时以同一网表（源路径相同）旧版本缓存为基准增量更新
 
 # -----------------------
 # NetworkKit 图封装类
@@ -174,7 +223,8 @@ class NKGraph:
         self.n_nodes = n_nodes
         self._cached_edges: List[Tuple[int, int]] = None  # 边列表缓存
         self._cached_edges_np: np.ndarray = None  # numpy 格式边缓存
-    
+        self._csr_cache: Dict[bool, Tuple[np.ndarray, np.ndarray]] = {}  # CSR 邻接缓存
+
     @classmethod
     def from_edges(cls, n_nodes: int, edges: List[Tuple[int, int]], 
                    node_names: Dict[int, str] = None, 
@@ -246,7 +296,15 @@ class NKGraph:
         else:
             self._cached_edges_np = np.empty((0, 2), dtype=np.int32)
         return self._cached_edges_np
-    
+
+    def csr_arrays(self, reverse: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """返回 CSR 邻接 (indptr, indices)，reverse=True 时为反向图（前驱表）"""
+        if reverse not in self._csr_cache:
+            edge_np = self.edges_numpy()
+            src, dst = (edge_np[:, 1], edge_np[:, 0]) if reverse else (edge_np[:, 0], edge_np[:, 1])
+            self._csr_cache[reverse] = edges_to_csr(src, dst, self.n_nodes)
+        return self._csr_cache[reverse]
+
     def in_degree(self, node: int) -> int:
         return self.nk_graph.degreeIn(node)
     
@@ -259,6 +317,10 @@ class NKGraph:
     def all_out_degrees(self) -> np.ndarray:
         return np.array([self.nk_graph.degreeOut(n) for n in range(self.n_nodes)])
     
+    def name_lengths(self) -> np.ndarray:
+        """各节点名的字符数（无名字的节点按其 id 字符串计）"""
+        return np.array([len(self.node_names.get(n, str(n))) for n in range(self.n_nodes)])
+    
     def successors(self, node: int) -> List[int]:
         """返回后继节点"""
         return list(self.nk_graph.iterNeighbors(node))
@@ -386,122 +448,635 @@ class NKGraph:
         return mem / (1024 * 1024)
 
 # -----------------------
-# 多进程共享变量（用于 ProcessPoolExecutor）
+# CSR 紧凑图（百万节点级网表的低内存表示）
 # -----------------------
-_SHARED_NKG = None         # 共享的 NKGraph 对象
-_SHARED_NODE_TYPES = {}    # 共享的节点类型
-_SHARED_OUTPUT_IDS = set() # 共享的输出节点 ID
-_SHARED_OUT_LIST = []      # 共享的输出节点列表
-_SHARED_N = 0              # 共享的节点数
-_SHARED_IS_HUGE = False    # 共享的大规模标志
-
-def _init_mp_worker_nk(compact_data: dict):
-    """
-    多进程 Worker 初始化器（NetworkKit 版本）
-    从紧凑格式重建图，加载到子进程的全局变量
-    """
-    global _SHARED_NKG, _SHARED_NODE_TYPES, _SHARED_OUTPUT_IDS, _SHARED_OUT_LIST, _SHARED_N, _SHARED_IS_HUGE
-    
-    # 从紧凑格式重建 NKGraph
-    n_nodes = compact_data['n_nodes']
-    edges = compact_data['edges']
-    node_names = compact_data.get('node_names', {})
-    node_types = compact_data.get('node_types', {})
-    
-    _SHARED_NKG = NKGraph.from_edges(n_nodes, edges, node_names, node_types)
-    _SHARED_NODE_TYPES = node_types
-    _SHARED_OUTPUT_IDS = compact_data.get('output_ids', set())
-    _SHARED_OUT_LIST = compact_data.get('out_list', [])
-    _SHARED_N = n_nodes
-    _SHARED_IS_HUGE = compact_data.get('is_huge', False)
-
-def _mp_compute_distance_batch_v1(node_batch):
-    """
-    多进程 Worker (V1): 计算一批节点到输出的距离
-    使用共享的 NKGraph 和 C++ BFS
-    """
-    import math
-    nk_g = _SHARED_NKG
-    out_list = _SHARED_OUT_LIST
-    N = _SHARED_N
-    
-    results = {}
-    for n in node_batch:
-        dist_min_n = math.inf
-        dist_avg_n = math.inf
+class _CSRColumnView(Mapping):
+    """CSRGraph 节点属性列的只读映射视图，兼容 node_names / node_types 的 dict.get 用法"""
+    __slots__ = ('_g',)
+
+    def __init__(self, g: 'CSRGraph'):
+        self._g = g
+
+    def __len__(self):
+        return self._g.n_nodes if self._present() else 0
+
+    def __iter__(self):
+        return iter(range(len(self)))
+
+    def __getitem__(self, node: int) -> str:
+        if not self._present() or not (0 <= node < self._g.n_nodes):
+            raise KeyError(node)
+        return self._lookup(node)
+
+
+class _CSRNameView(_CSRColumnView):
+    __slots__ = ()
+
+    def _present(self):
+        return self._g.name_offsets is not None
+
+    def _lookup(self, node):
+        o = self._g.name_offsets
+        return self._g.name_buf[o[node]:o[node + 1]].tobytes().decode('utf-8')
+
+
+class _CSRTypeView(_CSRColumnView):
+    __slots__ = ()
+
+    def _present(self):
+        return self._g.type_ids is not None
+
+    def _lookup(self, node):
+        return self._g.type_table[self._g.type_ids[node]]
+
+
+class CSRGraph(NKGraph):
+    """
+    CSR 紧凑图，提供与 NKGraph 兼容的接口
+
+    存储布局（全部为连续 numpy 数组，无逐节点 Python 对象）：
+    - 正向 / 反向 CSR: indptr (int64, N+1) + indices (int32, E)
+    - 单元类型: type_ids 小整数数组 + type_table 类型表
+    - 节点名: name_buf 连续 UTF-8 字节缓冲 + name_offsets (int64, N+1)
+
+    node_names / node_types 为只读映射视图，NetworkKit 图仅在调用中心性算法时按需构建，
+    PageRank / Betweenness / 单源 BFS 等直接复用 NKGraph 的实现。
+    每个节点的邻居保持原始加边顺序；edges_numpy() 按源节点排序返回。
+    """
+
+    def __init__(self, n_nodes: int, indptr: np.ndarray, indices: np.ndarray,
+                 rev_indptr: np.ndarray, rev_indices: np.ndarray,
+                 type_ids: np.ndarray = None, type_table: List[str] = None,
+                 name_buf: np.ndarray = None, name_offsets: np.ndarray = None):
+        self.n_nodes = n_nodes
+        self.indptr, self.indices = indptr, indices
+        self.rev_indptr, self.rev_indices = rev_indptr, rev_indices
+        self.type_ids = type_ids
+        self.type_table = list(type_table) if type_table is not None else []
+        self.name_buf = name_buf
+        self.name_offsets = name_offsets
+        self.node_names = _CSRNameView(self)
+        self.node_types = _CSRTypeView(self)
+        self._nk_graph = None
+        self._rev_graph = None
+
+    # ---------- 构建 ----------
+    @staticmethod
+    def intern_types(types: List[str]) -> Tuple[np.ndarray, List[str]]:
+        """类型字符串驻留为小整数数组 + 类型表"""
+        table: Dict[str, int] = {}
+        ids = [table.setdefault(t, len(table)) for t in types]
+        dtype = np.uint16 if len(table) <= np.iinfo(np.uint16).max else np.int32
+        return np.array(ids, dtype=dtype), list(table)
+
+    @staticmethod
+    def pack_names(names: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """节点名打包为连续 UTF-8 缓冲 + 偏移表（也接受已编码的 bytes）"""
+        encoded = [s if isinstance(s, bytes) else s.encode('utf-8') for s in names]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        return np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets
+
+    @classmethod
+    def from_edges(cls, n_nodes: int, edges, node_names=None, node_types=None) -> 'CSRGraph':
+        """
+        从边列表 / (E, 2) 数组构建
+        node_names / node_types 可为 {id: str} 字典或按 id 排列的列表
+        """
+        edge_np = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        return cls.from_edge_arrays(n_nodes, edge_np[:, 0], edge_np[:, 1], node_names, node_types)
+
+    @classmethod
+    def from_edge_arrays(cls, n_nodes: int, src: np.ndarray, dst: np.ndarray,
+                         node_names=None, node_types=None) -> 'CSRGraph':
+        """从分开的 src / dst 数组构建（解析器直接产出，免去拼成 (E, 2) 的拷贝）"""
+        indptr, indices = edges_to_csr(src, dst, n_nodes)
+        rev_indptr, rev_indices = edges_to_csr(dst, src, n_nodes)
+
+        def _as_list(col, default):
+            if not col:
+                return None
+            if isinstance(col, dict):
+                return [col.get(n, default(n)) for n in range(n_nodes)]
+            return list(col)
+
+        names = _as_list(node_names, str)
+        types = _as_list(node_types, lambda n: '')
+        name_buf, name_offsets = cls.pack_names(names) if names is not None else (None, None)
+        type_ids, type_table = cls.intern_types(types) if types is not None else (None, None)
+        return cls(n_nodes, indptr, indices, rev_indptr, rev_indices,
+                   type_ids, type_table, name_buf, name_offsets)
+
+    def to_arrays(self) -> Dict:
+        """导出为纯数组字典（用于缓存 / 进程间传递）"""
+        return {
+            'n_nodes': self.n_nodes,
+            'indptr': self.indptr, 'indices': self.indices,
+            'rev_indptr': self.rev_indptr, 'rev_indices': self.rev_indices,
+            'type_ids': self.type_ids, 'type_table': self.type_table,
+            'name_buf': self.name_buf, 'name_offsets': self.name_offsets,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict) -> 'CSRGraph':
+        return cls(arrays['n_nodes'], arrays['indptr'], arrays['indices'],
+                   arrays['rev_indptr'], arrays['rev_indices'],
+                   arrays.get('type_ids'), arrays.get('type_table'),
+                   arrays.get('name_buf'), arrays.get('name_offsets'))
+
+    # ---------- NetworkKit 后端（按需构建） ----------
+    @property
+    def nk_graph(self):
+        if self._nk_graph is None:
+            self._nk_graph = self._build_nk(self._csr_sources(self.indptr), self.indices)
+        return self._nk_graph
+
+    def _csr_sources(self, indptr) -> np.ndarray:
+        return np.repeat(np.arange(self.n_nodes, dtype=np.int64), np.diff(indptr))
+
+    def _build_nk(self, src, dst, directed=True):
+        """按给定边顺序构建 NetworkKit 图"""
+        src = np.asarray(src).astype(np.uint64)
+        dst = np.asarray(dst).astype(np.uint64)
         try:
-            all_dists = nk_g.single_source_distances(n)
-            dists = [all_dists[t] for t in out_list if t in all_dists]
-            if dists:
-                dist_min_n = float(min(dists))
-                dist_avg_n = float(sum(dists) / len(dists))
-        except:
-            pass
-        
-        if not math.isfinite(dist_min_n):
-            dist_min_n = float(N)
-        if not math.isfinite(dist_avg_n):
-            dist_avg_n = float(N)
-        
-        results[n] = (dist_min_n, dist_avg_n)
-    return results
-
-def _mp_compute_node_features_v1(node_batch):
-    """
-    多进程 Worker (V1): 计算一批节点的 reconv, near_ff, depth 特征
-    """
-    nk_g = _SHARED_NKG
-    node_types = _SHARED_NODE_TYPES
-    N = _SHARED_N
-    cap = min(200, max(50, N // 5))
-    
-    results = {}
-    for n in node_batch:
-        # Reconv (无采样限制)
-        succ1 = set(nk_g.successors(n))
-        twohop_union = set()
-        sum_outdeg_nei = 0
-        for u in succ1:
-            su = set(nk_g.successors(u))
-            sum_outdeg_nei += len(su)
-            twohop_union |= su
-        reconv = float(max(0, sum_outdeg_nei - len(twohop_union)))
-        
-        # Near FF
-        flag = 0
-        for nb in list(nk_g.predecessors(n)) + list(nk_g.successors(n)):
-            typ = node_types.get(nb, '')
-            if typ and typ != 'wire' and SEQ_CELL_RE.search(typ):
-                flag = 1
-                break
-        near_ff = float(flag)
-        
-        # Depth
+            return nk.GraphFromCoo((src, dst), n=self.n_nodes, directed=directed)
+        except AttributeError:
+            # 旧版 NetworkKit 无 GraphFromCoo
+            g = nk.Graph(self.n_nodes, weighted=False, directed=directed)
+            for u, v in zip(src.tolist(), dst.tolist()):
+                g.addEdge(u, v)
+            return g
+
+    def get_reverse_graph(self):
+        """获取反向图（懒加载）"""
+        if self._rev_graph is None:
+            self._rev_graph = self._build_nk(self._csr_sources(self.rev_indptr), self.rev_indices)
+        return self._rev_graph
+
+    # ---------- NKGraph 兼容接口 ----------
+    def number_of_nodes(self) -> int:
+        return self.n_nodes
+
+    def number_of_edges(self) -> int:
+        return int(self.indices.size)
+
+    def nodes(self):
+        return range(self.n_nodes)
+
+    def edges_numpy(self) -> np.ndarray:
+        """返回 (E, 2) int32 边数组（按源节点排序）"""
+        src = np.repeat(np.arange(self.n_nodes, dtype=np.int32), np.diff(self.indptr))
+        return np.stack([src, self.indices.astype(np.int32, copy=False)], axis=1)
+
+    def edges(self) -> List[Tuple[int, int]]:
+        return [tuple(e) for e in self.edges_numpy().tolist()]
+
+    def csr_arrays(self, reverse: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        return (self.rev_indptr, self.rev_indices) if reverse else (self.indptr, self.indices)
+
+    def in_degree(self, node: int) -> int:
+        return int(self.rev_indptr[node + 1] - self.rev_indptr[node])
+
+    def out_degree(self, node: int) -> int:
+        return int(self.indptr[node + 1] - self.indptr[node])
+
+    def all_in_degrees(self) -> np.ndarray:
+        return np.diff(self.rev_indptr)
+
+    def all_out_degrees(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def name_lengths(self) -> np.ndarray:
+        """各节点名的字符数：UTF-8 字节数减去续字节数，不解码"""
+        if self.name_buf is None:
+            return super().name_lengths()
+        continuation = np.concatenate([[0], np.cumsum((self.name_buf & 0xC0) == 0x80)])
+        return np.diff(self.name_offsets) - np.diff(continuation[self.name_offsets])
+
+    def name_bytes(self) -> List[bytes]:
+        """全部节点名（UTF-8 bytes，不解码）"""
+        buf = self.name_buf.tobytes()
+        offsets = self.name_offsets.tolist()
+        return [buf[a:b] for a, b in zip(offsets, offsets[1:])]
+
+    def successors(self, node: int) -> List[int]:
+        return self.indices[self.indptr[node]:self.indptr[node + 1]].tolist()
+
+    def predecessors(self, node: int) -> List[int]:
+        return self.rev_indices[self.rev_indptr[node]:self.rev_indptr[node + 1]].tolist()
+
+    def eigenvector_centrality(self, max_iter: int = 100) -> np.ndarray:
+        """计算 Eigenvector Centrality（无向去重图，与 NKGraph 一致）"""
         try:
-            visited = {n: 0}
-            frontier = [n]
-            maxd = 0
-            cnt = 0
-            while frontier and cnt < cap:
-                nf = []
-                for u in frontier:
-                    for v in nk_g.successors(u):
-                        if v not in visited:
-                            visited[v] = visited[u] + 1
-                            maxd = max(maxd, visited[v])
-                            nf.append(v)
-                            cnt += 1
-                        if cnt >= cap:
-                            break
-                    if cnt >= cap:
-                        break
-                frontier = nf
-            depth = float(maxd)
-        except:
-            depth = 0.0
-        
-        results[n] = {'reconv': reconv, 'near_ff': near_ff, 'depth': depth}
-    return results
+            # 按 NKGraph 的加边顺序（u 升序、邻居原序）保留每个无向边的首次出现
+            src = self._csr_sources(self.indptr)
+            dst = self.indices.astype(np.int64)
+            keys = np.minimum(src, dst) * self.n_nodes + np.maximum(src, dst)
+            _, first = np.unique(keys, return_index=True)
+            first.sort()
+            undirected_graph = self._build_nk(src[first], dst[first], directed=False)
+            eig = nk.centrality.EigenvectorCentrality(undirected_graph, tol=1e-6)
+            eig.run()
+            return np.array(eig.scores())
+        except Exception:
+            return np.zeros(self.n_nodes)
+
+    def bfs_distances_to_targets(self, targets: Set[int]) -> np.ndarray:
+        """计算到目标节点集的最短距离（多源反向 BFS，CSR 批量扩展）"""
+        n = self.n_nodes
+        dist = np.full(n, float(n))
+        frontier = np.array(sorted(t for t in targets if 0 <= t < n), dtype=np.int64) if targets else np.empty(0, dtype=np.int64)
+        dist[frontier] = 0
+        level = 0
+        while frontier.size:
+            level += 1
+            nbrs, _ = csr_gather(self.rev_indptr, self.rev_indices, frontier)
+            nbrs = np.unique(nbrs)
+            frontier = nbrs[dist[nbrs] == n].astype(np.int64)
+            dist[frontier] = level
+        return dist
+
+    def memory_bytes(self) -> int:
+        """实测内存占用（各数组 nbytes 之和，不含按需构建的 NetworkKit 图）"""
+        total = sum(a.nbytes for a in (self.indptr, self.indices, self.rev_indptr, self.rev_indices,
+                                       self.type_ids, self.name_buf, self.name_offsets) if a is not None)
+        total += sum(sys.getsizeof(t) for t in self.type_table)
+        return int(total)
+
+    def memory_usage_mb(self) -> float:
+        return self.memory_bytes() / (1024 * 1024)
+
+# -----------------------
+# 输出距离引擎（以输出集为根的反向位并行 BFS）
+# -----------------------
+DIST_BITSET_WORDS = 32        # 每轮位集宽度（uint64 字数），即每轮同时推进 64*W 个输出
+DIST_BITSET_BUDGET_MB = 256   # 每轮 visited 位集的内存上限
+
+def _or_segments(vals: np.ndarray, seg: np.ndarray) -> np.ndarray:
+    """按段起点 seg 对 vals 的行做按位或（多数段长度为 1，按段内序号逐轮合并，避免二维 reduceat 的逐段开销）"""
+    merged = vals[seg].copy()
+    seg_len = np.diff(np.r_[seg, len(vals)])
+    rank = 1
+    multi = np.flatnonzero(seg_len > 1)
+    while multi.size:
+        merged[multi] |= vals[seg[multi] + rank]
+        rank += 1
+        multi = multi[seg_len[multi] > rank]
+    return merged
+
+def compute_output_distances_v1(nk_g, output_ids: Set[int], max_words: int = DIST_BITSET_WORDS,
+                                budget_mb: float = DIST_BITSET_BUDGET_MB) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    一次性计算所有节点到输出集的最短距离 (min) 与平均距离 (avg)
+
+    等价于对每个节点做正向 BFS 再按 out_list 过滤，但改为从输出节点出发在反向图上遍历：
+    每轮把 64*W 个输出打包为 W 个 uint64 位集同时推进波前，
+    新到达的位按层号累加到 min / sum / count 数组，代价随输出数而非 N 增长。
+    不可达任何输出的节点与旧实现一致，取值 N。
+
+    返回: (dist_min_arr, dist_avg_arr)，float64
+    """
+    N = nk_g.number_of_nodes()
+    dist_min_arr = np.full(N, float(N))
+    dist_avg_arr = np.full(N, float(N))
+    targets = np.array(sorted(t for t in output_ids if 0 <= t < N), dtype=np.int64) if output_ids else np.empty(0, dtype=np.int64)
+    if N == 0 or targets.size == 0:
+        return dist_min_arr, dist_avg_arr
+
+    rev_indptr, rev_indices = nk_g.csr_arrays(reverse=True)
+
+    # 位集宽度：过宽会搬运大量零位反而变慢，同时受内存预算约束
+    words_needed = (targets.size + 63) // 64
+    words_budget = max(1, int(budget_mb * 1024 * 1024 // (N * 8)))
+    n_words = max(1, min(words_needed, words_budget, max_words))
+    per_pass = 64 * n_words
+
+    best = np.full(N, np.iinfo(np.int64).max, dtype=np.int64)
+    dsum = np.zeros(N, dtype=np.int64)
+    dcnt = np.zeros(N, dtype=np.int64)
+
+    def _accumulate(nodes, bits, level):
+        c = np.bitwise_count(bits).sum(axis=1, dtype=np.int64)
+        dcnt[nodes] += c
+        dsum[nodes] += level * c
+        best[nodes] = np.minimum(best[nodes], level)
+
+    for b0 in range(0, targets.size, per_pass):
+        batch = targets[b0:b0 + per_pass]
+        k = np.arange(batch.size)
+        visited = np.zeros((N, n_words), dtype=np.uint64)
+        visited[batch, k // 64] = np.left_shift(np.uint64(1), (k % 64).astype(np.uint64))
+
+        frontier = batch
+        frontier_bits = visited[frontier]
+        _accumulate(frontier, frontier_bits, 0)
+
+        level = 0
+        while frontier.size:
+            level += 1
+            nbrs, owner = csr_gather(rev_indptr, rev_indices, frontier)
+            if nbrs.size == 0:
+                break
+            # 按目标节点归并各前驱波前位集
+            order = np.argsort(nbrs, kind='stable')
+            nbrs = nbrs[order]
+            vals = frontier_bits[owner[order]]
+            seg = np.flatnonzero(np.r_[True, nbrs[1:] != nbrs[:-1]])
+            nodes = nbrs[seg].astype(np.int64)
+            merged = _or_segments(vals, seg)
+            new_bits = merged & ~visited[nodes]
+            keep = new_bits.any(axis=1)
+            nodes, new_bits = nodes[keep], new_bits[keep]
+            if nodes.size == 0:
+                break
+            visited[nodes] |= new_bits
+            _accumulate(nodes, new_bits, level)
+            frontier, frontier_bits = nodes, new_bits
+
+    reached = dcnt > 0
+    dist_min_arr[reached] = best[reached].astype(float)
+    dist_avg_arr[reached] = dsum[reached] / dcnt[reached]
+    return dist_min_arr, dist_avg_arr
+
+def compute_output_distances_for_nodes(nk_g, nodes: np.ndarray, output_ids: Set[int], max_words: int = DIST_BITSET_WORDS,
+                                       budget_mb: float = DIST_BITSET_BUDGET_MB) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    只计算给定节点（不重复）到输出集的 (min, avg) 距离，结果与 compute_output_distances_v1 在这些节点上的值相同
+    从这些节点出发在正向图上做位并行 BFS（每轮 64*W 个出发节点），波前到达输出时把层号累加回各出发节点；
+    代价随出发节点数而非输出数增长，适合增量更新中只有少量祖先需要重算的情形
+    返回: (dist_min, dist_avg)，与 nodes 一一对应，float64
+    """
+    N = nk_g.number_of_nodes()
+    nodes = np.asarray(nodes, dtype=np.int64)
+    dist_min_arr = np.full(nodes.size, float(N))
+    dist_avg_arr = np.full(nodes.size, float(N))
+    targets = np.array(sorted(t for t in output_ids if 0 <= t < N), dtype=np.int64) if output_ids else np.empty(0, dtype=np.int64)
+    if nodes.size == 0 or targets.size == 0:
+        return dist_min_arr, dist_avg_arr
+
+    indptr, indices = nk_g.csr_arrays()
+    is_output = np.zeros(N, dtype=bool)
+    is_output[targets] = True
+
+    words_needed = (nodes.size + 63) // 64
+    words_budget = max(1, int(budget_mb * 1024 * 1024 // (N * 8)))
+    n_words = max(1, min(words_needed, words_budget, max_words))
+    per_pass = 64 * n_words
+
+    best = np.full(nodes.size, np.iinfo(np.int64).max, dtype=np.int64)
+    dsum = np.zeros(nodes.size, dtype=np.int64)
+    dcnt = np.zeros(nodes.size, dtype=np.int64)
+
+    def _accumulate(b0, count, reached_nodes, bits, level):
+        hit = is_output[reached_nodes]
+        if not hit.any():
+            return
+        # 到达的输出行按位展开（位 k 对应本轮第 k 个出发节点），按列求和即各出发节点本层到达的输出数
+        per_src = np.unpackbits(bits[hit].astype('<u8').view(np.uint8), axis=1, bitorder='little').sum(axis=0, dtype=np.int64)[:count]
+        src = np.flatnonzero(per_src)
+        c = per_src[src]
+        src += b0
+        dcnt[src] += c
+        dsum[src] += level * c
+        best[src] = np.minimum(best[src], level)
+
+    for b0 in range(0, nodes.size, per_pass):
+        batch = nodes[b0:b0 + per_pass]
+        k = np.arange(batch.size)
+        visited = np.zeros((N, n_words), dtype=np.uint64)
+        visited[batch, k // 64] = np.left_shift(np.uint64(1), (k % 64).astype(np.uint64))
+
+        frontier = batch
+        frontier_bits = visited[frontier]
+        _accumulate(b0, batch.size, frontier, frontier_bits, 0)
+
+        level = 0
+        while frontier.size:
+            level += 1
+            nbrs, owner = csr_gather(indptr, indices, frontier)
+            if nbrs.size == 0:
+                break
+            order = np.argsort(nbrs, kind='stable')
+            nbrs = nbrs[order]
+            vals = frontier_bits[owner[order]]
+            seg = np.flatnonzero(np.r_[True, nbrs[1:] != nbrs[:-1]])
+            reached = nbrs[seg].astype(np.int64)
+            merged = _or_segments(vals, seg)
+            new_bits = merged & ~visited[reached]
+            keep = new_bits.any(axis=1)
+            reached, new_bits = reached[keep], new_bits[keep]
+            if reached.size == 0:
+                break
+            visited[reached] |= new_bits
+            _accumulate(b0, batch.size, reached, new_bits, level)
+            frontier, frontier_bits = reached, new_bits
+
+    reached = dcnt > 0
+    dist_min_arr[reached] = best[reached].astype(float)
+    dist_avg_arr[reached] = dsum[reached] / dcnt[reached]
+    return dist_min_arr, dist_avg_arr
+
+# -----------------------
+# 节点级特征稀疏矩阵核（reconv / near_ff / depth 批量计算）
+# -----------------------
+NODE_FEAT_BLOCK = 8192  # 每块处理的源节点行数（限制二跳乘积与访问矩阵的内存）
+
+def depth_cap_for(N: int) -> int:
+    """Depth 特征的 BFS 节点数上限"""
+    return min(DEPTH_CAP_MAX, max(DEPTH_CAP_MIN, N // DEPTH_CAP_DIV))
+
+def seq_cell_mask(nk_g) -> np.ndarray:
+    """时序单元掩码：类型非空、非 wire 且匹配 SEQ_CELL_RE"""
+    def _is_seq(typ):
+        return bool(typ) and typ != 'wire' and bool(SEQ_CELL_RE.search(typ))
+    if isinstance(nk_g, CSRGraph) and nk_g.type_ids is not None:
+        table = np.array([_is_seq(t) for t in nk_g.type_table], dtype=bool)
+        return table[nk_g.type_ids]
+    return np.array([_is_seq(nk_g.node_types.get(n, '')) for n in range(nk_g.number_of_nodes())], dtype=bool)
+
+def build_feature_kernel_inputs(nk_g) -> Dict:
+    """
+    构建节点特征核所需的稀疏矩阵
+    A 为去重后的 0/1 邻接矩阵（与旧实现中 set(successors) 语义一致），AT 为其转置
+    """
+    N = nk_g.number_of_nodes()
+    def _binary(indptr, indices):
+        # copy=True：sum_duplicates 会原地排序 / 压缩 indices，不能改动图本身的 CSR 数组
+        m = sp.csr_matrix((np.ones(indices.size, dtype=np.int32), indices, indptr), shape=(N, N), copy=True)
+        m.sum_duplicates()
+        m.data[:] = 1
+        return m
+    A = _binary(*nk_g.csr_arrays())
+    AT = _binary(*nk_g.csr_arrays(reverse=True))
+    return {
+        'A': A, 'AT': AT,
+        'outdeg_uniq': np.diff(A.indptr).astype(np.int64),
+        'seq_mask': seq_cell_mask(nk_g).astype(np.int32),
+        'cap': depth_cap_for(N),
+    }
+
+def kernel_inputs_to_arrays(kin: Dict) -> Dict[str, np.ndarray]:
+    """把核输入拆成纯数组（用于发布到共享内存）"""
+    arrays = {'outdeg_uniq': kin['outdeg_uniq'], 'seq_mask': kin['seq_mask']}
+    for key in ('A', 'AT'):
+        m = kin[key]
+        arrays.update({f'{key}_indptr': m.indptr, f'{key}_indices': m.indices, f'{key}_data': m.data})
+    return arrays
+
+def kernel_inputs_from_arrays(arrays: Dict[str, np.ndarray], n_nodes: int, cap: int) -> Dict:
+    """由（共享内存中的）数组重建核输入，稀疏矩阵直接引用原缓冲，不复制"""
+    kin = {'outdeg_uniq': arrays['outdeg_uniq'], 'seq_mask': arrays['seq_mask'], 'cap': cap}
+    for key in ('A', 'AT'):
+        kin[key] = sp.csr_matrix((arrays[f'{key}_data'], arrays[f'{key}_indices'], arrays[f'{key}_indptr']),
+                                 shape=(n_nodes, n_nodes), copy=False)
+    return kin
+
+def _capped_depth_block(A, sources: np.ndarray, cap: int) -> np.ndarray:
+    """
+    批量带上限 BFS：每个源节点逐层扩展，累计发现 cap 个节点的那一层即为 depth，
+    不足 cap 时取最远层。与逐节点 BFS 的 maxd 完全一致（上限只与层号有关，与层内顺序无关）
+    """
+    k, N = sources.size, A.shape[0]
+    depth = np.zeros(k)
+    cnt = np.zeros(k, dtype=np.int64)
+    ids = np.arange(k)
+    frontier = sp.csr_matrix((np.ones(k, dtype=np.int32), (np.arange(k), sources)), shape=(k, N))
+    visited = frontier.copy()
+    level = 0
+    while ids.size:
+        level += 1
+        nxt = frontier @ A
+        nxt = nxt - nxt.multiply(visited)
+        nxt.eliminate_zeros()
+        nxt.data[:] = 1
+        new_cnt = np.diff(nxt.indptr)
+        has_new = new_cnt > 0
+        depth[ids[has_new]] = level
+        cnt[ids] += new_cnt
+        keep = has_new & (cnt[ids] < cap)
+        visited = (visited + nxt)[keep]
+        frontier = nxt[keep]
+        ids = ids[keep]
+    return depth
+
+def compute_node_features_sparse_v1(kin: Dict, start: int, end: int, block: int = NODE_FEAT_BLOCK,
+                                    nodes: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    计算节点区间 [start, end) 的 reconv / near_ff / depth；给定 nodes 时改为计算该节点列表（按列表顺序返回）
+
+    - reconv  = Σ 后继去重出度 − 二跳可达集合大小 = (A·outdeg) − nnz_row(A·A)
+    - near_ff = (A + Aᵀ)·seq_mask > 0
+    - depth   = 批量带上限 BFS 的层号
+    """
+    A, AT, cap = kin['A'], kin['AT'], kin['cap']
+    if nodes is not None:
+        start, end = 0, len(nodes)
+    n = end - start
+    reconv = np.zeros(n)
+    near_ff = np.zeros(n)
+    depth = np.zeros(n)
+    for b0 in range(start, end, block):
+        b1 = min(b0 + block, end)
+        sel = slice(b0, b1) if nodes is None else nodes[b0:b1]
+        rows = A[sel]
+        sum_outdeg_nei = rows @ kin['outdeg_uniq']
+        twohop = np.diff((rows @ A).indptr)
+        reconv[b0 - start:b1 - start] = np.maximum(0, sum_outdeg_nei - twohop)
+        seq_nb = rows @ kin['seq_mask'] + AT[sel] @ kin['seq_mask']
+        near_ff[b0 - start:b1 - start] = (seq_nb > 0).astype(float)
+        depth[b0 - start:b1 - start] = _capped_depth_block(A, np.arange(b0, b1) if nodes is None else nodes[b0:b1], cap)
+    return reconv, near_ff, depth
+
+# -----------------------
+# 多进程共享变量（用于 ProcessPoolExecutor）
+# -----------------------
+_SHARED_BLOCKS = []           # 子进程挂载的共享内存块（保持引用以免被回收）
+_SHARED_KERNEL_INPUTS = None  # 共享的节点特征核输入（零拷贝挂载的稀疏邻接矩阵等）
+_SHARED_OUTPUTS = None        # 共享的输出数组 {'reconv', 'near_ff', 'depth'}
+
+class SharedArrays:
+    """
+    将一组 numpy 数组一次性发布到 multiprocessing.shared_memory
+
+    主进程持有所有权（退出时 close + unlink），子进程凭 spec 零拷贝挂载，
+    图只占一份内存，与进程数无关。
+    """
+
+    def __init__(self):
+        self._blocks: List[shared_memory.SharedMemory] = []
+        self.spec: Dict[str, Tuple[str, Tuple[int, ...], str]] = {}
+        self.nbytes = 0
+
+    def _alloc(self, key: str, shape, dtype) -> np.ndarray:
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        shm = shared_memory.SharedMemory(create=True, size=max(1, nbytes))
+        self._blocks.append(shm)
+        self.spec[key] = (shm.name, tuple(shape), dtype.str)
+        self.nbytes += nbytes
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    def publish(self, key: str, arr: np.ndarray) -> np.ndarray:
+        arr = np.ascontiguousarray(arr)
+        view = self._alloc(key, arr.shape, arr.dtype)
+        view[...] = arr
+        return view
+
+    def zeros(self, key: str, shape, dtype=np.float64) -> np.ndarray:
+        view = self._alloc(key, shape, dtype)
+        view[...] = 0
+        return view
+
+    @staticmethod
+    def attach(spec: Dict) -> Tuple[List, Dict[str, np.ndarray]]:
+        """子进程挂载：返回 (共享内存块列表, {key: 数组视图})"""
+        blocks, arrays = [], {}
+        for key, (name, shape, dtype) in spec.items():
+            shm = shared_memory.SharedMemory(name=name)
+            blocks.append(shm)
+            arrays[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        return blocks, arrays
+
+    def close(self):
+        for shm in self._blocks:
+            try:
+                shm.close()
+            except BufferError:
+                pass  # 仍有 numpy 视图引用该块：映射随视图释放，段本身照样 unlink
+            finally:
+                try:
+                    shm.unlink()   # close 失败也必须 unlink，否则 /dev/shm 段一直留到重启
+                except FileNotFoundError:
+                    pass
+        self._blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _init_mp_worker_shm(spec: Dict, n_nodes: int, cap: int):
+    """
+    多进程 Worker 初始化器（共享内存版本）
+    零拷贝挂载主进程发布的稀疏邻接数组与输出数组，不再在每个子进程中重建图
+    """
+    global _SHARED_BLOCKS, _SHARED_KERNEL_INPUTS, _SHARED_OUTPUTS
+    _SHARED_BLOCKS, arrays = SharedArrays.attach(spec)
+    _SHARED_KERNEL_INPUTS = kernel_inputs_from_arrays(arrays, n_nodes, cap)
+    _SHARED_OUTPUTS = {k: arrays[k] for k in ('reconv', 'near_ff', 'depth')}
+
+def _mp_compute_node_features_v1(node_range):
+    """
+    多进程 Worker (V1): 用稀疏矩阵核计算节点区间 [start, end) 的 reconv, near_ff, depth 特征
+    结果直接写入共享输出数组，只返回区间
+    """
+    start, end = node_range
+    reconv, near_ff, depth = compute_node_features_sparse_v1(_SHARED_KERNEL_INPUTS, start, end)
+    _SHARED_OUTPUTS['reconv'][start:end] = reconv
+    _SHARED_OUTPUTS['near_ff'][start:end] = near_ff
+    _SHARED_OUTPUTS['depth'][start:end] = depth
+    return start, end
 
 
 
@@ -541,86 +1116,277 @@ def reset_cuda_state():
             pass
 
 # -----------------------
-# 特征缓存机制
+# 节点特征矩阵
+# -----------------------
+FEATURE_COLUMNS = ('in_deg', 'out_deg', 'pagerank', 'betweenness', 'eigen', 'dist_min_inv', 'dist_avg_inv',
+                   'reconv', 'near_ff', 'name_len', 'depth', 'is_output')
+# 增量更新（--incremental）所需的归一化前原始值（float64），随缓存条目保存；其余列可由图直接重算
+RAW_FEATURE_COLUMNS = ('pagerank', 'eigen', 'dist_min', 'dist_avg', 'reconv', 'near_ff', 'depth')
+
+class FeatureMatrix:
+    """
+    节点结构特征：(N, F) float32 矩阵（列主序，每列连续）+ 列名索引
+    提取 → 缓存 → PyG 构建 → 评分全程只传这一块数组，不为每个节点创建 dict
+    """
+
+    def __init__(self, values: np.ndarray, columns: Tuple[str, ...] = FEATURE_COLUMNS):
+        if values.ndim != 2 or values.shape[1] != len(columns):
+            raise ValueError(f"特征矩阵形状 {values.shape} 与列数 {len(columns)} 不符")
+        self.values = values
+        self.columns = tuple(columns)
+        self.index = {c: i for i, c in enumerate(self.columns)}
+
+    @classmethod
+    def empty(cls, n_nodes: int, columns: Tuple[str, ...] = FEATURE_COLUMNS) -> 'FeatureMatrix':
+        return cls(np.zeros((n_nodes, len(columns)), dtype=np.float32, order='F'), columns)
+
+    @property
+    def n_nodes(self) -> int:
+        return self.values.shape[0]
+
+    def __len__(self) -> int:
+        return self.n_nodes
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.index
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """按列名取整列（视图）"""
+        return self.values[:, self.index[name]]
+
+    def __setitem__(self, name: str, column: np.ndarray):
+        self.values[:, self.index[name]] = column
+
+
+# -----------------------
+# 特征缓存机制（列式、内容寻址）
 # -----------------------
+# 每个缓存条目是一个目录：meta.json + 每个数组一个 .npy（图的 CSR 数组、列主序特征矩阵、输出/时序节点 id）
+# 加载时按列 np.load(mmap_mode='r')，用到哪列才读哪列；目录名 = 文件名 + 全文摘要 + 提取参数摘要
+FEATURE_CACHE_VERSION = 6            # 特征代码版本：特征计算逻辑变化时递增，旧条目自动失效
+CACHE_MAX_BYTES = 4 * 1024 ** 3      # 缓存目录总大小上限（LRU 淘汰，--cache_max_mb 可调）
+CACHE_META_FILE = 'meta.json'
+_FILE_HASH_MEMO: Dict[Tuple[str, int, int], str] = {}
+
+def feature_extraction_params() -> Dict:
+    """
+    影响特征数值的全部提取参数（进入缓存键）
+    SMALL_SCALE_THRESHOLD 等只决定是否走多进程、不改变结果的阈值不计入
+    """
+    return {
+        'version': FEATURE_CACHE_VERSION,
+        'pagerank': [PAGERANK_DAMP, PAGERANK_MAX_ITER],
+        'k_bet': [BET_SAMPLES_MIN, BET_SAMPLES_MAX, BET_SAMPLES_DIV, BET_SEED],
+        'eigen_iter': EIGEN_MAX_ITER,
+        'cap': [DEPTH_CAP_MIN, DEPTH_CAP_MAX, DEPTH_CAP_DIV],
+        'seq_cell_re': SEQ_CELL_RE.pattern,
+        'out_port_hint': sorted(OUT_PORT_HINT),
+    }
+
 def get_file_hash(filepath: str) -> str:
-    """计算文件的 MD5 哈希值用于缓存验证"""
-    hasher = hashlib.md5()
-    try:
+    """流式计算文件全文 BLAKE2b 摘要（同一进程内按 路径/大小/mtime 记忆）"""
+    st = os.stat(filepath)
+    memo_key = (os.path.abspath(filepath), st.st_size, st.st_mtime_ns)
+    if memo_key not in _FILE_HASH_MEMO:
+        hasher = hashlib.blake2b(digest_size=16)
         with open(filepath, 'rb') as f:
-            # 读取前 64KB 加上文件大小作为快速哈希
-            buf = f.read(65536)
-            hasher.update(buf)
-            f.seek(0, 2)  # 移到文件末尾
-            hasher.update(str(f.tell()).encode())  # 加入文件大小
-    except:
-        hasher.update(os.path.basename(filepath).encode())
-    return hasher.hexdigest()[:16]
+            for block in iter(lambda: f.read(1 << 20), b''):
+                hasher.update(block)
+        _FILE_HASH_MEMO[memo_key] = hasher.hexdigest()
+    return _FILE_HASH_MEMO[memo_key]
+
+def feature_params_hash() -> str:
+    """提取参数摘要（缓存目录名的末段，也记录在 meta.json 中）"""
+    params = json.dumps(feature_extraction_params(), sort_keys=True).encode()
+    return hashlib.blake2b(params, digest_size=4).hexdigest()
 
 def get_cache_path(verilog_path: str, version: str) -> str:
-    """获取缓存文件路径"""
+    """获取缓存条目目录（绝对路径）"""
     base = os.path.splitext(os.path.basename(verilog_path))[0]
-    file_hash = get_file_hash(verilog_path)
-    cache_filename = f"{base}_{version}_{file_hash}.pkl"
-    return os.path.join(CACHE_DIR, cache_filename)
+    return os.path.join(os.path.abspath(CACHE_DIR), f"{base}_{version}_{get_file_hash(verilog_path)[:16]}_{feature_params_hash()}")
+
+class _LazyColumnFiles(Mapping):
+    """缓存条目中的列文件：首次访问时才 np.load(mmap_mode='r')"""
+
+    def __init__(self, entry_dir: str, names: List[str]):
+        self._dir = entry_dir
+        self._names = list(names)
+        self._loaded: Dict[str, np.ndarray] = {}
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self._loaded:
+            if name not in self._names:
+                raise KeyError(name)
+            self._loaded[name] = np.load(os.path.join(self._dir, f"{name}.npy"), mmap_mode='r')
+        return self._loaded[name]
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+def _dir_bytes(path: str) -> int:
+    return sum(e.stat().st_size for e in os.scandir(path) if e.is_file())
+
+def cache_budget_dirs() -> List[str]:
+    """共用 --cache_max_mb 上限的缓存目录：特征缓存 + 嵌入缓存"""
+    embed_dir = EMBED_CACHE_DIR or os.path.join(CACHE_DIR, 'embeddings')
+    return list(dict.fromkeys([os.path.abspath(CACHE_DIR), os.path.abspath(embed_dir)]))
+
+def enforce_cache_limit(cache_dirs: Optional[List[str]] = None, max_bytes: int = None, keep: str = None):
+    """
+    按最近使用时间（meta.json 的 mtime，加载时会刷新）淘汰条目，直到各目录合计大小不超过上限
+    cache_dirs 默认为 cache_budget_dirs()（特征与嵌入缓存共用一个上限）
+    """
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    for cache_dir in cache_dirs or cache_budget_dirs():
+        if not os.path.isdir(cache_dir):
+            continue
+        for entry in os.scandir(cache_dir):
+            meta_path = os.path.join(entry.path, CACHE_META_FILE)
+            if entry.is_dir() and '.tmp' not in entry.name and os.path.exists(meta_path):  # 跳过其他进程正在写入的临时目录
+                entries.append((os.stat(meta_path).st_mtime, _dir_bytes(entry.path), entry.path))
+    total = sum(size for _, size, _ in entries)
+    keep = os.path.abspath(keep) if keep else None
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if os.path.abspath(path) == keep:
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        print(f"    [缓存] LRU 淘汰: {os.path.basename(path)} ({size / (1024 * 1024):.1f}MB)")
 
-def save_cached_features(cache_path: str, feats: Dict, G, 
-                         output_ids: Set[int], seq_inst_ids: Set[int], compute_time: float = None):
-    """保存特征到缓存（兼容 NKGraph 和 NetworkX）"""
+def save_cached_features(cache_path: str, feats: FeatureMatrix, G, 
+                         output_ids: Set[int], seq_inst_ids: Set[int], compute_time: float = None,
+                         raw: Optional[FeatureMatrix] = None, source_path: str = None, version: str = None):
+    """
+    保存特征到列式缓存条目（raw 为增量更新所需的原始值矩阵，可选）
+    source_path / version 记入 meta.json，供 find_previous_cache_entry 找同一网表的旧版本
+    先写入临时目录再整体改名，并发写同一条目时先完成者生效
+    """
     if not USE_CACHE:
         return
+    tmp_dir = f"{cache_path}.tmp{os.getpid()}"
     try:
         os.makedirs(os.path.dirname(cache_path), exist_ok=True)
-        cached_data = {
-            'cache_version': 3,  # 版本 3: NKGraph 支持
-            'feats': feats,
-            'output_ids': output_ids,
-            'seq_inst_ids': seq_inst_ids,
-            'compute_time': compute_time
+        if not isinstance(G, CSRGraph):
+            G = CSRGraph.from_edges(G.number_of_nodes(), G.edges(), G.node_names, G.node_types)
+        graph_arrays = G.to_arrays()
+        columns: Dict[str, np.ndarray] = {}
+        for key, value in graph_arrays.items():
+            if isinstance(value, np.ndarray):
+                columns[f"graph.{key}"] = value
+        columns['features'] = feats.values
+        if raw is not None:
+            columns['raw_features'] = raw.values
+        columns['rank_mask'] = compute_rank_candidate_mask(G)
+        columns['output_ids'] = np.array(sorted(output_ids or ()), dtype=np.int64)
+        columns['seq_inst_ids'] = np.array(sorted(seq_inst_ids or ()), dtype=np.int64)
+        
+        os.makedirs(tmp_dir, exist_ok=True)
+        for name, arr in columns.items():
+            np.save(os.path.join(tmp_dir, f"{name}.npy"), arr)
+        meta = {
+            'cache_version': FEATURE_CACHE_VERSION,
+            'params': feature_extraction_params(),
+            'params_hash': feature_params_hash(),
+            'source_path': os.path.abspath(source_path) if source_path else None,
+            'version': version,
+            'n_nodes': G.n_nodes,
+            'type_table': graph_arrays.get('type_table'),
+            'columns': list(columns),
+            'feature_columns': list(feats.columns),
+            'raw_feature_columns': list(raw.columns) if raw is not None else None,
+            'compute_time': compute_time,
         }
-        # 如果是 NKGraph，保存必要的属性
-        if isinstance(G, NKGraph):
-            cached_data['nk_graph'] = {
-                'n_nodes': G.n_nodes,
-                'edges': G.edges(),
-                'node_names': G.node_names,
-                'node_types': G.node_types
-            }
-        else:
-            cached_data['G'] = G  # 兼容旧版 NetworkX
-        with open(cache_path, 'wb') as f:
-            pickle.dump(cached_data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        with open(os.path.join(tmp_dir, CACHE_META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        try:
+            os.rename(tmp_dir, cache_path)
+        except OSError:
+            pass  # 其他进程已写入同一条目
+        enforce_cache_limit(keep=cache_path)
     except Exception as e:
         print(f"    [缓存] 保存失败: {e}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
 
 
 def load_cached_features_nk(cache_path: str):
     """
-    加载缓存的特征（NKGraph 版本）
-    返回: (feats, NKGraph, output_ids, seq_inst_ids, compute_time) 或 None
+    加载列式缓存条目（各列 memmap 懒加载，近乎瞬时）
+    返回: (feats, CSRGraph, output_ids, seq_inst_ids, compute_time) 或 None
     """
-    if not USE_CACHE or not os.path.exists(cache_path):
+    meta_path = os.path.join(cache_path, CACHE_META_FILE)
+    if not USE_CACHE or not os.path.exists(meta_path):
         return None
     try:
-        with open(cache_path, 'rb') as f:
-            cached_data = pickle.load(f)
-        compute_time = cached_data.get('compute_time')
-        
-        # 检查是否是 NKGraph 缓存
-        if 'nk_graph' in cached_data:
-            nk_data = cached_data['nk_graph']
-            nk_g = NKGraph.from_edges(
-                nk_data['n_nodes'],
-                nk_data['edges'],
-                nk_data['node_names'],
-                nk_data['node_types']
-            )
-            return (cached_data['feats'], nk_g, 
-                    cached_data['output_ids'], cached_data['seq_inst_ids'], compute_time)
-        # 兼容旧版 NetworkX 缓存 - 跳过转换
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('cache_version') != FEATURE_CACHE_VERSION or meta.get('params') != feature_extraction_params():
+            return None
+        files = _LazyColumnFiles(cache_path, meta['columns'])
+        graph_arrays = {name[len('graph.'):]: files[name] for name in files if name.startswith('graph.')}
+        graph_arrays['type_table'] = meta.get('type_table')
+        graph_arrays['n_nodes'] = meta['n_nodes']
+        nk_g = CSRGraph.from_arrays(graph_arrays)
+        feats = FeatureMatrix(files['features'], tuple(meta['feature_columns']))
+        if 'rank_mask' in files:
+            nk_g.rank_mask = files['rank_mask']
+        output_ids = set(files['output_ids'].tolist())
+        seq_inst_ids = set(files['seq_inst_ids'].tolist())
+        os.utime(meta_path)  # 刷新 LRU 使用时间
+        return (feats, nk_g, output_ids, seq_inst_ids, meta.get('compute_time'))
+    except Exception as e:
+        print(f"    [缓存] 加载失败: {e}")
+        return None
+
+def load_cached_raw_features(cache_path: str) -> Optional[FeatureMatrix]:
+    """加载缓存条目中的原始值矩阵（memmap）；条目不存在、版本不符或原始值列与 RAW_FEATURE_COLUMNS 不同时返回 None"""
+    meta_path = os.path.join(cache_path, CACHE_META_FILE)
+    if not os.path.exists(meta_path):
         return None
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if (meta.get('cache_version') != FEATURE_CACHE_VERSION or meta.get('params') != feature_extraction_params()
+                or tuple(meta.get('raw_feature_columns') or ()) != RAW_FEATURE_COLUMNS):
+            return None
+        files = _LazyColumnFiles(cache_path, meta['columns'])
+        return FeatureMatrix(files['raw_features'], tuple(meta['raw_feature_columns']))
     except Exception as e:
-        print(f"    [缓存] NKGraph 加载失败: {e}")
+        print(f"    [缓存] 原始值加载失败: {e}")
+        return None
+
+def find_previous_cache_entry(verilog_path: str, version: str) -> Optional[str]:
+    """
+    查找同一网表（meta.json 中源文件路径相同）旧版本（文件摘要不同、提取参数摘要相同）且带原始值的
+    最近使用缓存条目，用作增量更新的基准，找不到时返回 None
+    """
+    current = get_cache_path(verilog_path, version)
+    cache_dir = os.path.dirname(current)
+    source_path = os.path.abspath(verilog_path)
+    params_hash = feature_params_hash()
+    candidates = []
+    if os.path.isdir(cache_dir):
+        for entry in os.scandir(cache_dir):
+            meta_path = os.path.join(entry.path, CACHE_META_FILE)
+            if not entry.is_dir() or '.tmp' in entry.name or entry.path == current or not os.path.exists(meta_path):
+                continue
+            try:
+                with open(meta_path, 'r', encoding='utf-8') as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if (meta.get('source_path') == source_path and meta.get('version') == version
+                    and meta.get('params_hash') == params_hash):
+                candidates.append((os.stat(meta_path).st_mtime, entry.path))
+    for _, path in sorted(candidates, reverse=True):
+        if load_cached_raw_features(path) is not None:
+            return path
     return None
 
 # -----------------------
@@ -646,14 +1412,164 @@ def safe_read_verilog_file(filepath: str) -> str:
         raw = f.read()
     return raw.decode('utf-8', errors='ignore')
 
-# 预编译正则表达式（门级网表快速解析）
-# 匹配实例: GATE_TYPE inst_name (.PORT(net), .PORT(net), ...);
-_INSTANCE_RE = re.compile(
-    r'^\s*(\w+)\s+(\w+)\s*\((.*?)\)\s*;',
-    re.MULTILINE | re.DOTALL
+# -----------------------
+# 流式网表分词器（mmap 单遍扫描 + 按语句边界分块并行）
+# -----------------------
+PARSE_CHUNK_BYTES = 8 * 1024 * 1024          # 分块目标大小（在语句边界处切开），限制单块词法单元的峰值内存
+PARSE_PARALLEL_MIN_BYTES = 32 * 1024 * 1024  # 超过该大小的网表才把各块分给多进程并行解析
+
+# 标识符：普通标识符，或转义标识符（反斜杠开头、空白结束，中间可含 [ ] ( ) ; / 等任意可见字符）
+_ID_PAT = rb'[A-Za-z_][\w$]*|\\\S+'
+# 注释；若有转义标识符内含 '/'（少见），改用保护版：模板 \1 原样保留该标识符（未匹配组替换为空串），整遍替换在 C 层完成
+_COMMENT_RE = re.compile(rb'//[^\n]*|/\*.*?\*/', re.DOTALL)
+_ESCAPED_SLASH_RE = re.compile(rb'\\[^\s/]*/')
+_COMMENT_SAFE_RE = re.compile(rb'(\\[^\s/]*/\S*)|//[^\n]*|/\*.*?\*/', re.DOTALL)
+# 词法单元（finditer 逐个产出，匹配的是以下三种之一）：
+#   实例头: [;|文件头|endmodule] GATE_TYPE inst_name (        → 组 1、2
+#   端口连接: .PORT(net) / .PORT(net[idx]) / .PORT(\escaped[idx] )  → 组 3、4
+#   其余转义标识符整体吞掉，避免其内部的 '.' '(' ';' 被误当作语法（无捕获组）
+_TOKEN_RE = re.compile(
+    rb'(?:^|;|\bendmodule\b)\s*(' + _ID_PAT + rb')\s+(' + _ID_PAT + rb')\s*\('
+    rb'|\.\s*(\w+)\s*\(\s*((?:\\\S+|[^()\\])*?)\s*\)'
+    rb'|\\\S+'
 )
-# 匹配端口连接: .PORT(net) 或 .PORT(net[idx])
-_PORT_RE = re.compile(r'\.(\w+)\s*\(\s*([^)]+)\s*\)')
+_NON_INSTANCE_KEYWORDS = ('module', 'endmodule', 'input', 'output', 'wire', 'reg', 'assign')
+
+def _is_statement_boundary(mm, prev: int, p: int) -> bool:
+    """
+    mm[p] == ';' 是否为真实语句结尾（不在块注释 / 行注释 / 转义标识符内）
+    prev 为上一个已确认的边界（其处于注释之外），块注释只需在 [prev, p) 内判断；拿不准时返回 False，只会让分块点后移
+    """
+    if mm.rfind(b'/*', prev, p) > mm.rfind(b'*/', prev, p):
+        return False
+    line_start = mm.rfind(b'\n', 0, p) + 1
+    if mm.find(b'//', line_start, p) != -1:
+        return False
+    token_start = max(mm.rfind(b' ', line_start, p), mm.rfind(b'\t', line_start, p), line_start - 1) + 1
+    return mm.find(b'\\', token_start, p) == -1
+
+def split_netlist_chunks(mm, chunk_bytes: Optional[int] = None) -> List[Tuple[int, int]]:
+    """在语句边界处把网表切成约 chunk_bytes 的字节区间 [start, end)"""
+    chunk_bytes = chunk_bytes or PARSE_CHUNK_BYTES
+    size = len(mm)
+    bounds = [0]
+    target = chunk_bytes
+    while target < size:
+        p = mm.find(b';', target)
+        while p != -1 and not _is_statement_boundary(mm, bounds[-1], p):
+            p = mm.find(b';', p + 1)
+        if p == -1:
+            break
+        bounds.append(p + 1)
+        target = p + 1 + chunk_bytes
+    bounds.append(size)
+    return [(s, e) for s, e in zip(bounds[:-1], bounds[1:]) if e > s]
+
+def tokenize_netlist_chunk(filepath: str, start: int = 0, end: Optional[int] = None) -> Dict:
+    """
+    单遍流式扫描网表字节区间 [start, end)，节点按首次出现顺序编局部 id
+    finditer 逐个词法单元处理，不保留中间 token 列表；边直接追加进 int32 数组（array 按倍增扩容），
+    峰值内存 ≈ 块副本（≤ PARSE_CHUNK_BYTES）+ 名字表 + 边数组
+
+    返回: {'names': [bytes], 'types': [bytes], 'src': int32, 'dst': int32,
+           'outputs': int32, 'seq': int32}（均为局部 id）
+    """
+    with open(filepath, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        end = size if end is None else min(end, size)
+        if end <= start:
+            buf = b''
+        else:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                buf = mm[start:end]
+    if b'/' in buf:
+        if _ESCAPED_SLASH_RE.search(buf):
+            buf = _COMMENT_SAFE_RE.sub(rb'\1 ', buf)
+        else:
+            buf = _COMMENT_RE.sub(b' ', buf)
+
+    node_ids: Dict[bytes, int] = {}   # 名字 → 局部 id（插入顺序即首次出现顺序）
+    types: List[bytes] = []           # 节点类型取首次出现处：实例头 → 单元类型，端口 → 'wire'
+    src, dst = array.array('i'), array.array('i')
+    outputs, seq = array.array('i'), array.array('i')
+    cell_kind: Dict[bytes, Tuple[bool, bool]] = {}   # 单元类型 → (是否实例, 是否时序单元)
+    port_is_out: Dict[bytes, bool] = {}
+
+    def node_id(name: bytes, kind: bytes) -> int:
+        nid = node_ids.get(name)
+        if nid is None:
+            nid = node_ids[name] = len(types)
+            types.append(kind)
+        return nid
+
+    inst_id = -1   # 当前语句所属实例；-1 表示尚未遇到实例头，或处于 module / wire 等关键字语句中
+    for m in _TOKEN_RE.finditer(buf):
+        cell, inst, port, net = m.groups()
+        if cell is not None:
+            kind = cell_kind.get(cell)
+            if kind is None:
+                kind = cell_kind[cell] = (cell.lower().decode('latin-1') not in _NON_INSTANCE_KEYWORDS,
+                                          bool(SEQ_CELL_RE.search(cell.decode('utf-8', 'ignore'))))
+            is_inst, is_seq = kind
+            if not is_inst:
+                inst_id = -1
+                continue
+            inst_id = node_id(inst, cell)
+            if is_seq:
+                seq.append(inst_id)
+        elif port is not None and inst_id >= 0:
+            # 边：按文本顺序，输出端口 inst→net，其余 net→inst
+            net_id = node_id(net.replace(b'.', b'_'), b'wire')
+            is_out = port_is_out.get(port)
+            if is_out is None:
+                is_out = port_is_out[port] = port.upper().decode('latin-1') in OUT_PORT_HINT
+            if is_out:
+                src.append(inst_id)
+                dst.append(net_id)
+                outputs.append(net_id)
+            else:
+                src.append(net_id)
+                dst.append(inst_id)
+    del buf
+
+    as_int32 = lambda a: np.frombuffer(a, dtype=np.int32) if len(a) else np.empty(0, dtype=np.int32)
+    return {'names': list(node_ids), 'types': types, 'src': as_int32(src), 'dst': as_int32(dst),
+            'outputs': as_int32(outputs), 'seq': as_int32(seq)}
+
+def _decode_name(raw: bytes) -> str:
+    return raw.decode('utf-8', 'ignore')
+
+def _tokenize_chunk_worker(args):
+    return tokenize_netlist_chunk(*args)
+
+def merge_netlist_chunks(chunks: List[Dict]) -> Tuple[List[bytes], List[str], np.ndarray, np.ndarray, Set[int], Set[int]]:
+    """
+    按块顺序合并局部名字表：新名字依次分配全局 id，与整文件顺序解析的编号完全一致
+    返回: (names[bytes], types, src, dst, output_ids, seq_inst_ids)
+    """
+    if len(chunks) == 1:
+        # 单块：局部 id 即全局 id
+        ch = chunks[0]
+        names, types, l2gs = ch['names'], ch['types'], [None]
+    else:
+        names = list(dict.fromkeys(itertools.chain.from_iterable(ch['names'] for ch in chunks)))
+        table = dict(zip(names, range(len(names))))
+        l2gs = [np.fromiter(map(table.__getitem__, ch['names']), dtype=np.int32, count=len(ch['names']))
+                for ch in chunks]
+        del table
+        type_of: Dict[bytes, bytes] = {}
+        for ch in reversed(chunks):   # 倒序覆盖：最早出现的块决定类型
+            type_of.update(zip(ch['names'], ch['types']))
+        types = list(map(type_of.__getitem__, names))
+        del type_of
+
+    remap = lambda a, l2g: a if l2g is None else l2g[a]
+    src = np.concatenate([remap(ch['src'], l2g) for ch, l2g in zip(chunks, l2gs)])
+    dst = np.concatenate([remap(ch['dst'], l2g) for ch, l2g in zip(chunks, l2gs)])
+    output_ids = set(np.concatenate([remap(ch['outputs'], l2g) for ch, l2g in zip(chunks, l2gs)]).tolist())
+    seq_inst_ids = set(np.concatenate([remap(ch['seq'], l2g) for ch, l2g in zip(chunks, l2gs)]).tolist())
+    type_str = {t: t.decode('utf-8', 'ignore') for t in set(types)}
+    return names, list(map(type_str.__getitem__, types)), src, dst, output_ids, seq_inst_ids
 
 
 def prepare_verilog_for_parsing(filepath: str) -> str:
@@ -693,72 +1609,33 @@ def prepare_verilog_for_parsing(filepath: str) -> str:
 
 
 
-def parse_verilog_graph_to_nk(filepath: str) -> Tuple[NKGraph, Dict, Set[int], Set[int]]:
+def parse_verilog_graph_to_nk(filepath: str) -> Tuple[CSRGraph, Dict, Set[int], Set[int]]:
     """
-    解析 Verilog 网表，直接构建 NKGraph（不经过 NetworkX）
+    解析 Verilog 网表，直接构建 CSRGraph（不经过 NetworkX）
+    mmap 单遍分词，节点 id 直接写入边缓冲；大文件按语句边界分块多进程解析后合并名字表
     
-    返回: (NKGraph, node_map, output_ids, seq_inst_ids)
+    返回: (CSRGraph, node_map, output_ids, seq_inst_ids)
     """
-    content = safe_read_verilog_file(filepath)
+    size = os.path.getsize(filepath)
+    spans = [(0, size)]
+    if size > PARSE_CHUNK_BYTES:
+        with open(filepath, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            spans = split_netlist_chunks(mm)
+    
+    n_workers = min(available_cores(), len(spans))
+    if n_workers > 1 and size >= PARSE_PARALLEL_MIN_BYTES:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            chunks = list(executor.map(_tokenize_chunk_worker, [(filepath, s, e) for s, e in spans]))
+    else:
+        chunks = [tokenize_netlist_chunk(filepath, s, e) for s, e in spans]
     
-    # 移除注释
-    content = re.sub(r'//.*$', '', content, flags=re.MULTILINE)
-    content = re.sub(r'/\*.*?\*/', '', content, flags=re.DOTALL)
-    
-    # 收集节点和边
-    node_map: Dict[str, int] = {}
-    node_names: Dict[int, str] = {}
-    node_types: Dict[int, str] = {}
-    edges: List[Tuple[int, int]] = []
-    id_counter = 0
-    output_ids: Set[int] = set()
-    seq_inst_ids: Set[int] = set()
-    
-    def get_or_add_node(name: str, node_type: str) -> int:
-        nonlocal id_counter
-        if name in node_map:
-            return node_map[name]
-        node_id = id_counter
-        node_map[name] = node_id
-        node_names[node_id] = name
-        node_types[node_id] = node_type
-        id_counter += 1
-        return node_id
-    
-    # 解析实例
-    for match in _INSTANCE_RE.finditer(content):
-        cell_type = match.group(1)
-        inst_name = match.group(2)
-        port_str = match.group(3)
-        
-        # 跳过关键字
-        if cell_type.lower() in ('module', 'endmodule', 'input', 'output', 'wire', 'reg', 'assign'):
-            continue
-        
-        # 添加实例节点
-        inst_id = get_or_add_node(inst_name, cell_type)
-        
-        # 检查时序单元
-        if SEQ_CELL_RE.search(cell_type or ''):
-            seq_inst_ids.add(inst_id)
-        
-        # 解析端口
-        for port_match in _PORT_RE.finditer(port_str):
-            port_name = port_match.group(1)
-            net_name = port_match.group(2).strip().replace('.', '_')
-            # net_name = re.sub(r'\[(\d+)\]', r'_\1', net_name) # 注释掉此行以保留 [idx]，匹配 all_nodes.py 的过滤机制
-            
-            net_id = get_or_add_node(net_name, 'wire')
-            
-            if port_name.upper() in OUT_PORT_HINT:
-                edges.append((inst_id, net_id))
-                output_ids.add(net_id)
-            else:
-                edges.append((net_id, inst_id))
+    raw_names, node_types, src, dst, output_ids, seq_inst_ids = merge_netlist_chunks(chunks)
+    del chunks
     
-    # 直接构建 NKGraph
-    n_nodes = id_counter
-    nk_g = NKGraph.from_edges(n_nodes, edges, node_names, node_types)
+    # 直接构建 CSRGraph（名字以原始字节打包，免去解码再编码）
+    n_nodes = len(raw_names)
+    nk_g = CSRGraph.from_edge_arrays(n_nodes, src, dst, raw_names, node_types)
+    node_map = dict(zip(map(_decode_name, raw_names), range(n_nodes)))
     
     return nk_g, node_map, output_ids, seq_inst_ids
 
@@ -766,17 +1643,21 @@ def parse_verilog_graph_to_nk(filepath: str) -> Tuple[NKGraph, Dict, Set[int], S
 # -----------------------
 # 特征工程（NetworkKit 高性能版本）
 # -----------------------
-def compute_struct_features_v1_nk(nk_g: NKGraph, output_ids: Set[int], seq_inst_ids: Set[int]) -> Dict[int, Dict]:
+def compute_struct_features_v1_nk(nk_g: NKGraph, output_ids: Set[int], seq_inst_ids: Set[int]) -> FeatureMatrix:
     """
     V1 特征提取（NetworkKit 版本）
     使用 ProcessPoolExecutor 实现真正的多核并行
     """
+    if nk_g.number_of_nodes() == 0:
+        return FeatureMatrix.empty(0)
+    return normalize_struct_features_v1(compute_raw_struct_features_v1_nk(nk_g, output_ids, seq_inst_ids))
+
+def compute_raw_struct_features_v1_nk(nk_g: NKGraph, output_ids: Set[int], seq_inst_ids: Set[int]) -> Dict[str, np.ndarray]:
+    """计算归一化前的各列原始值：列名同 FEATURE_COLUMNS，距离列为未取倒数的 dist_min / dist_avg"""
     import time as _time
     _start = _time.time()
     
     N = nk_g.number_of_nodes()
-    if N == 0:
-        return {}
     
     print(f"    [V1 NetworkKit] 开始计算 {N} 个节点的特征...")
     
@@ -786,151 +1667,318 @@ def compute_struct_features_v1_nk(nk_g: NKGraph, output_ids: Set[int], seq_inst_
     
     # 图级别特征（使用 NetworkKit C++ OpenMP 并行）
     print(f"    [V1 NetworkKit] 计算 PageRank...")
-    pr_values = nk_g.pagerank(damp=0.85, max_iter=100)
+    pr_values = nk_g.pagerank(damp=PAGERANK_DAMP, max_iter=PAGERANK_MAX_ITER)
     
     print(f"    [V1 NetworkKit] 计算 Betweenness...")
-    k_bet = min(200, max(10, N // 10))
-    bet_values = nk_g.betweenness_sampled(n_samples=k_bet, seed=42)
+    k_bet = min(BET_SAMPLES_MAX, max(BET_SAMPLES_MIN, N // BET_SAMPLES_DIV))
+    bet_values = nk_g.betweenness_sampled(n_samples=k_bet, seed=BET_SEED)
     
     print(f"    [V1 NetworkKit] 计算 Eigenvector...")
-    evec_values = nk_g.eigenvector_centrality(max_iter=200)
+    evec_values = nk_g.eigenvector_centrality(max_iter=EIGEN_MAX_ITER)
     
-    # 准备紧凑数据（用于多进程传递）
     out_list = list(output_ids) if output_ids else []
-    compact_data = {
-        'n_nodes': N,
-        'edges': nk_g.edges(),
-        'node_names': nk_g.node_names,
-        'node_types': nk_g.node_types,
-        'output_ids': output_ids,
-        'out_list': out_list,
-        'is_huge': N > 50000
-    }
     
-    # 距离特征和节点特征 - 使用 ProcessPoolExecutor
-    print(f"    [V1 NetworkKit] 计算距离 + 节点特征 (多进程)...")
-    dist_min_arr = np.full(N, float(N))
-    dist_avg_arr = np.full(N, float(N))
-    reconv = np.zeros(N)
-    near_ff = np.zeros(N)
-    depth = np.zeros(N)
+    # 距离特征：以输出集为根的反向位并行 BFS（一次算出全部节点）
+    print(f"    [V1 NetworkKit] 计算输出距离 (反向位并行 BFS, 输出数: {len(out_list)})...")
+    _dist_start = _time.time()
+    dist_min_arr, dist_avg_arr = compute_output_distances_v1(nk_g, output_ids)
+    print(f"    [V1 NetworkKit]   距离完成，耗时: {_time.time() - _dist_start:.2f}s")
     
-    # 混合并行策略 (Hybrid Parallelism)
-    # 策略：小图(<阈值)使用 ThreadPool 避免图重建开销；大图(>=阈值)使用 ProcessPool 利用多核
+    # 节点特征（reconv / near_ff / depth）：稀疏矩阵核
+    # 策略：小图(<阈值)在当前进程整体批量计算；大图(>=阈值)按节点区间分给 ProcessPool 利用多核
+    print(f"    [V1 NetworkKit] 计算节点特征 (稀疏矩阵核)...")
+    _nf_start = _time.time()
     if N < SMALL_SCALE_THRESHOLD:
-        pool_type = "线程池 (ThreadPoolExecutor)"
-        n_workers = max(1, mp.cpu_count() - 2)
-        batch_size = max(1, N // n_workers)
-        node_batches = [list(range(i, min(i + batch_size, N))) for i in range(0, N, batch_size)]
-        
-        # Set globals for ThreadPool (Current Process)
-        global _SHARED_NKG, _SHARED_NODE_TYPES, _SHARED_OUTPUT_IDS, _SHARED_OUT_LIST, _SHARED_N, _SHARED_IS_HUGE
-        _SHARED_NKG = nk_g
-        _SHARED_NODE_TYPES = nk_g.node_types
-        _SHARED_OUTPUT_IDS = output_ids
-        _SHARED_OUT_LIST = list(output_ids) if output_ids else []
-        _SHARED_N = N
-        _SHARED_IS_HUGE = compact_data['is_huge']
-        
-        ExecutorClass = ThreadPoolExecutor
-        init_kwargs = {}
-        
+        kin = build_feature_kernel_inputs(nk_g)
+        reconv, near_ff, depth = compute_node_features_sparse_v1(kin, 0, N)
     else:
-        pool_type = "进程池 (ProcessPoolExecutor)"
-        n_workers = get_adaptive_workers(N, 'distance')
-        batch_size = max(1, N // n_workers)
-        node_batches = [list(range(i, min(i + batch_size, N))) for i in range(0, N, batch_size)]
-        
-        ExecutorClass = ProcessPoolExecutor
-        init_kwargs = {'initializer': _init_mp_worker_nk, 'initargs': (compact_data,)}
-
-    print(f"    [V1 NetworkKit]   节点数: {N}, 批次: {len(node_batches)}, {pool_type} 核心数: {n_workers}")
-    
-    with ExecutorClass(max_workers=n_workers, **init_kwargs) as executor:
-        # 并行计算距离
-        if out_list:
-            print(f"    [V1 NetworkKit]   提交距离计算任务...")
-            dist_futures = [executor.submit(_mp_compute_distance_batch_v1, batch) for batch in node_batches]
-            for future in as_completed(dist_futures):
-                batch_results = future.result()
-                for n, (dmin, davg) in batch_results.items():
-                    dist_min_arr[n] = dmin
-                    dist_avg_arr[n] = davg
-        
-        # 并行计算节点级特征
-        print(f"    [V1 NetworkKit]   提交节点特征计算任务...")
-        feat_futures = [executor.submit(_mp_compute_node_features_v1, batch) for batch in node_batches]
-        for future in as_completed(feat_futures):
-            batch_results = future.result()
-            for n, feats in batch_results.items():
-                reconv[n] = feats['reconv']
-                near_ff[n] = feats['near_ff']
-                depth[n] = feats['depth']
-    
-    # 简单特征
-    name_len = np.array([len(nk_g.node_names.get(n, str(n))) for n in range(N)])
-    is_output_arr = np.array([1.0 if n in output_ids else 0.0 for n in range(N)])
-    
-    # 归一化
-    indeg_n = minmax_norm(indeg)
-    outdeg_n = minmax_norm(outdeg)
-    pr_n = minmax_norm(pr_values)
-    bet_n = minmax_norm(bet_values)
-    evec_n = minmax_norm(evec_values)
-    dmin_inv = minmax_norm(1.0 / (dist_min_arr + 1e-6))
-    davg_inv = minmax_norm(1.0 / (dist_avg_arr + 1e-6))
-    reconv_n = minmax_norm(reconv)
-    namelen_n = minmax_norm(name_len)
-    depth_n = minmax_norm(depth)
-    
-    feats = {}
-    for n in range(N):
-        feats[n] = {
-            'in_deg': float(indeg_n[n]), 'out_deg': float(outdeg_n[n]),
-            'pagerank': float(pr_n[n]), 'betweenness': float(bet_n[n]), 'eigen': float(evec_n[n]),
-            'dist_min_inv': float(dmin_inv[n]), 'dist_avg_inv': float(davg_inv[n]),
-            'reconv': float(reconv_n[n]), 'near_ff': float(near_ff[n]),
-            'name_len': float(namelen_n[n]), 'depth': float(depth_n[n]), 'is_output': float(is_output_arr[n]),
-        }
+        # 大图：稀疏邻接只构建一次并发布到共享内存，子进程零拷贝挂载，结果直接写回共享输出数组
+        kin_arrays = kernel_inputs_to_arrays(build_feature_kernel_inputs(nk_g))
+        # 在发布前估算进程数：共享图只计一次（发布后它已体现在可用内存中）
+        n_workers = get_adaptive_workers(N, 'node_features',
+                                         shared_bytes=sum(a.nbytes for a in kin_arrays.values()) + 3 * N * 8)
+        with SharedArrays() as shared:
+            for key, arr in kin_arrays.items():
+                shared.publish(key, arr)
+            del kin_arrays
+            outputs = {k: shared.zeros(k, (N,), np.float64) for k in ('reconv', 'near_ff', 'depth')}
+            # 区间切小（约 NODE_FEAT_BLOCK）以便负载均衡；任务只传区间，不再传图
+            node_ranges = [(i, min(i + NODE_FEAT_BLOCK, N)) for i in range(0, N, NODE_FEAT_BLOCK)]
+            print(f"    [V1 NetworkKit]   节点数: {N}, 区间: {len(node_ranges)}, 共享图: {shared.nbytes / 1024**2:.1f}MB, "
+                  f"进程池 (ProcessPoolExecutor) 核心数: {n_workers}")
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_mp_worker_shm,
+                                     initargs=(shared.spec, N, depth_cap_for(N))) as executor:
+                for future in as_completed([executor.submit(_mp_compute_node_features_v1, rng) for rng in node_ranges]):
+                    future.result()
+            reconv = outputs['reconv'].copy()
+            near_ff = outputs['near_ff'].copy()
+            depth = outputs['depth'].copy()
+            del outputs
+    print(f"    [V1 NetworkKit]   节点特征完成，耗时: {_time.time() - _nf_start:.2f}s")
     
     print(f"    [V1 NetworkKit] 完成，耗时: {_time.time() - _start:.2f}s")
+    return {
+        'in_deg': indeg, 'out_deg': outdeg, 'pagerank': pr_values, 'betweenness': bet_values, 'eigen': evec_values,
+        'dist_min': dist_min_arr, 'dist_avg': dist_avg_arr, 'reconv': reconv, 'near_ff': near_ff,
+        'name_len': nk_g.name_lengths(), 'depth': depth, 'is_output': output_indicator(N, output_ids),
+    }
+
+def output_indicator(N: int, output_ids: Set[int]) -> np.ndarray:
+    is_output_arr = np.zeros(N)
+    if output_ids:
+        is_output_arr[np.fromiter(output_ids, dtype=np.int64, count=len(output_ids))] = 1.0
+    return is_output_arr
+
+def normalize_struct_features_v1(raw: Dict[str, np.ndarray]) -> FeatureMatrix:
+    """原始值 -> 特征矩阵：全局 min-max 归一化，距离取倒数后归一化，near_ff / is_output 原样保留"""
+    feats = FeatureMatrix.empty(len(raw['in_deg']))
+    for name, column in (('in_deg', minmax_norm(raw['in_deg'])), ('out_deg', minmax_norm(raw['out_deg'])),
+                         ('pagerank', minmax_norm(raw['pagerank'])), ('betweenness', minmax_norm(raw['betweenness'])),
+                         ('eigen', minmax_norm(raw['eigen'])),
+                         ('dist_min_inv', minmax_norm(1.0 / (raw['dist_min'] + 1e-6))),
+                         ('dist_avg_inv', minmax_norm(1.0 / (raw['dist_avg'] + 1e-6))),
+                         ('reconv', minmax_norm(raw['reconv'])), ('near_ff', raw['near_ff']),
+                         ('name_len', minmax_norm(raw['name_len'])), ('depth', minmax_norm(raw['depth'])),
+                         ('is_output', raw['is_output'])):
+        feats[name] = column
     return feats
 
 
 
-def build_pyg_data_nk(nk_g: NKGraph, feats: Dict[int, Dict]) -> Tuple[Data, List[int], List[str]]:
+def raw_feature_matrix(raw: Dict[str, np.ndarray]) -> FeatureMatrix:
+    """取出增量更新所需的原始值列，组成 float64 列主序矩阵（随缓存保存）"""
+    values = np.column_stack([np.asarray(raw[c], dtype=np.float64) for c in RAW_FEATURE_COLUMNS])
+    return FeatureMatrix(np.asfortranarray(values), RAW_FEATURE_COLUMNS)
+
+# -----------------------
+# 增量特征更新（网表 ECO 小改动）
+# -----------------------
+# 新旧两版图按节点名对齐、按去重边集求差，得到改动节点集 C（新增节点、类型变化、边增删的端点）；
+# 各列只在可能受影响的范围内重算，其余沿用旧缓存的原始值，最后整体重新归一化：
+# - 度数 / 名长 / is_output / betweenness：本身就是 O(N+E) 或采样估计，直接全量重算
+#   （betweenness 为固定样本数的采样估计，大图上也只需几秒，不做局部化）
+# - PageRank：以旧向量为初值继续与 NetworkKit 相同的迭代，收敛判据不变
+# - Eigenvector：同样以旧向量为初值继续与 NetworkKit 相同的迭代（按范数变化判收敛）；
+#   两者与全量结果都只差收敛容差量级（div.v 上归一化后 ≤ 2e-4），不是逐位相同
+# - reconv / near_ff：只依赖一跳、二跳邻域，重算 C 及其前驱、后继
+# - depth：带上限 BFS 在前 depth+1 层未触及 C 的节点，过程与旧图完全相同；只重算反向距离 ≤ 旧 depth+1 的祖先
+# - 输出距离：只有能到达 C 或输出集变化处的祖先会变，其余节点的路径都绕开 C，沿用旧值；
+#   祖先少时从它们正向位并行 BFS（对其精确），祖先多时（改动在深层，其上游锥很大）全图反向计算更省
+INCREMENTAL_MAX_CHANGED_FRAC = 0.05   # 改动节点超过该比例时放弃增量，全量重算
+DIST_FORWARD_COST_RATIO = 32          # 正向 BFS 每个出发节点与反向 BFS 每个输出的代价比（深图上的实测上限，div.v ≈ 32）
+POWER_ITER_LIMIT = 10000              # 幂迭代次数保护上限
+
+def bfs_levels(indptr: np.ndarray, indices: np.ndarray, seeds: np.ndarray, n: int,
+               max_level: Optional[int] = None) -> np.ndarray:
+    """多源 BFS 层号（int32，未到达为 -1），max_level 限制扩展层数"""
+    level = np.full(n, -1, dtype=np.int32)
+    frontier = np.unique(np.asarray(seeds, dtype=np.int64))
+    level[frontier] = 0
+    d = 0
+    while frontier.size and (max_level is None or d < max_level):
+        d += 1
+        nbrs, _ = csr_gather(indptr, indices, frontier)
+        nbrs = np.unique(nbrs)
+        frontier = nbrs[level[nbrs] < 0].astype(np.int64)
+        level[frontier] = d
+    return level
+
+def pagerank_power(nk_g, damp: float = PAGERANK_DAMP, tol: float = 1e-8, x0: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    PageRank 幂迭代，与 NetworkKit PageRank 逐步相同（入边求和、无悬挂节点处理、L2 判收敛、最后归一到和为 1）
+    x0 为热启动初值
+    """
+    N = nk_g.number_of_nodes()
+    indptr, indices = nk_g.csr_arrays()
+    A = sp.csr_matrix((np.ones(indices.size), indices, indptr), shape=(N, N))
+    A.sum_duplicates()  # 重边计为权重，与 weightedDegree 一致
+    outdeg = np.asarray(A.sum(axis=1)).ravel()
+    P = (sp.diags(np.divide(1.0, outdeg, out=np.zeros(N), where=outdeg > 0)) @ A).T.tocsr()
+    x = np.full(N, 1.0 / N) if x0 is None else np.asarray(x0, dtype=np.float64)
+    for _ in range(POWER_ITER_LIMIT):
+        x_new = (1.0 - damp) / N + damp * (P @ x)
+        delta = np.linalg.norm(x_new - x)
+        x = x_new
+        if delta <= tol:
+            break
+    return x / x.sum()
+
+def eigenvector_power(nk_g, tol: float = 1e-6, x0: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Eigenvector 幂迭代，与 NetworkKit EigenvectorCentrality 逐步相同（无向去重图、每步 L2 归一化、
+    相邻两步的范数之差 ≤ tol 判收敛），x0 为热启动初值（默认全 1，即 NetworkKit 的初值）
+    """
+    N = nk_g.number_of_nodes()
+    indptr, indices = nk_g.csr_arrays()
+    src = np.repeat(np.arange(N, dtype=np.int64), np.diff(indptr))
+    dst = indices.astype(np.int64)
+    keys = np.unique(np.minimum(src, dst) * N + np.maximum(src, dst))
+    lo, hi = keys // N, keys % N
+    off = lo != hi
+    A = sp.csr_matrix((np.ones(keys.size + int(off.sum())), (np.r_[lo, hi[off]], np.r_[hi, lo[off]])), shape=(N, N))
+    x = np.ones(N) if x0 is None else np.asarray(x0, dtype=np.float64)
+    length = 0.0
+    for _ in range(POWER_ITER_LIMIT):
+        old_length = length
+        x = A @ x
+        length = np.sqrt(np.dot(x, x))
+        if length == 0:
+            return np.zeros(N)
+        x /= length
+        if abs(length - old_length) <= tol:
+            break
+    return -x if x[0] < 0 else x
+
+def diff_netlist_graphs(old_g: CSRGraph, new_g: CSRGraph, old_outputs: Set[int], new_outputs: Set[int]) -> Dict[str, np.ndarray]:
+    """
+    按节点名对齐两版图
+    返回: new_to_old（新节点为 -1）、changed（改动节点，新图编号）、out_changed（输出身份变化的节点）
+    """
+    N0, N1 = old_g.n_nodes, new_g.n_nodes
+    old_index = {name: i for i, name in enumerate(old_g.name_bytes())}
+    new_to_old = np.fromiter((old_index.get(name, -1) for name in new_g.name_bytes()), dtype=np.int64, count=N1)
+    mapped = new_to_old >= 0
+    old_to_new = np.full(N0, -1, dtype=np.int64)
+    old_to_new[new_to_old[mapped]] = np.flatnonzero(mapped)
+    changed = [np.flatnonzero(~mapped)]
+    
+    # 单元类型变化（影响 near_ff 的时序掩码）
+    if old_g.type_ids is not None and new_g.type_ids is not None:
+        old_codes = {t: i for i, t in enumerate(old_g.type_table)}
+        remap = np.array([old_codes.get(t, -1) for t in new_g.type_table], dtype=np.int64)
+        rows = np.flatnonzero(mapped)
+        changed.append(rows[remap[new_g.type_ids[rows]] != old_g.type_ids[new_to_old[rows]]])
+    
+    # 去重边集之差；连到已删除节点的旧边，存活一端计为改动
+    new_src = np.repeat(np.arange(N1, dtype=np.int64), np.diff(new_g.indptr))
+    new_dst = new_g.indices.astype(np.int64)
+    old_src = old_to_new[np.repeat(np.arange(N0, dtype=np.int64), np.diff(old_g.indptr))]
+    old_dst = old_to_new[old_g.indices]
+    alive = (old_src >= 0) & (old_dst >= 0)
+    changed += [old_src[~alive & (old_src >= 0)], old_dst[~alive & (old_dst >= 0)]]
+    edge_diff = np.setxor1d(np.unique(new_src * N1 + new_dst), np.unique(old_src[alive] * N1 + old_dst[alive]),
+                            assume_unique=True)
+    changed += [edge_diff // N1, edge_diff % N1]
+    
+    old_out = old_to_new[np.fromiter(old_outputs or (), dtype=np.int64)]
+    new_out = np.fromiter(new_outputs or (), dtype=np.int64)
+    return {
+        'new_to_old': new_to_old,
+        'changed': np.unique(np.concatenate(changed)),
+        'out_changed': np.setxor1d(np.unique(old_out[old_out >= 0]), np.unique(new_out)),
+    }
+
+def update_raw_struct_features_v1_nk(nk_g: NKGraph, output_ids: Set[int], base_g: NKGraph, base_raw: FeatureMatrix,
+                                     base_output_ids: Set[int]) -> Optional[Dict[str, np.ndarray]]:
+    """
+    以旧版本缓存为基准增量计算原始值（结果语义同 compute_raw_struct_features_v1_nk）
+    图缺少节点名或改动过大时返回 None，由调用方全量重算
+    """
+    import time as _time
+    _start = _time.time()
+    if not (isinstance(nk_g, CSRGraph) and isinstance(base_g, CSRGraph)) or nk_g.name_buf is None or base_g.name_buf is None:
+        return None
+    N, N0 = nk_g.number_of_nodes(), base_g.number_of_nodes()
+    diff = diff_netlist_graphs(base_g, nk_g, base_output_ids, output_ids)
+    new_to_old, changed = diff['new_to_old'], diff['changed']
+    mapped = new_to_old >= 0
+    print(f"    [增量] 对齐旧版本: 新增 {int((~mapped).sum())} / 删除 {N0 - int(mapped.sum())} 节点, "
+          f"改动节点 {changed.size}, 输出变化 {diff['out_changed'].size}")
+    if changed.size > INCREMENTAL_MAX_CHANGED_FRAC * N:
+        print(f"    [增量] 改动节点超过 {INCREMENTAL_MAX_CHANGED_FRAC:.0%}，改为全量重算")
+        return None
+    
+    def carry(name, fill=0.0):
+        col = np.full(N, fill, dtype=np.float64)
+        col[mapped] = np.asarray(base_raw[name])[new_to_old[mapped]]
+        return col
+    
+    indptr, indices = nk_g.csr_arrays()
+    rev_indptr, rev_indices = nk_g.csr_arrays(reverse=True)
+    raw = {
+        'in_deg': nk_g.all_in_degrees(), 'out_deg': nk_g.all_out_degrees(),
+        'name_len': nk_g.name_lengths(), 'is_output': output_indicator(N, output_ids),
+    }
+    k_bet = min(BET_SAMPLES_MAX, max(BET_SAMPLES_MIN, N // BET_SAMPLES_DIV))
+    raw['betweenness'] = nk_g.betweenness_sampled(n_samples=k_bet, seed=BET_SEED)
+    
+    # Eigenvector / PageRank：旧向量热启动（新节点分别取 0 与均匀初值）
+    _t = _time.time()
+    raw['eigen'] = eigenvector_power(nk_g, x0=carry('eigen'))
+    raw['pagerank'] = pagerank_power(nk_g, x0=carry('pagerank', fill=1.0 / N))
+    print(f"    [增量] Eigenvector / PageRank 热启动完成，耗时: {_time.time() - _t:.2f}s")
+    
+    # reconv / near_ff / depth：受影响节点上重跑稀疏矩阵核
+    _t = _time.time()
+    kin = build_feature_kernel_inputs(nk_g)
+    reconv, near_ff, depth = carry('reconv'), carry('near_ff'), carry('depth')
+    local = np.zeros(N, dtype=bool)
+    local[changed] = True
+    local[csr_gather(indptr, indices, changed)[0]] = True
+    local[csr_gather(rev_indptr, rev_indices, changed)[0]] = True
+    if kin['cap'] != depth_cap_for(N0):
+        local[:] = True  # depth 上限随 N 变化，全部重算
+    elif changed.size:
+        old_depth = np.where(mapped, depth, np.inf)
+        reach = bfs_levels(rev_indptr, rev_indices, changed, N, max_level=int(depth[mapped].max(initial=0)) + 1)
+        local |= (reach >= 0) & (reach <= old_depth + 1)
+    rows = np.flatnonzero(local)
+    reconv[rows], near_ff[rows], depth[rows] = compute_node_features_sparse_v1(kin, 0, 0, nodes=rows)
+    raw.update(reconv=reconv, near_ff=near_ff, depth=depth)
+    print(f"    [增量] 节点特征重算 {rows.size}/{N} 个节点，耗时: {_time.time() - _t:.2f}s")
+    
+    # 输出距离：不可达取值 N 随图规模变化；只有能到达 C 或输出集变化处的祖先会变，
+    # 从这些祖先正向位并行 BFS 直接得到其结果，其余节点沿用旧值
+    _t = _time.time()
+    dist_min, dist_avg = carry('dist_min', fill=N), carry('dist_avg', fill=N)
+    unreachable = mapped & (dist_min == N0)
+    dist_min[unreachable] = dist_avg[unreachable] = N
+    anc_nodes = np.flatnonzero(bfs_levels(rev_indptr, rev_indices, np.union1d(changed, diff['out_changed']), N) >= 0)
+    full_dist = anc_nodes.size * DIST_FORWARD_COST_RATIO >= len(output_ids)
+    if full_dist:
+        # 祖先多时正向逐个出发不如从输出反向 BFS 一次算完（正向每个出发节点要走完其整个下游锥）
+        dist_min, dist_avg = compute_output_distances_v1(nk_g, output_ids)
+    elif anc_nodes.size:
+        dist_min[anc_nodes], dist_avg[anc_nodes] = compute_output_distances_for_nodes(nk_g, anc_nodes, output_ids)
+    raw.update(dist_min=dist_min, dist_avg=dist_avg)
+    print(f"    [增量] 输出距离重算 {anc_nodes.size}/{N} 个祖先" + (" (祖先过多，全图反向计算)" if full_dist else "")
+          + f"，耗时: {_time.time() - _t:.2f}s")
+    
+    print(f"    [增量] 完成，耗时: {_time.time() - _start:.2f}s")
+    return raw
+
+def build_pyg_data_nk(nk_g: NKGraph, feats: FeatureMatrix) -> Tuple[Data, np.ndarray, List[str]]:
     """
     从 NKGraph 构建 PyG 数据（内存优化版本）
     优化：
     1. 使用 int32 作为边索引（节点数 < 2^31 时完全等价，内存减半）
     2. 使用 numpy 数组直接构建，避免 Python 列表中间步骤
+    3. 类型 one-hot 与结构特征整块写入，不逐节点循环
     """
     N = nk_g.number_of_nodes()
-    node_ids = list(range(N))
-    name_list = [nk_g.node_names.get(n, str(n)) for n in node_ids]
+    node_ids = np.arange(N)
+    name_list = [nk_g.node_names.get(n, str(n)) for n in range(N)]
     
-    # 构建类型映射
-    type_set = set(nk_g.node_types.get(n, 'UNK') for n in node_ids)
-    type_list = sorted(list(type_set))
+    # 构建类型映射：每个节点的类型编号 → 排序后类型表中的下标
+    if isinstance(nk_g, CSRGraph):
+        if nk_g.type_ids is not None:
+            raw_table, raw_ids = nk_g.type_table, nk_g.type_ids
+        else:
+            raw_table, raw_ids = ['UNK'], np.zeros(N, dtype=np.int64)
+    else:
+        raw_ids, raw_table = CSRGraph.intern_types([nk_g.node_types.get(n, 'UNK') for n in range(N)])
+    used = np.unique(raw_ids)
+    type_list = sorted(raw_table[i] for i in used.tolist())
     type2idx = {t: i for i, t in enumerate(type_list)}
+    remap = np.zeros(len(raw_table), dtype=np.int64)
+    for i in used.tolist():
+        remap[i] = type2idx[raw_table[i]]
     n_types = len(type_list)
     
-    # 直接使用 numpy 构建特征矩阵，避免 Python 列表
-    n_struct_feats = 12  # in_deg, out_deg, pagerank, betweenness, eigen, dist_min_inv, dist_avg_inv, reconv, near_ff, name_len, depth, is_output
-    x_np = np.zeros((N, n_types + n_struct_feats), dtype=np.float32)
-    
-    for n in range(N):
-        # One-hot 类型编码
-        typ = nk_g.node_types.get(n, 'UNK')
-        x_np[n, type2idx[typ]] = 1.0
-        
-        # 结构特征
-        f = feats[n]
-        x_np[n, n_types:] = [
-            f['in_deg'], f['out_deg'], f['pagerank'], f['betweenness'], f['eigen'],
-            f['dist_min_inv'], f['dist_avg_inv'], f['reconv'], f['near_ff'],
-            f['name_len'], f['depth'], f['is_output']
-        ]
+    # 直接使用 numpy 构建特征矩阵：前 n_types 列为类型 one-hot，其后为结构特征矩阵
+    x_np = np.zeros((N, n_types + len(feats.columns)), dtype=np.float32)
+    x_np[node_ids, remap[raw_ids]] = 1.0
+    x_np[:, n_types:] = feats.values
     
     x = torch.from_numpy(x_np)  # 零拷贝转换
     
@@ -947,15 +1995,97 @@ def build_pyg_data_nk(nk_g: NKGraph, feats: Dict[int, Dict]) -> Tuple[Data, List
     data = Data(x=x, edge_index=edge_index.long())  # 转为 long 用于 PyG 兼容
     data.node_ids = node_ids
     data.node_names = name_list
+    data.type_list = type_list  # 前 n_types 列 one-hot 对应的类型名（批量训练时按类型名对齐列）
     
     return data, node_ids, name_list
 
+def batch_pyg_data(data_list: List[Data], type_list: Optional[List[str]] = None) -> Tuple[Data, torch.Tensor, List[int]]:
+    """
+    把多个网表的 PyG 数据拼成一个不相交并图
+    各网表的类型 one-hot 列按类型名对齐到并集类型表，结构特征列顺序不变；边索引按节点偏移平移
+    给定 type_list（预训练编码器的类型词表）时按词表对齐，词表外的类型经 resolve_cell_type 归并
+    返回: (并图数据, 每个节点的子图编号 batch, 各子图节点数)
+    """
+    if type_list is None:
+        type_list = sorted(set().union(*(d.type_list for d in data_list)))
+    type2idx = {t: i for i, t in enumerate(type_list)}
+    n_types = len(type_list)
+    sizes = [d.x.size(0) for d in data_list]
+    n_struct = data_list[0].x.size(1) - len(data_list[0].type_list)
+    
+    x = torch.zeros((sum(sizes), n_types + n_struct), dtype=torch.float32)
+    edges = []
+    offset = 0
+    for d, n in zip(data_list, sizes):
+        cols = torch.as_tensor([resolve_cell_type(t, type2idx) for t in d.type_list] + list(range(n_types, n_types + n_struct)))
+        x[offset:offset + n].index_add_(1, cols, d.x)  # 多个类型归并到同一列时累加（每个节点只有一个类型，结果仍为 one-hot）
+        edges.append(d.edge_index + offset)
+        offset += n
+    batch = torch.repeat_interleave(torch.arange(len(sizes)), torch.as_tensor(sizes))
+    data = Data(x=x, edge_index=torch.cat(edges, dim=1))
+    data.type_list = type_list
+    return data, batch, sizes
+
 
 # -----------------------
 # 自监督模型 (DGI) - 支持梯度检查点
 # -----------------------
 from torch.utils.checkpoint import checkpoint as torch_checkpoint
 
+# -----------------------
+# CPU 稀疏后端（无 GPU 的生产环境）
+# -----------------------
+CPU_BACKEND = 'sparse'   # 由命令行参数 --cpu_backend 控制：'sparse' = 预建 CSR 邻接（float32 下与 pyg 路径同种子排名一致），'pyg' = 原 COO 路径
+CPU_BF16 = 'off'         # 由命令行参数 --cpu_bf16 控制：默认关闭；auto = CPU 支持 AVX512-BF16/AMX 时启用（结果随硬件而变）
+CPU_FAST_DROPOUT = False # 由命令行参数 --cpu_fast_dropout 控制：CPU 上用 fast_dropout 代替 F.dropout（随机流不同，结果随之改变）
+
+def cpu_bf16_supported() -> bool:
+    """CPU 是否有原生 bfloat16 矩阵指令（无原生支持时 bf16 反而更慢）"""
+    for probe in ('_is_amx_tile_supported', '_is_avx512_bf16_supported'):
+        fn = getattr(torch.cpu, probe, None)
+        try:
+            if fn is not None and fn():
+                return True
+        except Exception:
+            pass
+    return False
+
+def use_cpu_bf16() -> bool:
+    return CPU_BF16 == 'on' or (CPU_BF16 == 'auto' and cpu_bf16_supported())
+
+def configure_torch_threads(n_threads: int):
+    """固定 PyTorch 算子内线程数（与特征提取的核心预算一致），算子间并行设为 1"""
+    torch.set_num_threads(max(1, n_threads))
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # 已有并行任务运行后不能再设置
+
+def build_sparse_adjacency(edge_index: torch.Tensor, n_nodes: int) -> torch.Tensor:
+    """
+    COO 边索引 → 转置邻接 CSR（行为目标节点、列为源节点、值为重边条数）
+    GINConv 以 spmm 聚合，与按边 scatter 求和等价；每张图只构建一次，干净/打乱两次前向共用
+    """
+    ei = edge_index.cpu().numpy()
+    indptr, indices = edges_to_csr(ei[1], ei[0], n_nodes)
+    counts = np.ones(indices.size, dtype=np.float32)
+    adj = sp.csr_matrix((counts, indices, indptr), shape=(n_nodes, n_nodes))
+    adj.sum_duplicates()
+    return torch.sparse_csr_tensor(torch.from_numpy(adj.indptr.astype(np.int64)), torch.from_numpy(adj.indices.astype(np.int64)),
+                                   torch.from_numpy(adj.data), size=(n_nodes, n_nodes))
+
+def fast_dropout(h: torch.Tensor, p: float, training: bool) -> torch.Tensor:
+    """
+    CPU 快速 dropout：每次取 64 位随机数拆成 4 个 16 位样本，随机数生成量为 F.dropout 的 1/4
+    （CPU 上 bernoulli_ 逐元素取随机数，训练中占比可达四分之一）；保留概率量化误差 < 2e-5
+    """
+    if not training or p <= 0:
+        return h
+    n = h.numel()
+    bits = torch.randint(-2 ** 63, 2 ** 63 - 1, ((n + 3) // 4,), dtype=torch.int64, device=h.device).view(torch.int16)[:n]
+    keep = (bits >= int(round(p * 65536)) - 32768).view(h.shape)
+    return h * keep.to(h.dtype) * (1.0 / (1.0 - p))
+
 class EncoderGIN(nn.Module):
     """
     GIN 编码器，支持梯度检查点 (Gradient Checkpointing) 以减少内存占用
@@ -969,6 +2099,8 @@ class EncoderGIN(nn.Module):
         self.dropout = dropout
         self.use_checkpoint = use_checkpoint
         self.hid = hid
+        self.fast_dropout = False   # --cpu_fast_dropout：用 fast_dropout 代替 F.dropout
+        self.cpu_autocast = False   # CPU 稀疏后端：卷积 MLP 在 bfloat16 自动混合精度下计算，输出转回 float32
         
         for i in range(layers):
             in_c = in_dim if i == 0 else hid
@@ -978,22 +2110,35 @@ class EncoderGIN(nn.Module):
     
     def _layer_forward(self, h, edge_index, layer_idx):
         """单层前向传播（用于梯度检查点）"""
-        h = self.convs[layer_idx](h, edge_index)
+        conv = self.convs[layer_idx]
+        if edge_index.layout == torch.sparse_csr:
+            # CSR 邻接：与 GINConv 求和聚合相同的 (1+eps)·h + A·h，spmm 在 float32 下做（CPU 稀疏乘不支持 bfloat16）
+            with torch.autocast('cpu', enabled=False):
+                h = h.float()
+                h = torch.sparse.mm(edge_index, h) + (1 + conv.eps) * h
+            h = conv.nn(h)
+        else:
+            h = conv(h, edge_index)
         h = self.bns[layer_idx](h)
         h = F.relu(h)
-        h = F.dropout(h, p=self.dropout, training=self.training)
+        if self.fast_dropout:
+            h = fast_dropout(h, self.dropout, self.training)
+        else:
+            h = F.dropout(h, p=self.dropout, training=self.training)
         return h
     
     def forward(self, x, edge_index):
+        """edge_index 可为 (2, E) COO 边索引，或 build_sparse_adjacency 得到的 CSR 邻接"""
         h = x
-        for i in range(self.num_layers):
-            if self.use_checkpoint and self.training:
-                # 使用梯度检查点：节省内存，但增加计算时间
-                # 注意：checkpoint 需要输入有 requires_grad=True
-                h = torch_checkpoint(self._layer_forward, h, edge_index, i, use_reentrant=False)
-            else:
-                h = self._layer_forward(h, edge_index, i)
-        return h
+        with torch.autocast('cpu', dtype=torch.bfloat16, enabled=self.cpu_autocast and x.device.type == 'cpu'):
+            for i in range(self.num_layers):
+                if self.use_checkpoint and self.training:
+                    # 使用梯度检查点：节省内存，但增加计算时间
+                    # 注意：checkpoint 需要输入有 requires_grad=True
+                    h = torch_checkpoint(self._layer_forward, h, edge_index, i, use_reentrant=False)
+                else:
+                    h = self._layer_forward(h, edge_index, i)
+        return h.float() if self.cpu_autocast else h
 
 class DGI(nn.Module):
     """Deep Graph Infomax 模型"""
@@ -1002,18 +2147,159 @@ class DGI(nn.Module):
         self.encoder = encoder
         self.W = nn.Linear(hid_dim, hid_dim, bias=False)
     
-    def forward(self, x, edge_index, x_corrupt):
+    def forward(self, x, edge_index, x_corrupt, batch=None, num_graphs=1):
+        """
+        batch 为空时整图一个读出摘要；
+        batch 给出每个节点所属子图编号（不相交并图）时，每个子图各自读出摘要，只与本图节点打分
+        """
         h = self.encoder(x, edge_index)
         h_corrupt = self.encoder(x_corrupt, edge_index)
-        s = torch.sigmoid(h.mean(dim=0, keepdim=True))
-        sW = self.W(s)
+        if batch is None:
+            s = torch.sigmoid(h.mean(dim=0, keepdim=True))
+            sW = self.W(s)
+        else:
+            s = torch.sigmoid(segment_mean(h, batch, num_graphs))
+            sW = self.W(s)[batch]
         return torch.sum(h * sW, dim=1), torch.sum(h_corrupt * sW, dim=1), h
     
     @staticmethod
-    def loss_fn(pos, neg):
-        return - (torch.log(torch.sigmoid(pos) + 1e-10).mean() + torch.log(1 - torch.sigmoid(neg) + 1e-10).mean())
+    def loss_fn(pos, neg, batch=None, num_graphs=1):
+        """batch 非空时先在每个子图内取均值再对子图平均，各网表权重相同（不因节点数多而主导梯度）"""
+        if batch is None:
+            return - (torch.log(torch.sigmoid(pos) + 1e-10).mean() + torch.log(1 - torch.sigmoid(neg) + 1e-10).mean())
+        per_node = torch.log(torch.sigmoid(pos) + 1e-10) + torch.log(1 - torch.sigmoid(neg) + 1e-10)
+        return - segment_mean(per_node.unsqueeze(1), batch, num_graphs).mean()
+
+def segment_mean(values: torch.Tensor, batch: torch.Tensor, num_graphs: int) -> torch.Tensor:
+    """按子图编号求各行均值: (N, F) → (num_graphs, F)"""
+    sums = torch.zeros((num_graphs, values.size(1)), dtype=values.dtype, device=values.device).index_add_(0, batch, values)
+    counts = torch.bincount(batch, minlength=num_graphs).clamp_(min=1).to(values.dtype)
+    return sums / counts.unsqueeze(1)
+
+def per_graph_permutation(sizes: List[int], device) -> torch.Tensor:
+    """
+    每个子图内部独立打乱的置换（子图按顺序连续排列）
+    逐图调用 torch.randperm，单图时与 train_dgi 的负样本完全一致
+    """
+    perms, offset = [], 0
+    for n in sizes:
+        perms.append(torch.randperm(n, device=device) + offset)
+        offset += n
+    return torch.cat(perms)
 
-def train_dgi(data: Data, hidden=128, layers=3, epochs=150, lr=1e-3, dropout=0.2, device='cpu', use_sampling=False):
+# -----------------------
+# 逐层全图推理（超大图：分块计算每层，邻居完整，内存有界）
+# -----------------------
+LAYERWISE_CHUNK_NODES = 16384        # 每块目标节点数
+LAYERWISE_RAM_BUDGET_MB = 1024       # 中间层输出超过该大小时改用磁盘内存映射缓冲
+
+def layerwise_inference(encoder: EncoderGIN, x: torch.Tensor, edge_index: torch.Tensor, device: str = 'cpu',
+                        chunk_nodes: int = LAYERWISE_CHUNK_NODES, use_amp: bool = False) -> torch.Tensor:
+    """
+    逐层计算 GIN 编码器的全图嵌入（eval 语义，与整图前向结果一致）：
+    - 第 l 层对全部节点按块计算，每块经入边 CSR 取出完整的入邻居，在上一层输出上求和聚合
+    - 只有一块的消息与激活驻留在 device 上，不会像整图前向那样一次性展开 E×hid 的消息张量
+    - 层间输出存放在 N×hid 缓冲里，超过 LAYERWISE_RAM_BUDGET_MB 时使用临时文件内存映射
+    """
+    from torch.amp import autocast
+    
+    encoder.eval()
+    N = x.size(0)
+    ei = edge_index.cpu().numpy()
+    indptr, indices = edges_to_csr(ei[1], ei[0], N)  # 按目标节点分组的入邻居
+    hid = encoder.hid
+    use_mmap = N * hid * 4 * 2 > LAYERWISE_RAM_BUDGET_MB * 1024 * 1024
+    tmp_dir = tempfile.mkdtemp(prefix='layerwise_') if use_mmap else None
+    
+    def _buffer(name):
+        if use_mmap:
+            return np.lib.format.open_memmap(os.path.join(tmp_dir, f'{name}.npy'), mode='w+', dtype=np.float32, shape=(N, hid))
+        return np.empty((N, hid), dtype=np.float32)
+    
+    try:
+        prev = x.numpy() if x.dtype == torch.float32 else x.float().numpy()
+        with torch.no_grad():
+            for layer in range(encoder.num_layers):
+                conv, bn = encoder.convs[layer], encoder.bns[layer]
+                out = _buffer(f'h{layer % 2}') if layer < encoder.num_layers - 1 else np.empty((N, hid), dtype=np.float32)
+                for start in range(0, N, chunk_nodes):
+                    end = min(start + chunk_nodes, N)
+                    nbrs, owner = csr_gather(indptr, indices, np.arange(start, end))
+                    h_self = torch.from_numpy(np.asarray(prev[start:end])).to(device)
+                    agg = (1 + conv.eps.item()) * h_self
+                    if nbrs.size:
+                        h_nbr = torch.from_numpy(np.asarray(prev[nbrs])).to(device)
+                        agg = agg.index_add_(0, torch.from_numpy(owner).to(device), h_nbr)
+                    if use_amp:
+                        with autocast('cuda'):
+                            h = F.relu(bn(conv.nn(agg)))
+                    else:
+                        h = F.relu(bn(conv.nn(agg)))
+                    out[start:end] = h.float().cpu().numpy()
+                prev = out
+        return torch.from_numpy(prev)
+    finally:
+        if tmp_dir:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+# -----------------------
+# 收敛感知的提前停止（平滑损失 + 排名稳定性）
+# -----------------------
+EARLY_STOP = False           # 由命令行参数 --early_stop 控制
+ES_MIN_EPOCHS = 20           # 至少训练的轮数
+ES_CHECK_EVERY = 10          # 每隔多少轮检查一次排名
+ES_LOSS_EMA = 0.1            # 损失指数滑动平均系数
+ES_LOSS_REL_TOL = 0.25       # 两次检查间平滑损失的相对下降不超过该值视为进入平台期（宽松的安全条件，见下）
+# DGI 损失在 150 轮内一直下降（每 10 轮平滑损失降 10%~50%），收紧到 1%~5% 时 12 个网表中 9 个跑满 150 轮，
+# 提前停止形同关闭；真正的停止判据是下面的排名稳定性，损失条件只排除损失仍在陡降（相对下降 > 25%）的阶段。
+# 实测停止轮的融合分数与 150 轮的 Spearman ≥ 0.98（ctrl/router/priority/adder/i2c/max/bar/arbiter 停于 50~120 轮），
+# 高于同一网表输入扰动 1e-7 重训的排名差异（0.80~0.99）
+ES_TOPK_FRAC = 0.10          # 排名稳定性比较的 top-k 比例（与覆盖率评估的前 10% 一致）
+ES_TOPK_OVERLAP = 0.95       # 相邻两次检查 top-k 集合重合度下限
+ES_KENDALL_TAU = 0.93        # 相邻两次检查融合分数的 Kendall tau 下限
+ES_PATIENCE = 2              # 连续多少次检查满足条件才停止
+
+class ConvergenceMonitor:
+    """
+    跟踪平滑损失，并每 ES_CHECK_EVERY 轮用当前嵌入计算一次融合分数：
+    相邻两次排名的 top-k 重合度与 Kendall tau 均达标（且平滑损失不再陡降），连续 ES_PATIENCE 次后停止训练
+    """
+    def __init__(self, score_fn, n_nodes: int):
+        self.score_fn = score_fn
+        self.k = max(1, int(n_nodes * ES_TOPK_FRAC))
+        self.ema = None
+        self.last_ema = None
+        self.last_scores = None
+        self.stable = 0
+        self.history = []  # [(epoch, ema_loss, topk_overlap, kendall_tau)]
+    
+    def update(self, ep: int, loss: float, embed_fn) -> bool:
+        """记录第 ep 轮（从 0 计）的损失；返回 True 表示应停止。embed_fn() 返回当前节点嵌入"""
+        from scipy.stats import kendalltau
+        self.ema = loss if self.ema is None else (1 - ES_LOSS_EMA) * self.ema + ES_LOSS_EMA * loss
+        done = ep + 1
+        if done < ES_MIN_EPOCHS or done % ES_CHECK_EVERY:
+            return False
+        
+        scores = self.score_fn(embed_fn())
+        overlap, tau = 0.0, 0.0
+        if self.last_scores is not None:
+            top_now = np.argpartition(-scores, self.k - 1)[:self.k]
+            top_last = np.argpartition(-self.last_scores, self.k - 1)[:self.k]
+            overlap = np.intersect1d(top_now, top_last).size / self.k
+            tau = kendalltau(scores, self.last_scores)[0]
+        plateau = self.last_ema is not None and abs(self.last_ema - self.ema) <= ES_LOSS_REL_TOL * abs(self.last_ema)
+        self.history.append((done, self.ema, overlap, tau))
+        self.last_scores, self.last_ema = scores, self.ema
+        
+        if plateau and overlap >= ES_TOPK_OVERLAP and tau >= ES_KENDALL_TAU:
+            self.stable += 1
+        else:
+            self.stable = 0
+        return self.stable >= ES_PATIENCE
+
+def train_dgi(data: Data, hidden=128, layers=3, epochs=150, lr=1e-3, dropout=0.2, device='cpu', use_sampling=False,
+              score_fn=None, train_info: Optional[Dict] = None):
     """
     训练 DGI 模型，支持 GraphSAINT 高效子图采样：
     
@@ -1024,10 +2310,16 @@ def train_dgi(data: Data, hidden=128, layers=3, epochs=150, lr=1e-3, dropout=0.2
     
     回退机制：GPU + AMP → CPU
     
+    提前停止（全图模式）：给定 score_fn(H) -> 融合分数数组 时由 ConvergenceMonitor 判断收敛提前结束；
+    train_info 字典（若给出）回填实际训练轮数 epochs 与停止原因 stop_reason
+    
     注意：每次调用都会重置随机种子，确保批量处理与单独处理结果一致
     """
     from torch.amp import autocast, GradScaler
     
+    info = train_info if train_info is not None else {}
+    info['epochs'], info['stop_reason'] = epochs, 'max_epochs'
+    
     # 关键修复：清空 CUDA 缓存，确保从干净状态开始
     reset_cuda_state()
     
@@ -1074,7 +2366,27 @@ def train_dgi(data: Data, hidden=128, layers=3, epochs=150, lr=1e-3, dropout=0.2
         x = data.x.to(target_device)
         ei = data.edge_index.to(target_device)
         scaler = GradScaler('cuda') if use_amp else None
+        if target_device == 'cpu' and CPU_BACKEND == 'sparse':
+            # CPU 稀疏后端：CSR 邻接只建一次，干净/打乱两次前向及每个 epoch 共用
+            ei = build_sparse_adjacency(data.edge_index, N)
+            enc.fast_dropout = CPU_FAST_DROPOUT
+            enc.cpu_autocast = use_cpu_bf16()
+            print(f"    [DGI] CPU 稀疏后端 (CSR 邻接, {torch.get_num_threads()} 线程" + (", bfloat16" if enc.cpu_autocast else "") + ")...")
+        
+        def _embed():
+            model.eval()
+            train_bf16, enc.cpu_autocast = enc.cpu_autocast, False  # 嵌入用 float32 计算
+            with torch.no_grad():
+                if use_amp:
+                    with autocast('cuda'):
+                        _, _, H = model(x, ei, x)
+                else:
+                    _, _, H = model(x, ei, x)
+            enc.cpu_autocast = train_bf16
+            return H.cpu()
         
+        monitor = ConvergenceMonitor(score_fn, N) if score_fn is not None else None
+        info['epochs'], info['stop_reason'] = epochs, 'max_epochs'
         for ep in range(epochs):
             model.train()
             opt.zero_grad()
@@ -1093,15 +2405,14 @@ def train_dgi(data: Data, hidden=128, layers=3, epochs=150, lr=1e-3, dropout=0.2
                 loss = DGI.loss_fn(pos, neg)
                 loss.backward()
                 opt.step()
+            
+            if monitor is not None and monitor.update(ep, loss.item(), lambda: _embed().float()):
+                info['epochs'], info['stop_reason'] = ep + 1, 'ranking_stable'
+                print(f"    [DGI] 第 {ep + 1}/{epochs} 轮排名已稳定，提前停止 "
+                      f"(平滑损失 {monitor.ema:.4f}, top-{monitor.k} 重合 {monitor.history[-1][2]:.3f}, tau {monitor.history[-1][3]:.3f})")
+                break
         
-        model.eval()
-        with torch.no_grad():
-            if use_amp:
-                with autocast('cuda'):
-                    _, _, H = model(x, ei, x)
-            else:
-                _, _, H = model(x, ei, x)
-        return H.cpu()
+        return _embed()
     
     def _train_graphsaint(target_device):
         """GraphSAINT 采样训练模式"""
@@ -1136,31 +2447,8 @@ def train_dgi(data: Data, hidden=128, layers=3, epochs=150, lr=1e-3, dropout=0.2
                 loss.backward()
                 opt.step()
         
-        # 分批推理获取全图嵌入
-        model.eval()
-        batch_size = min(100000, N)
-        H_list = []
-        x_full = data.x
-        ei_full = data.edge_index
-        
-        with torch.no_grad():
-            for start in range(0, N, batch_size):
-                end = min(start + batch_size, N)
-                x_batch = x_full[start:end].to(target_device)
-                
-                # 提取批次内的边
-                mask = (ei_full[0] >= start) & (ei_full[0] < end) & (ei_full[1] >= start) & (ei_full[1] < end)
-                sub_edges = ei_full[:, mask] - start
-                sub_edges = sub_edges.to(target_device)
-                
-                if use_amp:
-                    with autocast('cuda'):
-                        H_batch = model.encoder(x_batch, sub_edges)
-                else:
-                    H_batch = model.encoder(x_batch, sub_edges)
-                H_list.append(H_batch.cpu())
-        
-        return torch.cat(H_list, dim=0)
+        # 逐层全图推理：每层分块计算且保留完整入邻居（跨块的边不丢失）
+        return layerwise_inference(model.encoder, data.x, data.edge_index, target_device, use_amp=use_amp)
     
     def _train_mlp_fallback(target_device):
         """MLP 回退模式（无图卷积，最快）"""
@@ -1180,6 +2468,7 @@ def train_dgi(data: Data, hidden=128, layers=3, epochs=150, lr=1e-3, dropout=0.2
         scaler = GradScaler('cuda') if use_amp else None
         
         # 简单的对比学习
+        info['epochs'] = min(epochs, 50)
         for ep in range(min(epochs, 50)):  # MLP 收敛快，减少 epochs
             mlp.train()
             opt.zero_grad()
@@ -1242,64 +2531,481 @@ def train_dgi(data: Data, hidden=128, layers=3, epochs=150, lr=1e-3, dropout=0.2
     return train_fn('cpu')
 
 
-def fuse_scores_v1_nk(nk_g: NKGraph, feats: Dict[int, Dict], H: torch.Tensor, data: Data, output_ids: Set[int]) -> List[Tuple[str, float]]:
-    """原版评分公式（NKGraph 版本）"""
-    nid_list = data.node_ids
-    name_list = data.node_names
-    out_idx = [nid_list.index(n) for n in nid_list if n in output_ids] if output_ids else []
+def run_with_cpu_fallback(train_fn, device: str):
+    """在 device 上执行 train_fn(target_device)；GPU 内存溢出时清空缓存回退到 CPU 重跑"""
+    if device == 'cuda':
+        try:
+            reset_cuda_state()
+            result = train_fn('cuda')
+            reset_cuda_state()
+            return result
+        except (RuntimeError, MemoryError) as e:
+            if any(kw in str(e).lower() for kw in ['out of memory', 'cuda', 'memory', 'allocate']):
+                print(f"    [警告] GPU 内存溢出，回退到 CPU...")
+                reset_cuda_state()
+            else:
+                raise
     
-    Hn = F.normalize(H, p=2, dim=1)
-    if len(out_idx) > 0:
-        out_centroid = Hn[out_idx].mean(dim=0, keepdim=True)
-        out_centroid = F.normalize(out_centroid, p=2, dim=1)
-        cos = torch.mm(Hn, out_centroid.t()).squeeze(1).numpy()
-        embed_sim = np.array([z2u01(float(c)) for c in cos])
-    else:
-        embed_sim = np.zeros(Hn.size(0))
+    return train_fn('cpu')
 
-    pr = np.array([feats[nid]['pagerank'] for nid in nid_list])
-    bet = np.array([feats[nid]['betweenness'] for nid in nid_list])
-    ev = np.array([feats[nid]['eigen'] for nid in nid_list])
-    centrality = minmax_norm((pr + bet + ev) / 3.0)
 
-    prox = minmax_norm(0.5 * np.array([feats[n]['dist_min_inv'] for n in nid_list]) +
-                       0.5 * np.array([feats[n]['dist_avg_inv'] for n in nid_list]))
-    reconv = minmax_norm(np.array([feats[n]['reconv'] for n in nid_list]))
-    seq = np.array([feats[n]['near_ff'] for n in nid_list])
+# -----------------------
+# 多种子集成：K 个 DGI 副本堆叠权重，一次前向/反向同时训练
+# -----------------------
+ENSEMBLE_INPUT_NOISE = 0.05      # 输入特征（结构特征列）高斯噪声标准差，截断到 [0,1]
+ENSEMBLE_SCORE_NOISE = 0.15      # 融合前各分量（除 seq）叠加的均匀噪声幅度，截断到 [0,1]
+ENSEMBLE_WEIGHT_NOISE = 0.20     # 融合权重的均匀扰动幅度（截断到 [0.05, 0.5] 后重新归一化）
+ENSEMBLE_TOPK_FRAC = 0.10        # 统计 top-k 入选频率的 k 占候选节点比例（--top_k 给定时用 --top_k）
+ENSEMBLE_RAM_BUDGET_MB = 2048    # 一组同时训练的副本的激活内存预算，据此自动决定每组副本数
+ENSEMBLE_BYTES_PER_NODE_DIM = 96 # 每个副本每层每节点每隐层维保存的激活字节数（两次前向 + 反向，实测估计）
+
+class StackedLinear(nn.Module):
+    """K 个独立 nn.Linear 的堆叠权重：输入 [K, N, in] → 输出 [K, N, out]（torch.baddbmm 一次算完）"""
+    def __init__(self, n_replicas: int, in_features: int, out_features: int, bias: bool = True):
+        super().__init__()
+        layers = [nn.Linear(in_features, out_features, bias=bias) for _ in range(n_replicas)]  # 各副本按 nn.Linear 默认方式独立初始化
+        self.weight = nn.Parameter(torch.stack([l.weight.detach().t() for l in layers]))        # [K, in, out]
+        self.bias = nn.Parameter(torch.stack([l.bias.detach() for l in layers]).unsqueeze(1)) if bias else None  # [K, 1, out]
+    
+    def forward(self, h):
+        return torch.baddbmm(self.bias, h, self.weight) if self.bias is not None else torch.bmm(h, self.weight)
 
-    score = (0.25 * centrality + 0.25 * prox + 0.20 * reconv + 0.15 * seq + 0.15 * embed_sim)
+class StackedEncoderGIN(nn.Module):
+    """
+    K 个 EncoderGIN 副本（结构同 EncoderGIN，权重各自独立），节点表示布局 [N, K, d]：
+    - 聚合：K 个副本共用一个 CSR 邻接，[N, K*d] 一次 spmm（float32）
+    - GIN MLP：StackedLinear 批量矩阵乘
+    - BatchNorm：BatchNorm1d(K*hid) 的每个通道恰是某副本的某通道，统计量互不混合
+    """
+    def __init__(self, n_replicas: int, in_dim: int, hid=128, layers=3, dropout=0.2):
+        super().__init__()
+        self.n_replicas = n_replicas
+        self.num_layers = layers
+        self.hid = hid
+        self.dropout = dropout
+        self.lin1 = nn.ModuleList()
+        self.lin2 = nn.ModuleList()
+        self.bns = nn.ModuleList()
+        for i in range(layers):
+            in_c = in_dim if i == 0 else hid
+            self.lin1.append(StackedLinear(n_replicas, in_c, hid))
+            self.lin2.append(StackedLinear(n_replicas, hid, hid))
+            self.bns.append(nn.BatchNorm1d(n_replicas * hid))
+        self.cpu_autocast = False
+    
+    def forward(self, x, adj):
+        """x: [N, K, in_dim]，adj: build_sparse_adjacency 得到的 CSR 邻接；返回 [N, K, hid]"""
+        N, K = x.size(0), self.n_replicas
+        h = x
+        with torch.autocast('cpu', dtype=torch.bfloat16, enabled=self.cpu_autocast and x.device.type == 'cpu'):
+            for i in range(self.num_layers):
+                with torch.autocast(h.device.type, enabled=False):
+                    flat = h.float().reshape(N, -1)
+                    flat = flat + torch.sparse.mm(adj, flat)  # GINConv 求和聚合（eps=0）
+                h = flat.view(N, K, -1).transpose(0, 1)      # [K, N, d]
+                h = F.relu(self.lin2[i](F.relu(self.lin1[i](h))))
+                h = self.bns[i](h.transpose(0, 1).reshape(N, K * self.hid))
+                h = F.relu(h)
+                if CPU_FAST_DROPOUT and h.device.type == 'cpu':
+                    h = fast_dropout(h, self.dropout, self.training)
+                else:
+                    h = F.dropout(h, p=self.dropout, training=self.training)
+                h = h.view(N, K, self.hid)
+        return h.float()
 
-    score_list = score.tolist()
+class StackedDGI(nn.Module):
+    """K 个 DGI 副本：各副本各自读出摘要、各自判别，损失为各副本 DGI 损失之和（梯度与单独训练相同）"""
+    def __init__(self, encoder: StackedEncoderGIN, hid_dim: int):
+        super().__init__()
+        self.encoder = encoder
+        self.W = StackedLinear(encoder.n_replicas, hid_dim, hid_dim, bias=False)
     
-    # 正则：匹配末尾的 _数字（数组转换格式）
-    array_suffix_re = re.compile(r'_\d+$')
+    def forward(self, x, adj, x_corrupt):
+        h = self.encoder(x, adj)
+        h_corrupt = self.encoder(x_corrupt, adj)
+        s = torch.sigmoid(h.mean(dim=0))                   # [K, hid]
+        sW = self.W(s.unsqueeze(1)).squeeze(1)             # [K, hid]
+        return torch.sum(h * sW, dim=2), torch.sum(h_corrupt * sW, dim=2), h   # [N, K], [N, K], [N, K, hid]
     
-    filtered_ranked = []
-    seen_names = set()  # 去重
-    for i, nid in enumerate(nid_list):
-        ntype = nk_g.node_types.get(nid, '').lower()
-        name = name_list[i]
-        name_lower = name.lower()
-        # 过滤非 wire/reg 类型
-        if ntype not in ('wire', 'reg'):
-            continue
-        # 过滤时钟/复位/输入信号
-        if re.match(r'^(clk|clock|rst|reset|in|input)', name_lower):
-            continue
-        # 过滤数组下标节点 [idx] 格式
-        if '[' in name or ']' in name:
-            continue
-        # 过滤数组转换格式（如 o_sum_21 来自 o_sum[21]）
-        if array_suffix_re.search(name):
-            continue
-        # 去重
-        if name in seen_names:
-            continue
-        seen_names.add(name)
-        filtered_ranked.append((name, score_list[i]))
+    @staticmethod
+    def loss_fn(pos, neg):
+        per_replica = torch.log(torch.sigmoid(pos) + 1e-10).mean(dim=0) + torch.log(1 - torch.sigmoid(neg) + 1e-10).mean(dim=0)
+        return -per_replica.sum()
+
+def ensemble_group_size(N: int, n_feat: int, hidden: int, layers: int, budget_mb: int = None) -> int:
+    """按激活内存预算估计一组能同时训练的副本数（至少 1）"""
+    budget = (budget_mb if budget_mb is not None else ENSEMBLE_RAM_BUDGET_MB) * 1024 * 1024
+    per_replica = N * (ENSEMBLE_BYTES_PER_NODE_DIM * hidden * layers + 12 * n_feat)
+    return max(1, int(budget // max(per_replica, 1)))
+
+def perturb_inputs(x: torch.Tensor, n_replicas: int, n_onehot: int, noise: float) -> torch.Tensor:
+    """[N, F] → [N, K, F]：每个副本的结构特征列各自叠加高斯噪声并截断到 [0,1]，类型 one-hot 列不变"""
+    xs = x.unsqueeze(1).repeat(1, n_replicas, 1)
+    if noise > 0:
+        cols = xs[:, :, n_onehot:]
+        cols.add_(torch.randn_like(cols) * noise).clamp_(0, 1)
+    return xs
+
+def train_dgi_ensemble(data: Data, n_replicas: int, hidden=128, layers=3, epochs=150, lr=1e-3, dropout=0.2,
+                       device='cpu', input_noise: float = ENSEMBLE_INPUT_NOISE) -> torch.Tensor:
+    """
+    一组 K 个 DGI 副本同时训练（权重初始化、输入噪声、打乱负样本、dropout 各副本独立），
+    每个 epoch 一次前向/反向；Adam 按元素更新，堆叠参数与 K 个优化器分别更新等价
+    返回: [K, N, hidden] 各副本在自身加噪输入上的节点嵌入（float32，CPU）
+    回退机制：GPU 内存溢出 → CPU
+    """
+    N, K = data.x.size(0), n_replicas
+    n_onehot = len(getattr(data, 'type_list', []))
+    
+    def _train(target_device):
+        enc = StackedEncoderGIN(K, data.x.size(1), hid=hidden, layers=layers, dropout=dropout).to(target_device)
+        model = StackedDGI(enc, hidden).to(target_device)
+        opt = torch.optim.Adam(model.parameters(), lr=lr, fused=True)  # 堆叠参数量为单模型 K 倍，融合内核一次遍历完成更新
+        adj = build_sparse_adjacency(data.edge_index, N).to(target_device)
+        x = perturb_inputs(data.x.to(target_device), K, n_onehot, input_noise)
+        enc.cpu_autocast = target_device == 'cpu' and use_cpu_bf16()
+        cols = torch.arange(K, device=target_device)
+        
+        for ep in range(epochs):
+            model.train()
+            opt.zero_grad()
+            perm = torch.argsort(torch.rand(K, N, device=target_device), dim=1)  # 每个副本各自的随机排列
+            x_corrupt = x[perm.t(), cols]
+            pos, neg, _ = model(x, adj, x_corrupt)
+            loss = StackedDGI.loss_fn(pos, neg)
+            loss.backward()
+            opt.step()
+        
+        model.eval()
+        enc.cpu_autocast = False  # 嵌入用 float32 计算
+        with torch.no_grad():
+            H = enc(x, adj)
+        return H.transpose(0, 1).contiguous().cpu()
+    
+    return run_with_cpu_fallback(_train, device)
 
-    filtered_ranked.sort(key=lambda x: -x[1])
-    return filtered_ranked
+
+# -----------------------
+# 预训练编码器（跨网表共享，新网表只做一次前向推理）
+# -----------------------
+ENCODER_CKPT_VERSION = 2                         # 检查点格式版本：模型结构、输入布局或单元族规则变化时递增
+ENCODER_CKPT_PATH = "./pretrained/dgi_encoder_v1.pt"
+UNK_CELL_TYPE = '<UNK>'                          # 词表外单元类型归入的列
+UNK_TYPE_DROPOUT = 0.05                          # 预训练时每轮随机把该比例节点的类型改记为 <UNK>，让该列学到"类型未知"的平均表示
+# 驱动强度后缀 X<n>（cells.v 中 NAND2X0 / INVX32 / NBUFFX2 ...）；MUX2 / MUX4 中的 X 属于单元名本身，不剥离
+_DRIVE_SUFFIX_RE = re.compile(r'(?<!MU)_?X\d+$', re.IGNORECASE)
+
+def cell_family(cell_type: str) -> str:
+    """去掉驱动强度后缀的单元族名，如 NAND2X1 → NAND2、INVX32 → INV（MUX2 保持不变）"""
+    return _DRIVE_SUFFIX_RE.sub('', cell_type) or cell_type
+
+def resolve_cell_type(cell_type: str, type2idx: Dict[str, int]) -> int:
+    """类型名 → 词表列号：先精确匹配，再按单元族匹配，仍未命中归入 <UNK>"""
+    idx = type2idx.get(cell_type)
+    if idx is None:
+        idx = type2idx.get(cell_family(cell_type))
+    if idx is None:
+        idx = type2idx[UNK_CELL_TYPE]
+    return idx
+
+def pretrain_encoder(data_list: List[Data], hidden=128, layers=3, epochs=150, lr=1e-3, dropout=0.2,
+                     device='cpu', max_nodes: Optional[int] = None) -> Tuple[nn.Module, List[str]]:
+    """
+    在一组网表上预训练一个共享的 DGI 编码器
+    - 类型词表 = 语料中出现的单元族 + <UNK>
+    - 网表按节点数装箱成若干不相交并图，每轮依次在各并图上各做一步（读出摘要与负样本均按网表独立）
+    返回: (训练好的 DGI 模型(CPU), 类型词表)
+    """
+    reset_cuda_state()
+    set_seed(42)
+    
+    vocab = sorted({cell_family(t) for d in data_list for t in d.type_list}) + [UNK_CELL_TYPE]
+    batches, single = plan_train_batches([(i, d.x.size(0)) for i, d in enumerate(data_list)], max_nodes or BATCH_TRAIN_MAX_NODES)
+    groups = [batch_pyg_data([data_list[i] for i in g], vocab) for g in batches + [[i] for i in single]]
+    unk_col = len(vocab) - 1
+    in_dim = groups[0][0].x.size(1)
+    
+    def _train(target_device):
+        print(f"    [预训练] {len(data_list)} 个网表 → {len(groups)} 个并图, 词表 {len(vocab)} 类, 设备 {target_device}...")
+        enc = EncoderGIN(in_dim=in_dim, hid=hidden, layers=layers, dropout=dropout).to(target_device)
+        model = DGI(enc, hid_dim=hidden).to(target_device)
+        opt = torch.optim.Adam(model.parameters(), lr=lr)
+        
+        for ep in range(epochs):
+            model.train()
+            for gi in torch.randperm(len(groups)).tolist():
+                data, batch, sizes = groups[gi]
+                x = data.x.to(target_device)
+                ei = data.edge_index.to(target_device)
+                bt = batch.to(target_device)
+                
+                # 类型随机遮蔽为 <UNK>
+                mask = torch.rand(x.size(0), device=target_device) < UNK_TYPE_DROPOUT
+                x = x.clone()
+                x[mask, :len(vocab)] = 0.0
+                x[mask, unk_col] = 1.0
+                
+                opt.zero_grad()
+                x_corrupt = x[per_graph_permutation(sizes, target_device)]
+                pos, neg, _ = model(x, ei, x_corrupt, bt, len(sizes))
+                loss = DGI.loss_fn(pos, neg, bt, len(sizes))
+                loss.backward()
+                opt.step()
+            if (ep + 1) % max(1, epochs // 10) == 0:
+                print(f"    [预训练] epoch {ep + 1}/{epochs} loss={loss.item():.4f}")
+        return model.cpu()
+    
+    return run_with_cpu_fallback(_train, device), vocab
+
+def save_pretrained_encoder(path: str, model: nn.Module, vocab: List[str], hidden: int, layers: int,
+                            dropout: float, epochs: int, trained_on: List[str]):
+    """保存带版本号与类型词表的编码器检查点（先写临时文件再原子替换）"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    ckpt = {
+        'version': ENCODER_CKPT_VERSION,
+        'feature_cache_version': FEATURE_CACHE_VERSION,
+        'struct_columns': list(FEATURE_COLUMNS),
+        'type_vocab': vocab,
+        'cell_family_rule': _DRIVE_SUFFIX_RE.pattern,
+        'hidden': hidden, 'layers': layers, 'dropout': dropout, 'epochs': epochs,
+        'trained_on': trained_on,
+        'state_dict': model.state_dict(),
+    }
+    tmp_path = f"{path}.tmp"
+    torch.save(ckpt, tmp_path)
+    os.replace(tmp_path, path)
+
+def load_pretrained_encoder(path: str, device: str = 'cpu') -> Tuple[nn.Module, List[str]]:
+    """
+    加载编码器检查点；格式版本或结构特征列与当前代码不一致时报错（需重新预训练）
+    返回: (eval 模式的 DGI 模型, 类型词表)
+    """
+    ckpt = torch.load(path, map_location='cpu', weights_only=False)
+    if ckpt.get('version') != ENCODER_CKPT_VERSION:
+        raise ValueError(f"编码器检查点版本 {ckpt.get('version')} 与当前版本 {ENCODER_CKPT_VERSION} 不一致，请重新预训练")
+    if ckpt.get('struct_columns') != list(FEATURE_COLUMNS):
+        raise ValueError(f"编码器检查点的结构特征列与当前代码不一致，请重新预训练")
+    if ckpt.get('cell_family_rule') != _DRIVE_SUFFIX_RE.pattern:
+        raise ValueError("编码器检查点的单元族规则与当前代码不一致（类型词表列含义不同），请重新预训练")
+    vocab = ckpt['type_vocab']
+    enc = EncoderGIN(in_dim=len(vocab) + len(FEATURE_COLUMNS), hid=ckpt['hidden'], layers=ckpt['layers'], dropout=ckpt['dropout'])
+    model = DGI(enc, hid_dim=ckpt['hidden'])
+    model.load_state_dict(ckpt['state_dict'])
+    model.eval()
+    return model.to(device), vocab
+
+def encode_with_pretrained(model: nn.Module, vocab: List[str], data: Data, device: str = 'cpu') -> torch.Tensor:
+    """预训练编码器单次前向得到节点嵌入；词表外类型的节点数会打印出来"""
+    unseen = [t for t in data.type_list if t not in vocab and cell_family(t) not in vocab]
+    if unseen:
+        print(f"    [预训练] 词表外单元类型 {len(unseen)} 种归入 {UNK_CELL_TYPE}: {', '.join(unseen[:8])}{' ...' if len(unseen) > 8 else ''}")
+    x = batch_pyg_data([data], vocab)[0].x
+    
+    def _infer(target_device):
+        model.to(target_device)
+        with torch.no_grad():
+            return model.encoder(x.to(target_device), data.edge_index.to(target_device)).cpu()
+    
+    return run_with_cpu_fallback(_infer, device)
+
+
+FUSION_WEIGHTS = (0.25, 0.25, 0.20, 0.15, 0.15)  # centrality, proximity, reconv, seq, embed_sim
+
+def struct_score_components(feats: FeatureMatrix, nid_list: np.ndarray) -> np.ndarray:
+    """融合公式中与嵌入无关的四个分量 [N, 4]：centrality, proximity, reconv, seq（按 nid_list 行顺序）"""
+    col = lambda name: feats[name][nid_list].astype(np.float64)
+    pr = col('pagerank')
+    bet = col('betweenness')
+    ev = col('eigen')
+    centrality = minmax_norm((pr + bet + ev) / 3.0)
+
+    prox = minmax_norm(0.5 * col('dist_min_inv') + 0.5 * col('dist_avg_inv'))
+    reconv = minmax_norm(col('reconv'))
+    seq = col('near_ff')
+    return np.column_stack([centrality, prox, reconv, seq])
+
+def output_rows(nid_list: np.ndarray, output_ids: Set[int]) -> np.ndarray:
+    """data 的第 i 行即节点 nid_list[i]；按行号升序取输出节点所在行"""
+    if not output_ids:
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(np.isin(nid_list, np.fromiter(output_ids, dtype=np.int64, count=len(output_ids))))
+
+def fused_score_array(feats: FeatureMatrix, H: torch.Tensor, data: Data, output_ids: Set[int]) -> np.ndarray:
+    """原版评分公式：按 data 行顺序返回每个节点的融合分数（未过滤、未排序）"""
+    nid_list = np.asarray(data.node_ids)
+    embed_sim = embed_similarity(H, output_rows(nid_list, output_ids))
+    centrality, prox, reconv, seq = struct_score_components(feats, nid_list).T
+    w_c, w_p, w_r, w_s, w_e = FUSION_WEIGHTS
+    return w_c * centrality + w_p * prox + w_r * reconv + w_s * seq + w_e * embed_sim
+
+def embed_similarity(H: torch.Tensor, out_idx: np.ndarray) -> np.ndarray:
+    """嵌入分量：每个节点与输出节点嵌入质心的余弦相似度（映射到 [0,1]）；无输出节点时全 0"""
+    Hn = F.normalize(H, p=2, dim=1)
+    if len(out_idx) == 0:
+        return np.zeros(Hn.size(0))
+    out_centroid = Hn[torch.as_tensor(out_idx)].mean(dim=0, keepdim=True)
+    out_centroid = F.normalize(out_centroid, p=2, dim=1)
+    cos = torch.mm(Hn, out_centroid.t()).squeeze(1).numpy()
+    return z2u01(cos.astype(np.float64))
+
+RANK_TOP_K = 0  # 由命令行参数 --top_k 控制：>0 时排名文件只写前 K 个节点
+RANK_SIGNAL_TYPES = ('wire', 'reg')
+_RANK_REJECT_RE = re.compile(rb'^(?:clk|clock|rst|reset|in|input)|[\[\]]|_\d+$', re.IGNORECASE | re.MULTILINE)
+
+def compute_rank_candidate_mask(nk_g: NKGraph) -> np.ndarray:
+    """
+    排名候选节点掩码（只依赖图本身，随特征一起缓存）：
+    - 类型为 wire/reg（按类型表判断，不逐节点比较字符串）
+    - 过滤时钟/复位/输入信号名、数组下标名 [idx]、数组转换名（末尾 _数字，如 o_sum_21 来自 o_sum[21]）
+      —— 全部节点名以换行拼接后用一个多行正则整体扫描，命中位置映射回节点
+    - 同名节点只保留编号最小的一个
+    """
+    N = nk_g.number_of_nodes()
+    if isinstance(nk_g, CSRGraph) and nk_g.type_ids is not None:
+        type_ok = np.array([t.lower() in RANK_SIGNAL_TYPES for t in nk_g.type_table], dtype=bool)
+        mask = type_ok[nk_g.type_ids.astype(np.int64)]
+    else:
+        mask = np.array([nk_g.node_types.get(n, '').lower() in RANK_SIGNAL_TYPES for n in range(N)], dtype=bool)
+    
+    if isinstance(nk_g, CSRGraph) and nk_g.name_buf is not None:
+        names = nk_g.name_bytes()
+    else:
+        names = [nk_g.node_names.get(n, str(n)).encode('utf-8') for n in range(N)]
+    lengths = np.fromiter((len(b) for b in names), dtype=np.int64, count=N)
+    line_start = np.zeros(N, dtype=np.int64)
+    np.cumsum(lengths[:-1] + 1, out=line_start[1:])
+    hits = np.fromiter((m.start() for m in _RANK_REJECT_RE.finditer(b'\n'.join(names))), dtype=np.int64)
+    mask[np.searchsorted(line_start, hits, side='right') - 1] = False
+    
+    cand = np.flatnonzero(mask)
+    _, first = np.unique(np.array(names, dtype=object)[cand], return_index=True)
+    dedup = np.zeros(N, dtype=bool)
+    dedup[cand[first]] = True
+    return dedup
+
+def rank_candidate_mask(nk_g: NKGraph) -> np.ndarray:
+    """取图的排名候选掩码：优先用缓存加载时附带的，否则计算并记在图对象上"""
+    mask = getattr(nk_g, 'rank_mask', None)
+    if mask is None:
+        mask = compute_rank_candidate_mask(nk_g)
+        nk_g.rank_mask = mask
+    return np.asarray(mask, dtype=bool)
+
+def top_k_order(scores: np.ndarray, k: Optional[int] = None) -> np.ndarray:
+    """
+    按分数降序的下标（同分保持原顺序，与稳定全排序一致）
+    给定 k 时只部分选择出前 k 个再排序：先用 argpartition 求第 k 大分数，取不低于它的候选后稳定排序截断
+    """
+    if k is None or k >= scores.size:
+        return np.argsort(-scores, kind='stable')
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    kth = np.partition(-scores, k - 1)[k - 1]
+    cand = np.flatnonzero(-scores <= kth)
+    return cand[np.argsort(-scores[cand], kind='stable')[:k]]
+
+def fuse_scores_v1_nk(nk_g: NKGraph, feats: FeatureMatrix, H: torch.Tensor, data: Data, output_ids: Set[int],
+                      top_k: Optional[int] = None) -> List[Tuple[str, float]]:
+    """
+    原版评分公式（NKGraph 版本）：融合打分后过滤非信号节点，按分数降序返回 (name, score)
+    过滤与去重用缓存的候选掩码一次取出；top_k 给定时只返回前 top_k 个（部分选择，不做全排序）
+    """
+    nid_list = np.asarray(data.node_ids)
+    score = fused_score_array(feats, H, data, output_ids)
+    rows = np.flatnonzero(rank_candidate_mask(nk_g)[nid_list])
+    order = rows[top_k_order(score[rows], top_k)]
+    name_list = data.node_names
+    return [(name_list[i], s) for i, s in zip(order.tolist(), score[order].tolist())]
+
+def ensemble_embed_similarity(H: torch.Tensor, out_idx: np.ndarray) -> np.ndarray:
+    """[K, N, d] 各副本嵌入 → [K, N] 与本副本输出节点质心的余弦相似度（映射到 [0,1]，与 fused_score_array 相同）"""
+    if len(out_idx) == 0:
+        return np.zeros(H.shape[:2])
+    Hn = F.normalize(H, p=2, dim=2)
+    centroid = F.normalize(Hn[:, torch.as_tensor(out_idx)].mean(dim=1), p=2, dim=1)
+    cos = torch.bmm(Hn, centroid.unsqueeze(2)).squeeze(2).numpy()
+    return z2u01(cos.astype(np.float64))
+
+def perturbed_fused_scores(comps: np.ndarray, embed_sim: np.ndarray, rng: np.random.RandomState,
+                           noise_level: float = ENSEMBLE_SCORE_NOISE, weight_noise: float = ENSEMBLE_WEIGHT_NOISE) -> np.ndarray:
+    """
+    一组副本的融合分数 [K, M]：comps 为共享的 [M, 4] 结构分量，embed_sim 为各副本 [K, M]
+    - centrality / proximity / reconv / embed_sim 各叠加 U(-noise_level, noise_level) 后截断到 [0,1]（seq 为 0/1 不加噪）
+    - 权重 FUSION_WEIGHTS 各加 U(-weight_noise, weight_noise)，截断到 [0.05, 0.5] 后归一化
+    """
+    K, M = embed_sim.shape
+    parts = np.concatenate([np.broadcast_to(comps.T, (K, 4, M)), embed_sim[:, None, :]], axis=1)
+    if noise_level > 0:
+        noisy = [0, 1, 2, 4]
+        parts[:, noisy] = np.clip(parts[:, noisy] + rng.uniform(-noise_level, noise_level, size=(K, len(noisy), M)), 0, 1)
+    weights = np.broadcast_to(np.asarray(FUSION_WEIGHTS), (K, 5))
+    if weight_noise > 0:
+        weights = np.clip(weights + rng.uniform(-weight_noise, weight_noise, size=(K, 5)), 0.05, 0.5)
+        weights = weights / weights.sum(axis=1, keepdims=True)
+    return np.einsum('kc,kcm->km', weights, parts)
+
+class EnsembleRankStats:
+    """
+    逐组累计各副本排名（1 = 最敏感）的统计量，内存只与候选节点数有关：
+    - mean_rank / rank_var：平均排名与排名方差（总体方差）
+    - borda：Borda 分数，每个副本给第 r 名记 (M - r) / (M - 1) 分后取平均，∈ [0,1]
+    - topk_freq：进入前 k 名的副本比例
+    """
+    def __init__(self, n_items: int, k: int):
+        self.M, self.k = n_items, k
+        self.n = 0
+        self.rank_sum = np.zeros(n_items)
+        self.rank_sq = np.zeros(n_items)
+        self.topk_count = np.zeros(n_items, dtype=np.int64)
+    
+    def update(self, scores: np.ndarray):
+        """scores: [K, M]，每行一个副本；同分按下标先后（与 top_k_order 的稳定排序一致）"""
+        order = np.argsort(-scores, axis=1, kind='stable')
+        ranks = np.empty_like(order)
+        np.put_along_axis(ranks, order, np.arange(1, self.M + 1)[None, :], axis=1)
+        self.n += scores.shape[0]
+        self.rank_sum += ranks.sum(axis=0)
+        self.rank_sq += (ranks.astype(np.float64) ** 2).sum(axis=0)
+        self.topk_count += (ranks <= self.k).sum(axis=0)
+    
+    def summary(self) -> Dict[str, np.ndarray]:
+        mean_rank = self.rank_sum / self.n
+        return {
+            'mean_rank': mean_rank,
+            'rank_var': np.maximum(self.rank_sq / self.n - mean_rank ** 2, 0.0),
+            'borda': (self.M - mean_rank) / max(self.M - 1, 1),
+            'topk_freq': self.topk_count / self.n,
+        }
+
+def ensemble_rank_statistics(nk_g: NKGraph, feats: FeatureMatrix, data: Data, output_ids: Set[int], n_replicas: int,
+                             hidden=128, layers=3, epochs=150, dropout=0.2, seed=42, device='cpu',
+                             group_size: int = 0, input_noise: float = ENSEMBLE_INPUT_NOISE,
+                             noise_level: float = ENSEMBLE_SCORE_NOISE, weight_noise: float = ENSEMBLE_WEIGHT_NOISE
+                             ) -> Tuple[np.ndarray, Dict[str, np.ndarray], int]:
+    """
+    K 个副本按组（group_size=0 时按内存预算自动定）堆叠训练，每组训练完立即融合打分、累计排名统计后释放嵌入
+    返回: (候选节点行号, 各统计量数组, 每组副本数)
+    """
+    nid_list = np.asarray(data.node_ids)
+    rows = np.flatnonzero(rank_candidate_mask(nk_g)[nid_list])
+    comps = struct_score_components(feats, nid_list)[rows]
+    out_idx = output_rows(nid_list, output_ids)
+    k = min(RANK_TOP_K, rows.size) if RANK_TOP_K else max(1, int(round(rows.size * ENSEMBLE_TOPK_FRAC)))
+    stats = EnsembleRankStats(rows.size, k)
+    group = group_size or ensemble_group_size(data.x.size(0), data.x.size(1), hidden, layers)
+    group = max(1, min(group, n_replicas))
+    
+    set_seed(seed)
+    rng = np.random.RandomState(seed)
+    for start in range(0, n_replicas, group):
+        K = min(group, n_replicas - start)
+        H = train_dgi_ensemble(data, K, hidden=hidden, layers=layers, epochs=epochs, dropout=dropout,
+                               device=device, input_noise=input_noise)
+        embed_sim = ensemble_embed_similarity(H, out_idx)[:, rows]
+        del H
+        stats.update(perturbed_fused_scores(comps, embed_sim, rng, noise_level, weight_noise))
+        print(f"    [集成] 副本 {start + K}/{n_replicas} 完成")
+    return rows, stats.summary(), group
 
 
 # -----------------------
@@ -1324,7 +3030,8 @@ def extract_features_only(verilog_path: str, seed=42, run_mode='v1', use_cache=T
     base = os.path.splitext(filename)[0]
     
     verilog_path = os.path.abspath(verilog_path)
-    cache_dir_abs = os.path.abspath(CACHE_DIR)
+    cache_path_v1 = get_cache_path(verilog_path, 'v1')  # 须在 chdir 前解析（CACHE_DIR 可为相对路径）
+    base_path_v1 = find_previous_cache_entry(verilog_path, 'v1') if INCREMENTAL and use_cache else None
     
     temp_dir = tempfile.mkdtemp(prefix=f"gnn_feat_{base}_")
     original_cwd = os.getcwd()
@@ -1333,9 +3040,6 @@ def extract_features_only(verilog_path: str, seed=42, run_mode='v1', use_cache=T
         os.chdir(temp_dir)
         set_seed(seed)
         
-        # 获取缓存路径
-        cache_path_v1 = os.path.join(cache_dir_abs, f"{base}_v1_{get_file_hash(verilog_path)}.pkl")
-        
         # 固定为 V1 模式
         actual_run_mode = 'v1'
         
@@ -1356,12 +3060,23 @@ def extract_features_only(verilog_path: str, seed=42, run_mode='v1', use_cache=T
         print(f"    [V1] 开始解析 Verilog (NetworkKit)...")
         nk_g_v1, node_map_v1, output_ids_v1, seq_inst_ids_v1 = parse_verilog_graph_to_nk(verilog_path)
         N = nk_g_v1.number_of_nodes()
+        print(f"    [V1] 图结构: N={N}, E={nk_g_v1.number_of_edges()}, 内存(实测): {nk_g_v1.memory_bytes() / (1024 * 1024):.2f}MB")
         if N < 2:
             return (filename, N, actual_run_mode, False, "节点数过少，跳过", None)
-        feats_v1 = compute_struct_features_v1_nk(nk_g_v1, output_ids_v1, seq_inst_ids_v1)
+        raw_v1 = None
+        if base_path_v1:
+            base_v1 = load_cached_features_nk(base_path_v1)
+            base_raw_v1 = load_cached_raw_features(base_path_v1)
+            if base_v1 and base_raw_v1 is not None:
+                print(f"    [增量] 基准缓存: {os.path.basename(base_path_v1)}")
+                raw_v1 = update_raw_struct_features_v1_nk(nk_g_v1, output_ids_v1, base_v1[1], base_raw_v1, base_v1[2])
+        if raw_v1 is None:
+            raw_v1 = compute_raw_struct_features_v1_nk(nk_g_v1, output_ids_v1, seq_inst_ids_v1)
+        feats_v1 = normalize_struct_features_v1(raw_v1)
         measure_v1 = time.time() - v1_feat_start
         time_v1_feat = measure_v1
-        save_cached_features(cache_path_v1, feats_v1, nk_g_v1, output_ids_v1, seq_inst_ids_v1, compute_time=measure_v1)
+        save_cached_features(cache_path_v1, feats_v1, nk_g_v1, output_ids_v1, seq_inst_ids_v1, compute_time=measure_v1,
+                             raw=raw_feature_matrix(raw_v1), source_path=verilog_path, version='v1')
         
         elapsed = time.time() - start_time
         return (filename, N, actual_run_mode, True, f"[特征提取] V1({measure_v1:.2f}s) 完成 (总耗时: {elapsed:.2f}s)", time_v1_feat)
@@ -1376,15 +3091,265 @@ def extract_features_only(verilog_path: str, seed=42, run_mode='v1', use_cache=T
         except:
             pass
 
+# -----------------------
+# 阶段1调度器（按网表规模打包并发）
+# -----------------------
+# 小网表单个只要零点几秒、内部也不开进程池，逐个处理时多数核心空闲、时间耗在进程与导入开销上：
+# 把预计节点数低于 SMALL_SCALE_THRESHOLD 的网表打包交给一个进程池并发（并发度受核心数与 get_adaptive_workers
+# 内存模型约束，大者先发以缩短尾部）；大网表仍逐个独占全部核心，由其内部的节点级进程池并行
+PHASE1_BYTES_PER_NODE = 31     # 网表字节数 / 图节点数（本仓库网表实测 28~33），用于不解析即估算规模
+PHASE1_WORKER_BASE_MB = 300    # 打包进程的固定内存开销（解释器 + torch/networkit）
+PHASE1_MB_PER_KNODE = 2.0      # 每千节点的峰值内存（图 + 特征矩阵 + 稀疏核工作集）
+
+def estimate_netlist_nodes(verilog_path: str) -> int:
+    """按文件大小估算图节点数（实例 + 线网）"""
+    return max(1, os.path.getsize(verilog_path) // PHASE1_BYTES_PER_NODE)
+
+def plan_phase1(v_files: List[str]) -> Tuple[List[str], List[str], int]:
+    """
+    划分阶段1的执行计划
+    返回: (small_files 按预计规模降序, large_files 保持输入顺序, pack_workers)
+    pack_workers <= 1 时不值得开进程池，小网表并入顺序执行
+    """
+    est = {vpath: estimate_netlist_nodes(vpath) for vpath in v_files}
+    small_files = sorted((v for v in v_files if est[v] < SMALL_SCALE_THRESHOLD), key=lambda v: -est[v])
+    large_files = [v for v in v_files if est[v] >= SMALL_SCALE_THRESHOLD]
+    if len(small_files) < 2:
+        return small_files, large_files, 1
+    pack_workers = min(len(small_files), get_adaptive_workers(est[small_files[0]], 'netlist'))
+    return small_files, large_files, pack_workers
+
+def _init_phase1_worker(config: Dict):
+    """打包进程初始化：同步主进程的运行参数（spawn 启动时全局变量不会继承），并限定核心预算"""
+    global SMALL_SCALE_THRESHOLD, SAMPLE_THRESHOLD, CACHE_DIR, CACHE_MAX_BYTES, INCREMENTAL, CORE_BUDGET, EMBED_CACHE_DIR
+    SMALL_SCALE_THRESHOLD = config['small_scale_threshold']
+    SAMPLE_THRESHOLD = config['sample_threshold']
+    CACHE_DIR = config['cache_dir']
+    CACHE_MAX_BYTES = config['cache_max_bytes']
+    EMBED_CACHE_DIR = config['embed_cache_dir']
+    INCREMENTAL = config['incremental']
+    CORE_BUDGET = config['core_budget']
+    nk.setNumberOfThreads(CORE_BUDGET)  # 避免多个网表的 OpenMP 线程争抢同一批核心
+
+def run_phase1(v_files: List[str], seed: int, use_cache: bool) -> List[Tuple]:
+    """
+    执行阶段1：小网表打包并发，大网表逐个独占核心
+    返回与 v_files 一一对应的 extract_features_only 结果
+    """
+    small_files, large_files, pack_workers = plan_phase1(v_files)
+    if pack_workers <= 1:
+        small_files, large_files = [], list(v_files)
+    results: Dict[str, Tuple] = {}
+    
+    def report(vpath, result):
+        results[vpath] = result
+        filename, N, _, success, msg, _ = result
+        status = "✅" if success else "❌"
+        print(f"  [{len(results)}/{len(v_files)}] {filename}: {status} N={N} {msg}")
+    
+    if small_files:
+        config = {
+            'small_scale_threshold': SMALL_SCALE_THRESHOLD,
+            'sample_threshold': SAMPLE_THRESHOLD,
+            'cache_dir': CACHE_DIR,
+            'cache_max_bytes': CACHE_MAX_BYTES,
+            'embed_cache_dir': EMBED_CACHE_DIR,
+            'incremental': INCREMENTAL,
+            'core_budget': max(1, available_cores() // pack_workers),
+        }
+        print(f"\n  小网表 {len(small_files)} 个打包并发 ({pack_workers} 进程)，大网表 {len(large_files)} 个逐个独占 {available_cores()} 核")
+        with ProcessPoolExecutor(max_workers=pack_workers, initializer=_init_phase1_worker, initargs=(config,)) as executor:
+            futures = {executor.submit(extract_features_worker, (vpath, seed, RUN_MODE, use_cache, SMALL_SCALE_THRESHOLD)): vpath
+                       for vpath in small_files}
+            for future in as_completed(futures):
+                vpath = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = (os.path.basename(vpath), 0, RUN_MODE, False, f"❌ 异常: {e}", None)
+                report(vpath, result)
+    
+    # 大网表（及无法打包时的全部网表）顺序处理，内部使用 ProcessPoolExecutor
+    for vpath in large_files:
+        print(f"\n  处理: {os.path.basename(vpath)} (预计 {estimate_netlist_nodes(vpath)} 节点)")
+        try:
+            result = extract_features_only(vpath, seed, RUN_MODE, use_cache, SMALL_SCALE_THRESHOLD)
+        except Exception as e:
+            result = (os.path.basename(vpath), 0, RUN_MODE, False, f"❌ 异常: {e}", None)
+        report(vpath, result)
+    
+    return [results[vpath] for vpath in v_files]
+
+# -----------------------
+# 嵌入缓存（DGI 节点嵌入持久化）
+# -----------------------
+# 只改融合权重/排名/分析时不必重训 DGI：train_and_score_only 把嵌入矩阵 H 存为缓存条目（meta.json + embeddings.npy），
+# 目录名 = 特征缓存条目名 + 训练配置摘要（模型超参、轮数、种子、提前停止、采样、后端/精度）；
+# 加载 np.load(mmap_mode='r')，可选 float16 存储减半磁盘；与特征缓存共用 LRU 淘汰逻辑与大小上限
+EMBED_CACHE = True            # 由命令行参数 --embed_cache 控制
+EMBED_CACHE_DIR = None        # 由命令行参数 --embed_cache_dir 控制（None = CACHE_DIR/embeddings）
+EMBED_CACHE_DTYPE = 'float32'  # 由命令行参数 --embed_dtype 控制（float16 时未命中也用存储精度舍入后的嵌入排名）
+EMBED_CACHE_VERSION = 1       # 嵌入训练逻辑变化时递增，旧条目自动失效
+EMBED_CACHE_STATS = {'hits': 0, 'misses': 0, 'bytes_stored': 0}
+
+def embedding_train_params(hidden: int, layers: int, epochs: int, dropout: float, seed: int,
+                           use_sampling: bool, device: str, lr: float = 1e-3) -> Dict:
+    """影响嵌入数值的全部训练配置及存储精度（进入嵌入缓存键）"""
+    params = {
+        'version': EMBED_CACHE_VERSION,
+        'model': [hidden, layers, dropout],
+        'epochs': epochs,
+        'lr': lr,
+        'seed': seed,
+        'sampling': bool(use_sampling),
+        'device': str(device).split(':')[0],
+        'dtype': EMBED_CACHE_DTYPE,
+        'early_stop': [ES_MIN_EPOCHS, ES_CHECK_EVERY, ES_LOSS_EMA, ES_LOSS_REL_TOL, ES_TOPK_FRAC,
+                       ES_TOPK_OVERLAP, ES_KENDALL_TAU, ES_PATIENCE, list(FUSION_WEIGHTS)] if EARLY_STOP else None,
+    }
+    if params['device'] == 'cpu':
+        params['cpu_backend'] = [CPU_BACKEND, use_cpu_bf16(), CPU_FAST_DROPOUT]
+    return params
+
+def get_embed_cache_path(feature_cache_path: str, params: Dict) -> str:
+    """嵌入缓存条目目录（绝对路径）：特征缓存条目名 + 训练配置摘要"""
+    cache_dir = EMBED_CACHE_DIR or os.path.join(CACHE_DIR, 'embeddings')
+    params_hash = hashlib.blake2b(json.dumps(params, sort_keys=True).encode(), digest_size=8).hexdigest()
+    return os.path.join(os.path.abspath(cache_dir), f"{os.path.basename(feature_cache_path)}_{params_hash}")
+
+def save_cached_embeddings(entry_path: str, H: torch.Tensor, params: Dict, train_info: Dict):
+    """保存嵌入矩阵（先写临时目录再改名），写入字节数计入 EMBED_CACHE_STATS"""
+    if not EMBED_CACHE:
+        return
+    tmp_dir = f"{entry_path}.tmp{os.getpid()}"
+    try:
+        arr = H.detach().float().cpu().numpy().astype(EMBED_CACHE_DTYPE)
+        os.makedirs(tmp_dir, exist_ok=True)
+        np.save(os.path.join(tmp_dir, 'embeddings.npy'), arr)
+        meta = {
+            'params': params,
+            'shape': list(arr.shape),
+            'dtype': EMBED_CACHE_DTYPE,
+            'train_info': dict(train_info),
+        }
+        with open(os.path.join(tmp_dir, CACHE_META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        size = _dir_bytes(tmp_dir)
+        try:
+            os.rename(tmp_dir, entry_path)
+            EMBED_CACHE_STATS['bytes_stored'] += size
+        except OSError:
+            pass  # 其他进程已写入同一条目
+        enforce_cache_limit(keep=entry_path)
+    except Exception as e:
+        print(f"    [嵌入缓存] 保存失败: {e}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def load_cached_embeddings(entry_path: str) -> Optional[Tuple[np.ndarray, Dict]]:
+    """
+    加载嵌入缓存条目（memmap，只读）；命中/未命中计入 EMBED_CACHE_STATS
+    返回: (H [N, hidden], meta) 或 None
+    """
+    meta_path = os.path.join(entry_path, CACHE_META_FILE)
+    if not EMBED_CACHE:
+        return None
+    if os.path.exists(meta_path):
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            H = np.load(os.path.join(entry_path, 'embeddings.npy'), mmap_mode='r')
+            if list(H.shape) == meta['shape']:
+                os.utime(meta_path)  # 刷新 LRU 使用时间
+                EMBED_CACHE_STATS['hits'] += 1
+                return H, meta
+        except Exception as e:
+            print(f"    [嵌入缓存] 加载失败: {e}")
+    EMBED_CACHE_STATS['misses'] += 1
+    return None
+
+def find_cached_embeddings(verilog_path: str, hidden=128, layers=3, epochs=150, dropout=0.2, seed=20,
+                           device='cpu') -> Optional[Tuple[np.ndarray, Dict]]:
+    """
+    供融合权重/排名分析脚本直接取嵌入（不导入训练流程、不训练）：参数须与生成时的命令行一致
+    返回: (H memmap, meta) 或 None
+    """
+    feature_cache_path = get_cache_path(os.path.abspath(verilog_path), 'v1')
+    meta_path = os.path.join(feature_cache_path, CACHE_META_FILE)
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        n_nodes = json.load(f)['n_nodes']
+    params = embedding_train_params(hidden, layers, epochs, dropout, seed, n_nodes >= SAMPLE_THRESHOLD, device)
+    return load_cached_embeddings(get_embed_cache_path(feature_cache_path, params))
+
+def cached_or_trained_embeddings(feature_cache_path: str, feats: FeatureMatrix, data: Data, output_ids: Set[int],
+                                 hidden=128, layers=3, epochs=150, dropout=0.2, seed=42, use_sampling=False,
+                                 device='cpu') -> Tuple[torch.Tensor, Dict]:
+    """
+    取网表的 DGI 嵌入：嵌入缓存命中时直接加载，否则训练并写入缓存（调用方负责在构建 data 前 set_seed）
+    返回: (H [N, hidden] float32, train_info)
+    """
+    params = embedding_train_params(hidden, layers, epochs, dropout, seed, use_sampling, device)
+    entry_path = get_embed_cache_path(feature_cache_path, params)
+    cached = load_cached_embeddings(entry_path)
+    if cached is not None:
+        H = torch.from_numpy(np.asarray(cached[0], dtype=np.float32))
+        return H, {'epochs': cached[1]['train_info'].get('epochs', epochs), 'stop_reason': 'embed_cache'}
+    score_fn = (lambda H: fused_score_array(feats, H, data, output_ids)) if EARLY_STOP else None
+    train_info = {}
+    H = train_dgi(data, hidden=hidden, layers=layers, epochs=epochs, dropout=dropout, device=device, use_sampling=use_sampling,
+                  score_fn=score_fn, train_info=train_info)
+    save_cached_embeddings(entry_path, H, params, train_info)
+    if EMBED_CACHE and EMBED_CACHE_DTYPE != 'float32':
+        # 与之后命中时加载的数值一致：同一命令重复运行输出不变
+        H = torch.from_numpy(H.detach().float().cpu().numpy().astype(EMBED_CACHE_DTYPE).astype(np.float32))
+    return H, train_info
+
+def embed_cache_summary() -> str:
+    s = EMBED_CACHE_STATS
+    return f"命中 {s['hits']} | 未命中 {s['misses']} | 写入 {s['bytes_stored'] / (1024 * 1024):.1f}MB ({EMBED_CACHE_DTYPE})"
+
 # -----------------------
 # 阶段2: 仅DGI训练和评分（GPU串行）
 # -----------------------
+BATCH_TRAIN_MAX_NODES = 60000  # 预训练时每个并图的节点总数上限（--batch_max_nodes 可调）
+
+def write_rank_file(output_dir: str, base: str, ranked: List[Tuple[str, float]], suffix: str = '') -> Tuple[str, float]:
+    """写出排名文件 gnn_rank_<base>_v1<suffix>.txt（后缀版本会被故障注入脚本作为独立版本统计），返回第一名 (name, score)"""
+    out_path = os.path.join(output_dir, f"gnn_rank_{base}_v1{suffix}.txt")
+    with open(out_path, 'w', encoding='utf-8') as f:
+        for name, score in ranked:
+            f.write(f"{name} {score:.6f}\n")
+    return ranked[0] if ranked else ('N/A', 0)
+
+def plan_train_batches(files_with_nodes: List[Tuple[str, int]], max_nodes: int) -> Tuple[List[List[str]], List[str]]:
+    """
+    预训练并图分组：节点数不超过 max_nodes 的网表按规模从小到大装箱，每箱节点总数不超过 max_nodes
+    更大的网表（以及需要子图采样的超大网表）仍单独训练
+    返回: (批次列表, 单独训练的文件列表)
+    """
+    small = sorted(((f, n) for f, n in files_with_nodes if n <= max_nodes and n < SAMPLE_THRESHOLD), key=lambda t: t[1])
+    single = [f for f, n in files_with_nodes if not (n <= max_nodes and n < SAMPLE_THRESHOLD)]
+    batches, cur, cur_nodes = [], [], 0
+    for f, n in small:
+        if cur and cur_nodes + n > max_nodes:
+            batches.append(cur)
+            cur, cur_nodes = [], 0
+        cur.append(f)
+        cur_nodes += n
+    if cur:
+        batches.append(cur)
+    return batches, single
+
 def train_and_score_only(verilog_path: str, output_dir: str, hidden=128, layers=3, 
                          epochs=150, dropout=0.2, seed=42, run_mode='v1', device='cuda'):
     """
     仅执行DGI训练和评分阶段（GPU密集型），从缓存加载特征
     V1-Only 版本：仅支持 V1 模式
-    返回: (result_str, time_v1_train, N, filename, success, actual_run_mode)
+    EARLY_STOP 开启时按融合分数排名稳定性提前停止训练
+    返回: (result_str, time_v1_train, N, filename, success, actual_run_mode, train_info)
+    train_info: {'epochs': 实际训练轮数, 'stop_reason': 停止原因}
     """
     start_time = time.time()
     filename = os.path.basename(verilog_path)
@@ -1392,11 +3357,10 @@ def train_and_score_only(verilog_path: str, output_dir: str, hidden=128, layers=
     
     verilog_path = os.path.abspath(verilog_path)
     output_dir = os.path.abspath(output_dir)
-    cache_dir_abs = os.path.abspath(CACHE_DIR)
     
     try:
         # 获取缓存路径
-        cache_path_v1 = os.path.join(cache_dir_abs, f"{base}_v1_{get_file_hash(verilog_path)}.pkl")
+        cache_path_v1 = get_cache_path(verilog_path, 'v1')
         
         # 固定为 V1 模式
         actual_run_mode = 'v1'
@@ -1404,7 +3368,7 @@ def train_and_score_only(verilog_path: str, output_dir: str, hidden=128, layers=
         # 加载 V1 缓存
         cached_v1 = load_cached_features_nk(cache_path_v1)
         if not cached_v1:
-            return (f"[{filename}] ❌ V1缓存不存在，请先运行特征提取", None, 0, filename, False, actual_run_mode)
+            return (f"[{filename}] ❌ V1缓存不存在，请先运行特征提取", None, 0, filename, False, actual_run_mode, {})
         
         feats_v1, nk_g, output_ids, seq_inst_ids, _ = cached_v1
         N = nk_g.number_of_nodes()
@@ -1413,34 +3377,377 @@ def train_and_score_only(verilog_path: str, output_dir: str, hidden=128, layers=
         v1_start = time.time()
         set_seed(seed)
         data_v1, _, _ = build_pyg_data_nk(nk_g, feats_v1)
-        H_v1 = train_dgi(data_v1, hidden=hidden, layers=layers, epochs=epochs, dropout=dropout, device=device, use_sampling=use_sampling)
-        ranked_v1 = fuse_scores_v1_nk(nk_g, feats_v1, H_v1, data_v1, output_ids)
+        H_v1, train_info = cached_or_trained_embeddings(cache_path_v1, feats_v1, data_v1, output_ids, hidden=hidden, layers=layers,
+                                                        epochs=epochs, dropout=dropout, seed=seed, use_sampling=use_sampling,
+                                                        device=device)
+        ranked_v1 = fuse_scores_v1_nk(nk_g, feats_v1, H_v1, data_v1, output_ids, top_k=RANK_TOP_K or None)
         time_v1 = time.time() - v1_start
         
-        out_path_v1 = os.path.join(output_dir, f"gnn_rank_{base}_v1.txt")
-        with open(out_path_v1, 'w', encoding='utf-8') as f:
-            for name, score in ranked_v1:
-                f.write(f"{name} {score:.6f}\n")
-        
-        top_v1 = ranked_v1[0] if ranked_v1 else ('N/A', 0)
+        top_v1 = write_rank_file(output_dir, base, ranked_v1)
         
         elapsed = time.time() - start_time
         reset_cuda_state()
         
-        final_str = f"[{filename}] ✅ N={N} (模式: V1) [{device.upper()}]\n  V1 Top: {top_v1[0]} ({top_v1[1]:.4f}) | Time: {time_v1:.2f}s\n  总耗时: {elapsed:.2f}s"
+        final_str = (f"[{filename}] ✅ N={N} (模式: V1) [{device.upper()}]\n  V1 Top: {top_v1[0]} ({top_v1[1]:.4f}) | Time: {time_v1:.2f}s"
+                     f" | Epochs: {train_info['epochs']}/{epochs} ({train_info['stop_reason']})\n  总耗时: {elapsed:.2f}s")
+        
+        return (final_str, time_v1, N, filename, True, actual_run_mode, train_info)
+        
+    except Exception as e:
+        import traceback
+        reset_cuda_state()
+        return (f"[{filename}] ❌ Error: {str(e)}\n{traceback.format_exc()}", None, 0, filename, False, 'v1', {})
+
+def train_and_score_ensemble(verilog_path: str, output_dir: str, n_replicas: int, hidden=128, layers=3, epochs=150,
+                             dropout=0.2, seed=42, device='cuda', group_size: int = 0,
+                             input_noise: float = ENSEMBLE_INPUT_NOISE, noise_level: float = ENSEMBLE_SCORE_NOISE,
+                             weight_noise: float = ENSEMBLE_WEIGHT_NOISE) -> Tuple:
+    """
+    集成模式评分：K 个 DGI 副本堆叠训练 + 各副本加噪融合，按 Borda 分数写出 gnn_rank_<name>_v1_ensemble.txt，
+    逐节点统计量写入 ensemble_stats_<name>.csv（mean_rank, rank_var, borda, topk_freq）
+    返回: 结果元组（格式同 train_and_score_only）
+    """
+    import csv
+    filename = os.path.basename(verilog_path)
+    base = os.path.splitext(filename)[0]
+    output_dir = os.path.abspath(output_dir)
+    try:
+        feats_v1, nk_g, output_ids, data_v1 = load_pyg_data_from_cache(verilog_path)
+        N = nk_g.number_of_nodes()
+        v1_start = time.time()
+        rows, stats, group = ensemble_rank_statistics(nk_g, feats_v1, data_v1, output_ids, n_replicas, hidden=hidden,
+                                                      layers=layers, epochs=epochs, dropout=dropout, seed=seed, device=device,
+                                                      group_size=group_size, input_noise=input_noise,
+                                                      noise_level=noise_level, weight_noise=weight_noise)
+        order = top_k_order(stats['borda'], RANK_TOP_K or None)
+        names = [data_v1.node_names[i] for i in rows[order].tolist()]
+        time_v1 = time.time() - v1_start
+        top_v1 = write_rank_file(output_dir, base, list(zip(names, stats['borda'][order].tolist())), suffix='_ensemble')
         
-        return (final_str, time_v1, N, filename, True, actual_run_mode)
+        with open(os.path.join(output_dir, f"ensemble_stats_{base}.csv"), 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(['name', 'mean_rank', 'rank_var', 'borda', 'topk_freq'])
+            for name, i in zip(names, order.tolist()):
+                writer.writerow([name, f"{stats['mean_rank'][i]:.2f}", f"{stats['rank_var'][i]:.2f}",
+                                 f"{stats['borda'][i]:.6f}", f"{stats['topk_freq'][i]:.4f}"])
         
+        reset_cuda_state()
+        final_str = (f"[{filename}] ✅ N={N} (模式: V1 集成 {n_replicas} 副本, 每组 {group}) [{device.upper()}]\n"
+                     f"  V1 Top: {top_v1[0]} ({top_v1[1]:.4f}) | Time: {time_v1:.2f}s")
+        return (final_str, time_v1, N, filename, True, 'v1_ensemble', {'epochs': epochs, 'stop_reason': 'max_epochs'})
     except Exception as e:
         import traceback
         reset_cuda_state()
-        return (f"[{filename}] ❌ Error: {str(e)}\n{traceback.format_exc()}", None, 0, filename, False, 'v1')
+        return (f"[{filename}] ❌ Error: {str(e)}\n{traceback.format_exc()}", None, 0, filename, False, 'v1_ensemble', {})
+
+def load_pyg_data_from_cache(verilog_path: str) -> Tuple[FeatureMatrix, NKGraph, Set[int], Data]:
+    """从 V1 特征缓存加载并构建 PyG 数据；缓存不存在时抛出 RuntimeError"""
+    cached_v1 = load_cached_features_nk(get_cache_path(os.path.abspath(verilog_path), 'v1'))
+    if not cached_v1:
+        raise RuntimeError(f"{os.path.basename(verilog_path)} 的 V1 缓存不存在，请先运行特征提取")
+    feats_v1, nk_g, output_ids, _, _ = cached_v1
+    data_v1, _, _ = build_pyg_data_nk(nk_g, feats_v1)
+    return feats_v1, nk_g, output_ids, data_v1
+
+def pretrain_on_corpus(verilog_paths: List[str], ckpt_path: str, hidden=128, layers=3, epochs=150,
+                       dropout=0.2, device='cuda', max_nodes: Optional[int] = None):
+    """在一批网表（需已有特征缓存）上预训练共享编码器，并保存检查点"""
+    data_list = [load_pyg_data_from_cache(p)[3] for p in verilog_paths]
+    model, vocab = pretrain_encoder(data_list, hidden=hidden, layers=layers, epochs=epochs, dropout=dropout,
+                                    device=device, max_nodes=max_nodes)
+    save_pretrained_encoder(ckpt_path, model, vocab, hidden, layers, dropout, epochs,
+                            [os.path.basename(p) for p in verilog_paths])
+    print(f"    [预训练] 检查点已保存: {ckpt_path}")
+
+def score_with_pretrained(verilog_path: str, output_dir: str, model: nn.Module, vocab: List[str], device='cuda') -> Tuple:
+    """
+    推理模式评分：预训练编码器单次前向取嵌入，融合打分后写出 gnn_rank_<name>_v1_pretrained.txt
+    返回: 结果元组（格式同 train_and_score_only）
+    """
+    filename = os.path.basename(verilog_path)
+    try:
+        feats_v1, nk_g, output_ids, data_v1 = load_pyg_data_from_cache(verilog_path)
+        N = nk_g.number_of_nodes()
+        v1_start = time.time()
+        H_v1 = encode_with_pretrained(model, vocab, data_v1, device)
+        ranked_v1 = fuse_scores_v1_nk(nk_g, feats_v1, H_v1, data_v1, output_ids, top_k=RANK_TOP_K or None)
+        time_v1 = time.time() - v1_start
+        top_v1 = write_rank_file(os.path.abspath(output_dir), os.path.splitext(filename)[0], ranked_v1, suffix='_pretrained')
+        final_str = f"[{filename}] ✅ N={N} (模式: V1 预训练推理) [{device.upper()}]\n  V1 Top: {top_v1[0]} ({top_v1[1]:.4f}) | Time: {time_v1:.2f}s"
+        return (final_str, time_v1, N, filename, True, 'v1_pretrained', {'epochs': 0, 'stop_reason': 'pretrained'})
+    except Exception as e:
+        import traceback
+        reset_cuda_state()
+        return (f"[{filename}] ❌ Error: {str(e)}\n{traceback.format_exc()}", None, 0, filename, False, 'v1_pretrained', {})
+
+# -----------------------
+# 融合权重批量评估（对照全节点注入结果，无需仿真）
+# -----------------------
+# 每个网表只取一次五个分量 [M, 5]（M = 有注入结果的排名候选节点，行顺序同排名文件）与每个节点被检测的故障数 g ∈ {0,1,2}；
+# B 组权重的融合分数 = W[B,5] @ comps.T 一次矩阵乘，逐行稳定 argsort 得到 B 个排名，累积 g 即得各排名的覆盖率曲线。
+# 指标与故障注入脚本的 analyze_ranking_versioned 一致：前 10%/20% 的故障覆盖率 fault_cov_pct，
+# 另加整条累积覆盖率曲线的均值（曲线下面积，%）；按三者取 Pareto 前沿（逐网表 + 全部网表平均）
+FUSION_COMPONENT_NAMES = ('centrality', 'proximity', 'reconv', 'seq', 'embed')
+FUSION_SWEEP_STEP = 0.05                 # 权重网格步长（单纯形上全部组合，0.05 → 10626 组）
+FUSION_SWEEP_MEM_BYTES = 512 * 1024 ** 2  # 每块权重的 [b, M] 中间数组内存上限
+INJECTION_RESULTS_FILE = 'full_injection_results.json'
+
+def fusion_weight_grid(step: float = FUSION_SWEEP_STEP) -> np.ndarray:
+    """单纯形上步长为 step 的全部五元权重 [B, 5]（隔板法枚举），保证包含默认 FUSION_WEIGHTS"""
+    n = int(round(1.0 / step))
+    bars = np.array(list(itertools.combinations(range(n + 4), 4)), dtype=np.int64)
+    parts = np.column_stack([bars[:, :1], np.diff(bars, axis=1) - 1, n + 3 - bars[:, 3:]])
+    weights = parts / n
+    if not np.isclose(weights, FUSION_WEIGHTS).all(axis=1).any():
+        weights = np.vstack([weights, FUSION_WEIGHTS])
+    return weights
+
+def fusion_components(feats: FeatureMatrix, H: torch.Tensor, data: Data, output_ids: Set[int]) -> np.ndarray:
+    """融合公式的五个分量 [N, 5]（按 data 行顺序，列顺序同 FUSION_WEIGHTS）"""
+    nid_list = np.asarray(data.node_ids)
+    embed_sim = embed_similarity(H, output_rows(nid_list, output_ids))
+    return np.column_stack([struct_score_components(feats, nid_list), embed_sim])
+
+def load_fault_gains(json_path: str) -> Dict[str, int]:
+    """全节点注入结果 → {节点名: 被检测的固定型故障数 (sa0 + sa1)}"""
+    with open(json_path, 'r', encoding='utf-8') as f:
+        results = json.load(f)
+    return {node: sum(1 for fault in ('sa0', 'sa1') if (res.get(fault) or {}).get('detected', False))
+            for node, res in results.items()}
+
+def weight_sweep_metrics(comps: np.ndarray, gains: np.ndarray, weights: np.ndarray,
+                         mem_bytes: int = FUSION_SWEEP_MEM_BYTES) -> np.ndarray:
+    """
+    B 组权重下排名的覆盖率指标 [B, 3]：前 10% / 前 20% 故障覆盖率与累积覆盖率曲线均值（均为 %）
+    同分按行号保持原顺序（与 top_k_order 的稳定排序一致）；权重按块处理，中间数组不超过 mem_bytes
+    """
+    M = len(gains)
+    idx_10pct = max(1, int(M * 0.10)) - 1
+    idx_20pct = max(1, int(M * 0.20)) - 1
+    scale = 50.0 / np.arange(1, M + 1)  # detected_faults / (2k) * 100
+    metrics = np.empty((len(weights), 3))
+    chunk = max(1, mem_bytes // (M * 32))
+    for start in range(0, len(weights), chunk):
+        scores = weights[start:start + chunk] @ comps.T
+        order = np.argsort(-scores, axis=1, kind='stable')
+        del scores
+        cov = np.cumsum(gains[order], axis=1) * scale
+        metrics[start:start + chunk, 0] = cov[:, idx_10pct]
+        metrics[start:start + chunk, 1] = cov[:, idx_20pct]
+        metrics[start:start + chunk, 2] = cov.mean(axis=1)
+    return metrics
+
+def pareto_front(metrics: np.ndarray) -> np.ndarray:
+    """
+    各指标越大越好，返回不被任何其他行支配的行掩码（指标完全相同的行同时保留）
+    按指标字典序降序扫描：排在后面的行只可能与前面的行相等而不可能支配它，只需与已入选的前沿比较
+    """
+    front = np.zeros(len(metrics), dtype=bool)
+    kept = np.empty((0, metrics.shape[1]))
+    for i in np.lexsort(-metrics.T[::-1]).tolist():
+        m = metrics[i]
+        if not ((kept >= m).all(axis=1) & (kept > m).any(axis=1)).any():
+            front[i] = True
+            kept = np.vstack([kept, m])
+    return front
+
+def sweep_circuit(verilog_path: str, json_path: str, weights: np.ndarray, hidden=128, layers=3, epochs=150,
+                  dropout=0.2, seed=42, device='cpu') -> Tuple[np.ndarray, int]:
+    """单个网表：取分量（嵌入走嵌入缓存，未命中才训练）并评估全部权重，返回 (指标 [B, 3], 有效节点数 M)"""
+    verilog_path = os.path.abspath(verilog_path)
+    set_seed(seed)
+    feats_v1, nk_g, output_ids, data_v1 = load_pyg_data_from_cache(verilog_path)
+    H_v1, _ = cached_or_trained_embeddings(get_cache_path(verilog_path, 'v1'), feats_v1, data_v1, output_ids,
+                                           hidden=hidden, layers=layers, epochs=epochs, dropout=dropout, seed=seed,
+                                           use_sampling=nk_g.number_of_nodes() >= SAMPLE_THRESHOLD, device=device)
+    gains_by_name = load_fault_gains(json_path)
+    nid_list = np.asarray(data_v1.node_ids)
+    rows = np.flatnonzero(rank_candidate_mask(nk_g)[nid_list])
+    rows = rows[np.array([data_v1.node_names[i] in gains_by_name for i in rows.tolist()], dtype=bool)]
+    if len(rows) == 0:
+        raise RuntimeError("排名候选节点均无注入结果")
+    gains = np.array([gains_by_name[data_v1.node_names[i]] for i in rows.tolist()], dtype=np.int64)
+    comps = fusion_components(feats_v1, H_v1, data_v1, output_ids)[rows]
+    return weight_sweep_metrics(comps, gains, weights), len(rows)
+
+def run_fusion_sweep(verilog_paths: List[str], injection_dir: str, output_dir: str, step: float = FUSION_SWEEP_STEP,
+                     hidden=128, layers=3, epochs=150, dropout=0.2, seed=42, device='cpu') -> Optional[str]:
+    """
+    对有注入结果（<injection_dir>/<网表名>/full_injection_results.json）的网表评估整个权重网格，
+    Pareto 前沿（逐网表 + 全部网表平均）与默认权重行写入 fusion_sweep_pareto.csv，返回该文件路径
+    """
+    import csv
+    weights = fusion_weight_grid(step)
+    default_row = int(np.flatnonzero(np.isclose(weights, FUSION_WEIGHTS).all(axis=1))[0])
+    print(f"  权重网格: {len(weights)} 组 (步长 {step})")
+    per_circuit = {}
+    for vpath in verilog_paths:
+        base = os.path.splitext(os.path.basename(vpath))[0]
+        json_path = os.path.join(injection_dir, base, INJECTION_RESULTS_FILE)
+        if not os.path.exists(json_path):
+            continue
+        t0 = time.time()
+        try:
+            metrics, M = sweep_circuit(vpath, json_path, weights, hidden=hidden, layers=layers, epochs=epochs,
+                                       dropout=dropout, seed=seed, device=device)
+        except Exception as e:
+            print(f"  [{base}] ❌ 权重扫描失败: {e}")
+            continue
+        per_circuit[base] = metrics
+        best = weights[np.argmax(metrics[:, 0])]
+        print(f"  [{base}] M={M} | 默认权重 前10% {metrics[default_row, 0]:.2f}% / 前20% {metrics[default_row, 1]:.2f}% / "
+              f"AUC {metrics[default_row, 2]:.2f}% | 前10%最优 {metrics[:, 0].max():.2f}% @ {np.round(best, 2).tolist()} "
+              f"| {time.time() - t0:.2f}s")
+    if not per_circuit:
+        print(f"  [提示] {injection_dir} 下没有与输入网表对应的注入结果，跳过权重扫描")
+        return None
+    per_circuit['suite'] = np.mean(list(per_circuit.values()), axis=0)
+
+    csv_path = os.path.join(output_dir, 'fusion_sweep_pareto.csv')
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['scope'] + [f"w_{c}" for c in FUSION_COMPONENT_NAMES]
+                        + ['fault_cov_10pct', 'fault_cov_20pct', 'auc', 'pareto', 'default'])
+        for scope, metrics in per_circuit.items():
+            front = pareto_front(metrics)
+            keep = np.flatnonzero(front | (np.arange(len(weights)) == default_row))
+            keep = keep[np.lexsort((-metrics[keep, 2], -metrics[keep, 1], -metrics[keep, 0]))]
+            for i in keep.tolist():
+                writer.writerow([scope] + [f"{w:.2f}" for w in weights[i]] + [f"{m:.2f}" for m in metrics[i]]
+                                + [bool(front[i]), i == default_row])
+            if scope == 'suite':
+                print(f"  [全部网表] Pareto 前沿 {int(front.sum())} 组 | 默认权重 前10% {metrics[default_row, 0]:.2f}% / "
+                      f"前20% {metrics[default_row, 1]:.2f}% / AUC {metrics[default_row, 2]:.2f}%")
+                for j, label in enumerate(('前10%', '前20%', 'AUC')):
+                    i = int(np.argmax(metrics[:, j]))
+                    print(f"    {label}最优: {np.round(weights[i], 2).tolist()} → "
+                          f"{metrics[i, 0]:.2f}% / {metrics[i, 1]:.2f}% / {metrics[i, 2]:.2f}%")
+    return csv_path
+
+# -----------------------
+# 流水线模式：特征提取与训练重叠执行
+# -----------------------
+# 生产者线程把网表投递到提取进程池，主线程按提取完成顺序训练并评分（消费者）
+# 背压：已投递提取但尚未训练完的网表不超过 queue_size 个，生产者在此之前阻塞；
+# 提取结果只以缓存条目落盘、训练时 mmap 加载，因此既不在内存中堆积，也不会在训练前被 LRU 淘汰
+# 投递顺序：大网表在前、小网表在后，最后完成提取的网表训练最快，收尾最短
+def _pipeline_extract_task(args_tuple, core_budget: int):
+    """流水线提取任务：按任务设定核心预算（大网表独占全部核心，小网表各占一份）"""
+    global CORE_BUDGET
+    CORE_BUDGET = core_budget
+    nk.setNumberOfThreads(core_budget)
+    return extract_features_worker(args_tuple)
+
+def interval_overlap(intervals: List[Tuple[float, float]], window: Tuple[float, float]) -> float:
+    """各区间与窗口的交集总长"""
+    lo, hi = window
+    return sum(max(0.0, min(end, hi) - max(start, lo)) for start, end in intervals)
+
+def run_pipeline(v_files: List[str], args, device: str, use_cache: bool, queue_size: int = 2) -> Tuple[List[Tuple], List[Dict], Dict]:
+    """
+    流水线执行阶段1与阶段2
+    返回: (extraction_results 与 v_files 对应, timing_records 按 v_files 顺序, stats)
+    stats: phase1_time 首次投递到最后一个提取完成, phase2_time 训练累计耗时, overlap_time 训练与提取同时进行的时长
+    注意: 提取进程写缓存时的 LRU 淘汰只保护刚写入的条目；--cache_max_mb 小于 queue_size 个条目时，
+    已提取、待训练的条目可能被淘汰，该网表训练阶段报"缓存不存在"
+    """
+    small_files, large_files, pack_workers = plan_phase1(v_files)
+    order = sorted(large_files, key=lambda v: -estimate_netlist_nodes(v)) + small_files
+    n_workers = max(1, min(pack_workers, queue_size))
+    full_budget = available_cores()
+    small_budget = max(1, full_budget // n_workers)
+    large_set = set(large_files)
+    config = {
+        'small_scale_threshold': SMALL_SCALE_THRESHOLD,
+        'sample_threshold': SAMPLE_THRESHOLD,
+        'cache_dir': CACHE_DIR,
+        'cache_max_bytes': CACHE_MAX_BYTES,
+        'embed_cache_dir': EMBED_CACHE_DIR,
+        'incremental': INCREMENTAL,
+        'core_budget': small_budget,
+    }
+    slots = threading.Semaphore(queue_size)
+    ready = queue.Queue()  # (vpath, future, 完成时刻)；条目数受 slots 约束
+    
+    def produce(executor):
+        for k, vpath in enumerate(order):
+            slots.acquire()
+            try:
+                future = executor.submit(_pipeline_extract_task, (vpath, args.seed, RUN_MODE, use_cache, SMALL_SCALE_THRESHOLD),
+                                         full_budget if vpath in large_set else small_budget)
+            except Exception as e:
+                # 进程池已损坏（如子进程被 OOM 杀掉）等: 剩余网表全部记为失败，避免主线程在 ready.get() 上永远等待
+                for rest in order[k:]:
+                    failed = Future()
+                    failed.set_exception(e)
+                    ready.put((rest, failed, time.time()))
+                return
+            future.add_done_callback(lambda f, v=vpath: ready.put((v, f, time.time())))
+            if vpath in large_set:
+                # 大网表独占 full_budget 个核心（NetworKit 线程 + 内部特征进程池）：与阶段1 一样逐个提取，
+                # 提取完成前不投递下一个网表，避免两个大网表或大小网表同时跑而超订核心
+                wait([future])
+    
+    print(f"  提取进程: {n_workers} | 队列上限: {queue_size} | 大网表 {len(large_files)} 个先行（逐个独占 {full_budget} 核），小网表 {len(small_files)} 个随后")
+    if device == 'cpu' and mp.cpu_count() < 2:
+        print("  ⚠️ 单核 CPU 上训练与提取争抢同一核心，重叠不会缩短总耗时（适用于 GPU 训练或多核机器）")
+    start = time.time()
+    extract_end = start
+    extraction: Dict[str, Tuple] = {}
+    records: Dict[str, Dict] = {}
+    train_intervals = []
+    # fork 启动时进程池在首次投递时一次性创建全部子进程，早于主线程开始训练（不会在 CUDA 初始化后 fork）
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_phase1_worker, initargs=(config,)) as executor:
+        producer = threading.Thread(target=produce, args=(executor,), daemon=True)
+        producer.start()
+        for _ in order:
+            vpath, future, done_at = ready.get()
+            extract_end = max(extract_end, done_at)
+            try:
+                result = future.result()
+            except Exception as e:
+                result = (os.path.basename(vpath), 0, RUN_MODE, False, f"❌ 异常: {e}", None)
+            extraction[vpath] = result
+            filename, N, _, success, msg, time_v1_feat = result
+            print(f"\n  [提取 {len(extraction)}/{len(v_files)}] {filename}: {'✅' if success else '❌'} N={N} {msg}")
+            if success:
+                train_start = time.time()
+                result_str, time_v1_train, N, filename, success, actual_run_mode, train_info = train_and_score_only(
+                    vpath, args.output_dir,
+                    hidden=args.hidden, layers=args.layers, epochs=args.epochs,
+                    dropout=args.dropout, seed=args.seed, run_mode=RUN_MODE,
+                    device=device
+                )
+                train_intervals.append((train_start, time.time()))
+                print(result_str)
+                records[vpath] = {
+                    'filename': filename,
+                    'nodes': N,
+                    'actual_mode': actual_run_mode,
+                    'v1_feat_time': time_v1_feat,
+                    'v1_train_time': time_v1_train,
+                    'v1_epochs': train_info.get('epochs'),
+                    'v1_stop_reason': train_info.get('stop_reason', ''),
+                    'success': success
+                }
+            slots.release()
+        producer.join()
+    
+    stats = {
+        'phase1_time': extract_end - start,
+        'phase2_time': sum(end - begin for begin, end in train_intervals),
+        'overlap_time': interval_overlap(train_intervals, (start, extract_end)),
+    }
+    return [extraction[v] for v in v_files], [records[v] for v in v_files if v in records], stats
 
 # -----------------------
 # 主入口：两阶段流水线
 # -----------------------
 def main():
     import csv
+    global SMALL_SCALE_THRESHOLD, RUN_MODE, USE_CACHE, CACHE_DIR, CACHE_MAX_BYTES, SAMPLE_THRESHOLD, CORE_BUDGET, INCREMENTAL, EARLY_STOP, RANK_TOP_K
+    global EMBED_CACHE, EMBED_CACHE_DIR, EMBED_CACHE_DTYPE
+    global CPU_BACKEND, CPU_BF16, CPU_FAST_DROPOUT
     
     parser = argparse.ArgumentParser(description="批量无监督敏感度评分器（两阶段流水线：CPU并行特征提取 + GPU串行训练）")
     parser.add_argument('--input_dir', type=str, default="./netlists", help="输入目录")
@@ -1456,14 +3763,46 @@ def main():
     parser.add_argument('--mode', type=str, default='v1', help="运行模式: 固定为 v1")
     parser.add_argument('--use_cache', type=str, default='true', choices=['true', 'false'], help="是否使用特征缓存")
     parser.add_argument('--cache_dir', type=str, default="./feature_cache", help="特征缓存目录")
+    parser.add_argument('--incremental', action='store_true', help="增量模式：网表小改动(ECO)后以同名旧版本缓存为基准，只重算受影响区域的特征")
+    parser.add_argument('--pipeline', action='store_true', help="流水线模式：特征提取与训练重叠执行（提取完一个训练一个）")
+    parser.add_argument('--queue_size', type=int, default=2, help="流水线模式下已提取但未训练的网表数上限（背压）")
+    parser.add_argument('--early_stop', action='store_true', help="提前停止：融合分数排名稳定(top-10%% 重合度与 Kendall tau)且平滑损失不再陡降后停止训练，实际轮数记入时间报告")
+    parser.add_argument('--cpu_backend', type=str, default='sparse', choices=['sparse', 'pyg'], help="CPU 训练后端: sparse=预建 CSR 邻接(float32 下与 pyg 同种子排名一致)，pyg=原 COO 边索引路径")
+    parser.add_argument('--cpu_bf16', type=str, default='off', choices=['auto', 'on', 'off'], help="CPU 稀疏后端的 bfloat16 自动混合精度(默认关闭；auto=CPU 支持 AVX512-BF16/AMX 时启用，排名会随硬件变化)")
+    parser.add_argument('--cpu_fast_dropout', action='store_true', help="CPU 上用 fast_dropout 代替 F.dropout(随机数量减为 1/4，但随机流与保留概率量化不同，排名会变化)")
+    parser.add_argument('--top_k', type=int, default=0, help="排名文件只写前 K 个节点(0=全部)；部分选择，不对全部节点排序")
+    parser.add_argument('--batch_max_nodes', type=int, default=BATCH_TRAIN_MAX_NODES, help="预训练时每个并图的节点总数上限，超过该规模的网表单独成图")
+    parser.add_argument('--pretrain', action='store_true', help="预训练：在输入目录全部网表上训练一个共享编码器并保存到 --encoder_ckpt，随后用它推理评分")
+    parser.add_argument('--inference_only', action='store_true', help="推理模式：加载 --encoder_ckpt 的预训练编码器，每个网表只做一次前向（输出 gnn_rank_<name>_v1_pretrained.txt）")
+    parser.add_argument('--encoder_ckpt', type=str, default=ENCODER_CKPT_PATH, help="预训练编码器检查点路径")
+    parser.add_argument('--ensemble', type=int, default=0, help="集成模式：每个网表堆叠训练 K 个 DGI 副本(K>1)，输出 Borda 共识排名 gnn_rank_<name>_v1_ensemble.txt 与逐节点排名统计 ensemble_stats_<name>.csv；CPU 上并不便宜：实测 K=8 约为单次训练的 5 倍（逐个训练 8 次的 2/3），明显省时只在 GPU 上")
+    parser.add_argument('--ensemble_group', type=int, default=0, help="集成模式每组同时训练的副本数(0=按内存预算自动)")
+    parser.add_argument('--input_noise', type=float, default=ENSEMBLE_INPUT_NOISE, help="集成模式：各副本输入结构特征的高斯噪声标准差")
+    parser.add_argument('--noise_level', type=float, default=ENSEMBLE_SCORE_NOISE, help="集成模式：各副本融合分量的均匀噪声幅度")
+    parser.add_argument('--weight_noise', type=float, default=ENSEMBLE_WEIGHT_NOISE, help="集成模式：各副本融合权重的均匀扰动幅度")
+    parser.add_argument('--cache_max_mb', type=int, default=CACHE_MAX_BYTES // (1024 * 1024), help="特征缓存 + 嵌入缓存合计大小上限(MB)，超出按最近使用时间淘汰")
+    parser.add_argument('--embed_cache', type=str, default='true', choices=['true', 'false'], help="是否缓存/复用 DGI 节点嵌入（键 = 特征缓存摘要 + 模型超参 + 轮数 + 种子），命中时跳过训练只重新融合排名")
+    parser.add_argument('--embed_cache_dir', type=str, default='', help="嵌入缓存目录(默认 <cache_dir>/embeddings)，与特征缓存共用 --cache_max_mb 上限")
+    parser.add_argument('--embed_dtype', type=str, default=EMBED_CACHE_DTYPE, choices=['float16', 'float32'], help="嵌入缓存存储精度(float16 体积减半，排名基于舍入后的嵌入，与 float32 结果略有差异)")
+    parser.add_argument('--fusion_sweep', type=str, default='', help="融合权重扫描：给定全节点注入结果目录(<dir>/<网表名>/full_injection_results.json)，训练/评分后对权重网格批量评估前10%%/20%%覆盖率与曲线下面积，Pareto 前沿写入 fusion_sweep_pareto.csv")
+    parser.add_argument('--sweep_step', type=float, default=FUSION_SWEEP_STEP, help="融合权重扫描的网格步长")
     args = parser.parse_args()
 
-    global SMALL_SCALE_THRESHOLD, RUN_MODE, USE_CACHE, CACHE_DIR, SAMPLE_THRESHOLD
     SMALL_SCALE_THRESHOLD = args.threshold
     SAMPLE_THRESHOLD = args.sample_threshold
     RUN_MODE = 'v1'  # 固定为 V1
     USE_CACHE = True
     CACHE_DIR = args.cache_dir
+    CACHE_MAX_BYTES = args.cache_max_mb * 1024 * 1024
+    INCREMENTAL = args.incremental
+    EARLY_STOP = args.early_stop
+    RANK_TOP_K = max(0, args.top_k)
+    CPU_BACKEND = args.cpu_backend
+    CPU_BF16 = args.cpu_bf16
+    CPU_FAST_DROPOUT = args.cpu_fast_dropout
+    EMBED_CACHE = args.embed_cache.lower() == 'true'
+    EMBED_CACHE_DIR = args.embed_cache_dir or None
+    EMBED_CACHE_DTYPE = args.embed_dtype
     
     # 用户可控的缓存开关（决定是否利用已有缓存）
     user_use_cache = args.use_cache.lower() == 'true'
@@ -1485,8 +3824,16 @@ def main():
     use_gpu = torch.cuda.is_available()
     device = 'cuda' if use_gpu else 'cpu'
     
-    # 特征提取使用的进程数: 默认 CPU核心 - 2
-    feature_workers = args.workers if args.workers > 0 else max(1, mp.cpu_count() - 2)
+    # 特征提取使用的进程数: 默认 CPU核心 - 2；同时作为阶段1调度的核心预算
+    if args.workers > 0:
+        CORE_BUDGET = args.workers
+    feature_workers = available_cores()
+    
+    # CPU 训练线程：两阶段模式训练独占全部核心（或 --workers 预算）；流水线模式只用特征提取之外剩余的核心
+    two_phase_only = args.pretrain or args.inference_only or args.ensemble > 1
+    if device == 'cpu':
+        use_pipeline = args.pipeline and not two_phase_only
+        configure_torch_threads(max(1, mp.cpu_count() - feature_workers) if use_pipeline else (CORE_BUDGET or mp.cpu_count()))
     
     # 模式显示
     mode_display = 'V1 (Only)'
@@ -1506,78 +3853,126 @@ def main():
     # 用于收集所有网表的时间统计
     timing_records = []  # 每条记录: {filename, N, v1_feat_time, v1_train_time}
     
-    # ==================== 阶段1: 顺序处理但内部并行特征提取 ====================
-    print(f"\n{'='*60}")
-    print(f"【阶段1】节点级并行特征提取 (每个网表使用 {feature_workers} 个进程)")
-    print(f"{'='*60}")
-    
-    phase1_start = time.time()
-    
-    extraction_results = []
-    extraction_timings = {}  # filename -> (time_v1_feat, N)
-    
-    # 顺序处理每个文件，但在每个文件内部使用多进程并行
-    for i, vpath in enumerate(v_files, 1):
-        print(f"\n  [{i}/{len(v_files)}] 处理: {os.path.basename(vpath)}")
-        try:
-            # 直接调用特征提取（内部会使用 ProcessPoolExecutor）
-            result = extract_features_only(vpath, args.seed, RUN_MODE, user_use_cache, SMALL_SCALE_THRESHOLD)
-            extraction_results.append(result)
-            filename, N, run_mode_result, success, msg, time_v1_feat = result
-            extraction_timings[filename] = (time_v1_feat, N)
-            status = "✅" if success else "❌"
-            print(f"    {status} N={N} {msg}")
-        except Exception as e:
-            print(f"    ❌ 异常: {e}")
-            extraction_results.append((os.path.basename(vpath), 0, RUN_MODE, False, str(e), None))
-    
-    phase1_time = time.time() - phase1_start
-    success_count = sum(1 for r in extraction_results if r[3])
-    print(f"\n阶段1完成: {success_count}/{len(v_files)} 成功 | 耗时: {phase1_time:.2f}s")
-    
-    # 筛选成功提取特征的文件
-    valid_files = [v_files[i] for i, r in enumerate(extraction_results) if r[3]]
-    
-    if not valid_files:
-        print("❌ 没有文件成功提取特征，退出")
-        return
-    
-    # ==================== 阶段2: GPU串行DGI训练 ====================
-    print(f"\n{'='*60}")
-    print(f"【阶段2】GPU 串行 DGI 训练 (设备: {device.upper()}) - 模式: {RUN_MODE.upper()}")
-    print(f"{'='*60}")
-    
-    phase2_start = time.time()
-    
-    for vpath in valid_files:
-        result_tuple = train_and_score_only(
-            vpath, args.output_dir, 
-            hidden=args.hidden, layers=args.layers, epochs=args.epochs,
-            dropout=args.dropout, seed=args.seed, run_mode=RUN_MODE,
-            device=device
-        )
-        result_str, time_v1_train, N, filename, success, actual_run_mode = result_tuple
-        print(result_str)
+    overlap_time = None
+    pretrain_time = None
+    if args.pipeline and two_phase_only:
+        print("  [提示] 预训练/推理/集成模式不支持 --pipeline，改用两阶段执行")
+    if args.pipeline and not two_phase_only:
+        # ==================== 流水线: 特征提取与训练重叠 ====================
+        print(f"\n{'='*60}")
+        print(f"【流水线】特征提取与 DGI 训练重叠执行 (设备: {device.upper()}) - 模式: {RUN_MODE.upper()}")
+        print(f"{'='*60}")
+        
+        extraction_results, timing_records, stats = run_pipeline(v_files, args, device, user_use_cache, max(1, args.queue_size))
+        phase1_time, phase2_time, overlap_time = stats['phase1_time'], stats['phase2_time'], stats['overlap_time']
+        valid_files = [v_files[i] for i, r in enumerate(extraction_results) if r[3]]
+        print(f"\n流水线完成: {len(valid_files)}/{len(v_files)} 提取成功 | 提取: {phase1_time:.2f}s | 训练: {phase2_time:.2f}s | 重叠: {overlap_time:.2f}s")
+        
+        if not valid_files:
+            print("❌ 没有文件成功提取特征，退出")
+            return
+    else:
+        # ==================== 阶段1: 按规模调度的特征提取 ====================
+        print(f"\n{'='*60}")
+        print(f"【阶段1】特征提取 (小网表打包并发，大网表独占 {feature_workers} 个进程)")
+        print(f"{'='*60}")
+    
+        phase1_start = time.time()
+    
+        extraction_results = run_phase1(v_files, args.seed, user_use_cache)
+        extraction_timings = {r[0]: (r[5], r[1]) for r in extraction_results}  # filename -> (time_v1_feat, N)
+    
+        phase1_time = time.time() - phase1_start
+        success_count = sum(1 for r in extraction_results if r[3])
+        print(f"\n阶段1完成: {success_count}/{len(v_files)} 成功 | 耗时: {phase1_time:.2f}s")
+    
+        # 筛选成功提取特征的文件
+        valid_files = [v_files[i] for i, r in enumerate(extraction_results) if r[3]]
+    
+        if not valid_files:
+            print("❌ 没有文件成功提取特征，退出")
+            return
+    
+        # ==================== 阶段2: GPU串行DGI训练 ====================
+        print(f"\n{'='*60}")
+        print(f"【阶段2】GPU 串行 DGI 训练 (设备: {device.upper()}) - 模式: {RUN_MODE.upper()}")
+        print(f"{'='*60}")
+    
+        phase2_start = time.time()
+    
+        pretrained = None
+        if args.pretrain or args.inference_only:
+            # 预训练/推理模式：共享编码器对每个网表单次前向评分，不再逐网表训练
+            if args.pretrain:
+                pretrain_start = time.time()
+                pretrain_on_corpus(valid_files, args.encoder_ckpt, hidden=args.hidden, layers=args.layers,
+                                   epochs=args.epochs, dropout=args.dropout, device=device, max_nodes=args.batch_max_nodes)
+                pretrain_time = time.time() - pretrain_start
+                print(f"  预训练完成 ({len(valid_files)} 个网表)，耗时: {pretrain_time:.2f}s")
+            try:
+                pretrained = load_pretrained_encoder(args.encoder_ckpt, device)
+            except (OSError, ValueError) as e:
+                print(f"❌ 无法加载编码器检查点 {args.encoder_ckpt}: {e}")
+                return
+            print(f"  推理模式: 使用编码器检查点 {args.encoder_ckpt} (词表 {len(pretrained[1])} 类)")
+        elif args.ensemble > 1:
+            print(f"  集成模式: 每个网表 {args.ensemble} 个 DGI 副本堆叠训练 (输入噪声 {args.input_noise}, "
+                  f"分量噪声 {args.noise_level}, 权重扰动 {args.weight_noise})")
+        
+        for vpath in valid_files:
+            if pretrained is not None:
+                result_tuple = score_with_pretrained(vpath, args.output_dir, *pretrained, device=device)
+                print(result_tuple[0])
+            elif args.ensemble > 1:
+                result_tuple = train_and_score_ensemble(
+                    vpath, args.output_dir, args.ensemble,
+                    hidden=args.hidden, layers=args.layers, epochs=args.epochs,
+                    dropout=args.dropout, seed=args.seed, device=device, group_size=args.ensemble_group,
+                    input_noise=args.input_noise, noise_level=args.noise_level, weight_noise=args.weight_noise
+                )
+                print(result_tuple[0])
+            else:
+                result_tuple = train_and_score_only(
+                    vpath, args.output_dir, 
+                    hidden=args.hidden, layers=args.layers, epochs=args.epochs,
+                    dropout=args.dropout, seed=args.seed, run_mode=RUN_MODE,
+                    device=device
+                )
+                print(result_tuple[0])
+            result_str, time_v1_train, N, filename, success, actual_run_mode, train_info = result_tuple
         
-        # 收集时间数据
-        time_v1_feat, _ = extraction_timings.get(filename, (None, 0))
-        timing_records.append({
-            'filename': filename,
-            'nodes': N,
-            'actual_mode': actual_run_mode,
-            'v1_feat_time': time_v1_feat,
-            'v1_train_time': time_v1_train,
-            'success': success
-        })
-    
-    phase2_time = time.time() - phase2_start
+            # 收集时间数据
+            time_v1_feat, _ = extraction_timings.get(filename, (None, 0))
+            timing_records.append({
+                'filename': filename,
+                'nodes': N,
+                'actual_mode': actual_run_mode,
+                'v1_feat_time': time_v1_feat,
+                'v1_train_time': time_v1_train,
+                'v1_epochs': train_info.get('epochs'),
+                'v1_stop_reason': train_info.get('stop_reason', ''),
+                'success': success
+            })
+    
+        phase2_time = time.time() - phase2_start
+    
+    sweep_path = None
+    if args.fusion_sweep:
+        # ==================== 融合权重扫描（复用阶段2缓存的嵌入） ====================
+        print(f"\n{'='*60}")
+        print(f"【权重扫描】融合权重网格 × 注入结果 ({args.fusion_sweep})")
+        print(f"{'='*60}")
+        sweep_path = run_fusion_sweep(valid_files, args.fusion_sweep, args.output_dir, step=args.sweep_step,
+                                      hidden=args.hidden, layers=args.layers, epochs=args.epochs,
+                                      dropout=args.dropout, seed=args.seed, device=device)
     total_time = time.time() - start_total
     
     # ==================== 输出 CSV 时间报告 ====================
     csv_path = os.path.join(args.output_dir, "timing_report.csv")
     try:
         with open(csv_path, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['filename', 'nodes', 'actual_mode', 'v1_feat_time', 'v1_train_time', 'v1_total_time', 'success']
+            fieldnames = ['filename', 'nodes', 'actual_mode', 'v1_feat_time', 'v1_train_time', 'v1_total_time',
+                          'v1_epochs', 'v1_stop_reason', 'success']
             writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
             writer.writeheader()
             
@@ -1596,6 +3991,8 @@ def main():
                     'v1_feat_time': f"{record['v1_feat_time']:.4f}" if record['v1_feat_time'] is not None else '',
                     'v1_train_time': f"{record['v1_train_time']:.4f}" if record['v1_train_time'] is not None else '',
                     'v1_total_time': f"{v1_total:.4f}" if v1_total is not None else '',
+                    'v1_epochs': record.get('v1_epochs') if record.get('v1_epochs') is not None else '',
+                    'v1_stop_reason': record.get('v1_stop_reason', ''),
                     'success': record['success']
                 })
         print(f"\n📊 时间报告已保存: {csv_path}")
@@ -1610,9 +4007,17 @@ def main():
     print(f"  缓存状态:         {cache_display}")
     print(f"  阶段1 (特征提取): {phase1_time:.2f}s")
     print(f"  阶段2 (DGI训练):  {phase2_time:.2f}s")
+    if pretrain_time is not None:
+        print(f"  其中预训练:       {pretrain_time:.2f}s")
+    if EMBED_CACHE:
+        print(f"  嵌入缓存:         {embed_cache_summary()}")
+    if overlap_time is not None:
+        print(f"  阶段重叠:         {overlap_time:.2f}s (占训练 {overlap_time / max(phase2_time, 1e-9) * 100:.1f}%)")
     print(f"  总耗时:           {total_time:.2f}s")
     print(f"  处理文件:         {len(valid_files)}/{len(v_files)}")
     print(f"  时间报告:         {csv_path}")
+    if sweep_path:
+        print(f"  权重扫描:         {sweep_path}")
 
 if __name__ == '__main__':
     # 在 Windows 上必须使用 freeze_support